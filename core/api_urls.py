@@ -15,9 +15,15 @@ urlpatterns = [
     path('update_task/<int:task_id>/', api_views.update_task, name='update_task'),
     path('delete_task/<int:task_id>/', api_views.delete_task, name='delete_task'),
     
+    # Background Jobs API
+    path('jobs/<int:job_id>/', api_views.job_status, name='job_status'),
+    
     # Notifications API
     path('notifications/unread/', api_views.unread_notifications, name='unread_notifications'),
     path('notifications/<int:notification_id>/mark-read/', api_views.mark_notification_read, name='mark_notification_read'),
+    path('notifications/read/', api_views.bulk_mark_notifications_read, name='bulk_mark_notifications_read'),
+    path('notifications/archive/', api_views.bulk_archive_notifications, name='bulk_archive_notifications'),
+    path('notifications/mark-all-read/', api_views.mark_all_notifications_read, name='mark_all_notifications_read'),
     
     # Announcements API
     path('announcements/create/', api_views.create_announcement, name='create_announcement'),
@@ -64,6 +70,10 @@ urlpatterns = [
     path('chat/send/', api_views.send_chat_message, name='send_chat_message'),
     path('chat/clear/', api_views.clear_chat, name='clear_chat'),
     path('files/upload/', api_views.upload_file, name='upload_file'),
+    path('uploads/', api_views.start_upload, name='start_upload'),
+    path('uploads/<str:upload_id>/', api_views.upload_chunk, name='upload_chunk'),
+    path('chat/messages/<int:message_id>/attachment/', api_views.chat_attachment, name='chat_attachment'),
+    path('documents/<int:document_id>/download/', api_views.download_document, name='download_document'),
     path('tickets/create/', api_views.create_ticket, name='create_ticket'),
     path('customers/create/', api_views.create_customer, name='create_customer'),
     path('attendance/create/', api_views.create_attendance, name='create_attendance'),
@@ -1,34 +1,49 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.models import User
 from django.db import transaction
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.contrib import messages
 from datetime import datetime, timedelta
 import json
+import mimetypes
+import os
 
 from .models import (
     Company, Employee, Project, Task, Notification, Announcement,
     PerformanceMetric, CompanyMetric, CompanySetting, UserPreference,
     WorkflowTemplate, WorkflowInstance, ActivityLog, PaymentMethod,
-    LeaveRequest, Timesheet
+    LeaveRequest, Timesheet, Attendance, Job, ReportArtifact, ChatMessage, Document,
+    DocumentAccess
 )
-from .decorators import audit_log
+from .decorators import audit_log, role_required
+from .image_derivatives import delete_derivatives
+from .jobs import enqueue
+from .notification_counters import archive, mark_read, unread_count
+from .projections import (
+    ATTENDANCE_EXPORT_HEADER, TIMESHEET_EXPORT_HEADER, attendance_record, attendance_rows,
+    timesheet_record, timesheet_rows
+)
+from .report_artifacts import (
+    get_fresh_artifact, params_hash, report_params, serve_artifact
+)
+from .uploads import claim_chunk, create_upload, get_upload, sendfile_response, write_chunk
+from .ws_frames import frame_event
 
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
 @audit_log('CREATE', 'PROJECT', 'Project creation via API', 'MEDIUM')
+@role_required('company_admin', api=True)
 def create_project(request):
     """Create a new project"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         data = json.loads(request.body)
         
         project = Project.objects.create(
@@ -60,13 +75,11 @@ def create_project(request):
 @login_required
 @require_http_methods(["POST"])
 @audit_log('CREATE', 'TASK', 'Task creation via API', 'MEDIUM')
+@role_required('company_admin', api=True)
 def create_task(request):
     """Create a new task"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         data = json.loads(request.body)
         
         project = get_object_or_404(Project, id=data.get('project_id'), company=company)
@@ -99,14 +112,12 @@ def create_task(request):
 @login_required
 @require_http_methods(["POST"])
 @audit_log('UPDATE', 'TASK', 'Task update via API', 'MEDIUM')
+@role_required('company_admin', api=True)
 def update_task(request, task_id):
     """Update an existing task"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
-        task = get_object_or_404(Task, id=task_id, project__company=company)
+        company = request.company
+        task = get_object_or_404(Task, id=task_id, company=company)
         data = json.loads(request.body)
         
         # Update task fields
@@ -150,14 +161,12 @@ def update_task(request, task_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def get_task(request, task_id):
     """Get task details"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
-        task = get_object_or_404(Task, id=task_id, project__company=company)
+        company = request.company
+        task = get_object_or_404(Task, id=task_id, company=company)
         
         # Prepare task data with detailed information
         task_data = {
@@ -197,14 +206,12 @@ def get_task(request, task_id):
 @login_required
 @require_http_methods(["DELETE"])
 @audit_log('DELETE', 'TASK', 'Task deletion via API', 'MEDIUM')
+@role_required('company_admin', api=True)
 def delete_task(request, task_id):
     """Delete an existing task"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
-        task = get_object_or_404(Task, id=task_id, project__company=company)
+        company = request.company
+        task = get_object_or_404(Task, id=task_id, company=company)
         task_title = task.title
         
         task.delete()
@@ -227,13 +234,11 @@ def delete_task(request, task_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_announcement(request):
     """Create a new announcement"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         data = json.loads(request.body)
         
         announcement = Announcement.objects.create(
@@ -271,26 +276,29 @@ def create_announcement(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def _notification_scope(request):
+    """
+    The notifications a user can mark and the counter they see: the
+    company's for company admins, otherwise their own
+    """
+    if request.role == 'company_admin':
+        return Notification.objects.filter(company=request.company), {'company': request.company}
+    return Notification.objects.filter(user=request.user), {'user': request.user}
+
 @login_required
 def unread_notifications(request):
-    """Get unread notifications count"""
+    """Get unread notifications count (from the counter; 304 while unchanged)"""
     try:
-        if hasattr(request.user, 'company_admin_profile'):
-            company = request.user.company_admin_profile.company
-            count = Notification.objects.filter(
-                company=company,
-                is_read=False
-            ).count()
-        else:
-            count = Notification.objects.filter(
-                user=request.user,
-                is_read=False
-            ).count()
-        
-        return JsonResponse({'count': count})
-        
+        _, owner = _notification_scope(request)
+        count = unread_count(**owner)
     except Exception as e:
         return JsonResponse({'count': 0, 'error': str(e)})
+    
+    response = JsonResponse({'count': count, 'unread_count': count})
+    scope = 'company' if 'company' in owner else 'user'
+    response['ETag'] = quote_etag(f'unread-{scope}-{count}')
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
 
 @csrf_exempt
 @login_required
@@ -298,30 +306,77 @@ def unread_notifications(request):
 def mark_notification_read(request, notification_id):
     """Mark a notification as read"""
     try:
-        notification = get_object_or_404(Notification, id=notification_id, user=request.user)
-        notification.is_read = True
-        notification.save()
+        notifications, _ = _notification_scope(request)
+        notifications = notifications.filter(id=notification_id)
+        if not notifications.exists():
+            return JsonResponse({'success': False, 'error': 'Notification not found'}, status=404)
+        mark_read(notifications)
         
         return JsonResponse({'success': True})
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def _selected_notifications(request):
+    """The caller's notifications listed in the JSON body's ``ids``"""
+    data = json.loads(request.body or '{}')
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        raise ValueError('ids must be a list of notification IDs')
+    notifications, _ = _notification_scope(request)
+    return notifications.filter(id__in=ids)
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def bulk_mark_notifications_read(request):
+    """Mark the notifications in ``ids`` as read"""
+    try:
+        updated = mark_read(_selected_notifications(request))
+        return JsonResponse({'success': True, 'updated': updated})
+    except (ValueError, json.JSONDecodeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def bulk_archive_notifications(request):
+    """Archive the notifications in ``ids``"""
+    try:
+        updated = archive(_selected_notifications(request))
+        return JsonResponse({'success': True, 'updated': updated})
+    except (ValueError, json.JSONDecodeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def mark_all_notifications_read(request):
+    """Mark all of the caller's notifications as read"""
+    try:
+        notifications, _ = _notification_scope(request)
+        updated = mark_read(notifications)
+        return JsonResponse({'success': True, 'updated': updated})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
 @login_required
+@role_required('company_admin', api=True)
 def dashboard_analytics(request):
     """Get dashboard analytics data"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get analytics data
         analytics = {
             'total_employees': Employee.objects.filter(company=company).count(),
             'active_projects': Project.objects.filter(company=company, status='ACTIVE').count(),
-            'completed_tasks': Task.objects.filter(project__company=company, status='DONE').count(),
-            'total_tasks': Task.objects.filter(project__company=company).count(),
+            'completed_tasks': Task.objects.filter(company=company, status='DONE').count(),
+            'total_tasks': Task.objects.filter(company=company).count(),
             'recent_activities': ActivityLog.objects.filter(
                 company=company,
                 timestamp__gte=timezone.now() - timedelta(days=7)
@@ -334,13 +389,11 @@ def dashboard_analytics(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
+@role_required('company_admin', api=True)
 def search_employees(request):
     """Search employees"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         query = request.GET.get('q', '')
         
         employees = Employee.objects.filter(
@@ -372,13 +425,11 @@ def search_employees(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def update_company_settings(request):
     """Update company settings"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         data = json.loads(request.body)
         
         settings, created = CompanySetting.objects.get_or_create(company=company)
@@ -430,13 +481,11 @@ def update_user_preferences(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_workflow(request):
     """Create a new workflow template"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         data = json.loads(request.body)
         
         workflow = WorkflowTemplate.objects.create(
@@ -463,13 +512,11 @@ def create_workflow(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
+@role_required('company_admin', api=True)
 def project_detail(request, project_id):
     """Get project details"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         project = get_object_or_404(Project, id=project_id, company=company)
         
         project_data = {
@@ -490,13 +537,11 @@ def project_detail(request, project_id):
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
+@role_required('company_admin', api=True)
 def project_tasks(request, project_id):
     """Get project tasks"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         project = get_object_or_404(Project, id=project_id, company=company)
         
         tasks = Task.objects.filter(project=project)
@@ -524,14 +569,12 @@ def project_tasks(request, project_id):
 @login_required
 @require_http_methods(["POST"])
 @audit_log('UPDATE', 'TASK', 'Task update via API', 'MEDIUM')
+@role_required('company_admin', api=True)
 def update_task(request, task_id):
     """Update task status"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
-        task = get_object_or_404(Task, id=task_id, project__company=company)
+        company = request.company
+        task = get_object_or_404(Task, id=task_id, company=company)
         data = json.loads(request.body)
         
         # Update task
@@ -557,13 +600,11 @@ def update_task(request, task_id):
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
+@role_required('company_admin', api=True)
 def list_announcements(request):
     """List company announcements"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         announcements = Announcement.objects.filter(
             company=company,
             is_active=True
@@ -586,17 +627,15 @@ def list_announcements(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
+@role_required('company_admin', api=True)
 def performance_analytics(request):
     """Get performance analytics"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get performance metrics
         metrics = PerformanceMetric.objects.filter(
-            employee__company=company
+            company=company
         ).order_by('-created_at')[:20]
         
         metrics_data = []
@@ -621,13 +660,11 @@ def performance_analytics(request):
 @login_required
 @require_http_methods(["POST"])
 @audit_log('CREATE', 'EMPLOYEE', 'Employee creation via API', 'MEDIUM')
+@role_required('company_admin', api=True)
 def create_employee(request):
     """Create a new employee"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get form data
         employee_id = request.POST.get('employee_id')
@@ -681,13 +718,11 @@ def create_employee(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
+@role_required('company_admin', api=True)
 def get_employee(request, employee_id):
     """Get employee details"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         employee = get_object_or_404(Employee, id=employee_id, company=company)
         
         employee_data = {
@@ -705,6 +740,7 @@ def get_employee(request, employee_id):
             'updated_at': employee.updated_at.isoformat(),
             'photo_url': employee.get_photo_url(),
             'thumbnail_url': employee.get_thumbnail_url(),
+            'photo_derivatives': employee.get_photo_derivative_urls(),
             'initials': employee.get_initials(),
         }
         
@@ -716,13 +752,11 @@ def get_employee(request, employee_id):
 @login_required
 @require_http_methods(["POST"])
 @audit_log('UPDATE', 'EMPLOYEE', 'Employee update via API', 'MEDIUM')
+@role_required('company_admin', api=True)
 def update_employee(request, employee_id):
     """Update employee information"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         employee = get_object_or_404(Employee, id=employee_id, company=company)
         
         # Get form data
@@ -809,13 +843,11 @@ def delete_employee(request, employee_id):
 @login_required
 @require_http_methods(["POST"])
 @audit_log('BULK_ACTION', 'EMPLOYEE', 'Bulk employee operations via API', 'HIGH')
+@role_required('company_admin', api=True)
 def bulk_employee_operations(request):
     """Handle bulk operations on employees"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         operation = request.POST.get('operation')
         employee_ids_json = request.POST.get('employee_ids')
         
@@ -830,57 +862,33 @@ def bulk_employee_operations(request):
         # Get employees belonging to the company
         employees = Employee.objects.filter(id__in=employee_ids, company=company)
         
-        if not employees.exists():
-            return JsonResponse({'success': False, 'error': 'No valid employees found'})
-        
-        success_count = 0
-        errors = []
-        
-        if operation == 'verify':
-            # Bulk verify employees
-            for employee in employees:
-                try:
-                    employee.is_verified = True
-                    employee.save()
-                    success_count += 1
-                    
-                    # Log activity
-                    ActivityLog.objects.create(
-                        user=request.user,
-                        company=company,
-                        action='EMPLOYEE_VERIFIED',
-                        description=f'Verified employee: {employee.first_name} {employee.last_name}',
-                        ip_address=request.META.get('REMOTE_ADDR'),
-                    )
-                except Exception as e:
-                    errors.append(f"Error verifying {employee.first_name} {employee.last_name}: {str(e)}")
+        if operation in ('verify', 'delete'):
+            valid_ids = list(employees.values_list('id', flat=True))
+            if not valid_ids:
+                return JsonResponse({'success': False, 'error': 'No valid employees found'})
             
-            message = f'Successfully verified {success_count} employee(s)'
+            job = enqueue('bulk_employee_operations', {
+                'company_id': company.id,
+                'operation': operation,
+                'employee_ids': valid_ids,
+                'user_id': request.user.id,
+                'ip_address': request.META.get('REMOTE_ADDR'),
+            }, user=request.user, company=company)
             
-        elif operation == 'delete':
-            # Bulk delete employees
-            employee_names = []
-            for employee in employees:
-                try:
-                    employee_name = f"{employee.first_name} {employee.last_name}"
-                    employee_names.append(employee_name)
-                    employee.delete()
-                    success_count += 1
-                    
-                    # Log activity
-                    ActivityLog.objects.create(
-                        user=request.user,
-                        company=company,
-                        action='EMPLOYEE_DELETED',
-                        description=f'Deleted employee: {employee_name}',
-                        ip_address=request.META.get('REMOTE_ADDR'),
-                    )
-                except Exception as e:
-                    errors.append(f"Error deleting {employee.first_name} {employee.last_name}: {str(e)}")
-            
-            message = f'Successfully deleted {success_count} employee(s)'
+            valid = {str(employee_id) for employee_id in valid_ids}
+            return JsonResponse({
+                'success': True,
+                'job_id': job.id,
+                'status_url': f'/api/jobs/{job.id}/',
+                'message': f'Bulk {operation} of {len(valid_ids)} employee(s) started',
+                'total_count': len(employee_ids),
+                'not_found': [employee_id for employee_id in employee_ids if str(employee_id) not in valid]
+            }, status=202)
+        
+        if not employees.exists():
+            return JsonResponse({'success': False, 'error': 'No valid employees found'})
             
-        elif operation == 'export':
+        if operation == 'export':
             # Bulk export employees
             import csv
             import io
@@ -894,6 +902,7 @@ def bulk_employee_operations(request):
             writer.writerow(['Employee ID', 'First Name', 'Last Name', 'Email', 'Department', 'Position', 'Status', 'Created Date'])
             
             # Write employee data
+            success_count = 0
             for employee in employees:
                 writer.writerow([
                     employee.employee_id,
@@ -912,8 +921,6 @@ def bulk_employee_operations(request):
             filename = f'employees_export_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv'
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
             
-            message = f'Successfully exported {success_count} employee(s)'
-            
             # Log activity
             ActivityLog.objects.create(
                 user=request.user,
@@ -925,35 +932,18 @@ def bulk_employee_operations(request):
             
             return response
             
-        else:
-            return JsonResponse({'success': False, 'error': 'Invalid operation'})
-        
-        # Prepare response
-        response_data = {
-            'success': True,
-            'message': message,
-            'success_count': success_count,
-            'total_count': len(employee_ids)
-        }
-        
-        if errors:
-            response_data['errors'] = errors
-            response_data['error_count'] = len(errors)
-        
-        return JsonResponse(response_data)
+        return JsonResponse({'success': False, 'error': 'Invalid operation'})
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def upload_employee_photo(request, employee_id):
     """Upload employee photo"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         employee = get_object_or_404(Employee, id=employee_id, company=company)
         
         # Check if photo was uploaded
@@ -975,12 +965,11 @@ def upload_employee_photo(request, employee_id):
         if employee.photo:
             try:
                 employee.photo.delete(save=False)
-                if employee.photo_thumbnail:
-                    employee.photo_thumbnail.delete(save=False)
+                delete_derivatives(employee)
             except:
                 pass
         
-        # Save new photo
+        # Save new photo; thumbnails are generated by a background job
         employee.photo = photo
         employee.save()
         
@@ -997,7 +986,8 @@ def upload_employee_photo(request, employee_id):
             'success': True,
             'message': 'Photo uploaded successfully',
             'photo_url': employee.get_photo_url(),
-            'thumbnail_url': employee.get_thumbnail_url()
+            'thumbnail_url': employee.get_thumbnail_url(),
+            'thumbnail_pending': True
         })
         
     except Exception as e:
@@ -1005,13 +995,11 @@ def upload_employee_photo(request, employee_id):
 
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def delete_employee_photo(request, employee_id):
     """Delete employee photo"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         employee = get_object_or_404(Employee, id=employee_id, company=company)
         
         if not employee.photo:
@@ -1020,14 +1008,14 @@ def delete_employee_photo(request, employee_id):
         # Delete photos
         try:
             employee.photo.delete(save=False)
-            if employee.photo_thumbnail:
-                employee.photo_thumbnail.delete(save=False)
+            delete_derivatives(employee)
         except:
             pass
         
         # Clear photo fields
         employee.photo = None
         employee.photo_thumbnail = None
+        employee.photo_derivatives = {}
         employee.save()
         
         # Log activity
@@ -1048,13 +1036,11 @@ def delete_employee_photo(request, employee_id):
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
+@role_required('company_admin', api=True)
 def employee_performance(request, employee_id):
     """Get employee performance data"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         employee = get_object_or_404(Employee, id=employee_id, company=company)
         
         # Get performance metrics for this employee
@@ -1092,13 +1078,11 @@ def employee_performance(request, employee_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def execute_workflow(request, workflow_id):
     """Execute a workflow instance"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         workflow_template = get_object_or_404(WorkflowTemplate, id=workflow_id, company=company)
         data = json.loads(request.body)
         
@@ -1129,13 +1113,11 @@ def execute_workflow(request, workflow_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def verify_employee(request):
     """Verify an employee"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Handle both JSON and form data
         if request.content_type == 'application/json':
@@ -1160,13 +1142,11 @@ def verify_employee(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_department(request):
     """Create a new department"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         name = request.POST.get('name')
         description = request.POST.get('description', '')
         
@@ -1186,13 +1166,11 @@ def create_department(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def get_department(request, department_id):
     """Get department details"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get department from Announcement model
         announcement = Announcement.objects.get(
@@ -1219,13 +1197,11 @@ def get_department(request, department_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["PUT"])
+@role_required('company_admin', api=True)
 def update_department(request, department_id):
     """Update department details"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get department from Announcement model
         announcement = Announcement.objects.get(
@@ -1252,13 +1228,11 @@ def update_department(request, department_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["DELETE"])
+@role_required('company_admin', api=True)
 def delete_department(request, department_id):
     """Delete department"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get department from Announcement model
         announcement = Announcement.objects.get(
@@ -1279,13 +1253,11 @@ def delete_department(request, department_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_performance(request):
     """Create a performance record"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         employee_id = request.POST.get('employee_id')
         metric_type = request.POST.get('metric_type')
         value = request.POST.get('value')
@@ -1308,18 +1280,16 @@ def create_performance(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def get_performance(request, performance_id):
     """Get performance record details"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get performance record
         performance = PerformanceMetric.objects.get(
             id=performance_id,
-            employee__company=company
+            company=company
         )
         
         return JsonResponse({
@@ -1346,18 +1316,16 @@ def get_performance(request, performance_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["PUT"])
+@role_required('company_admin', api=True)
 def update_performance(request, performance_id):
     """Update performance record"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get performance record
         performance = PerformanceMetric.objects.get(
             id=performance_id,
-            employee__company=company
+            company=company
         )
         
         # Update fields
@@ -1382,18 +1350,16 @@ def update_performance(request, performance_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["DELETE"])
+@role_required('company_admin', api=True)
 def delete_performance(request, performance_id):
     """Delete performance record"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get performance record
         performance = PerformanceMetric.objects.get(
             id=performance_id,
-            employee__company=company
+            company=company
         )
         
         performance.delete()
@@ -1408,13 +1374,11 @@ def delete_performance(request, performance_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def send_message(request):
     """Send an internal message"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         recipient_id = request.POST.get('recipient_id')
         subject = request.POST.get('subject')
         message = request.POST.get('message')
@@ -1436,13 +1400,11 @@ def send_message(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def send_chat_message(request):
     """Send a chat message"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         message = request.POST.get('message')
         
         # Create chat message using Announcement model as placeholder
@@ -1462,13 +1424,11 @@ def send_chat_message(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def clear_chat(request):
     """Clear chat history"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Clear chat messages (using Announcement model as placeholder)
         Announcement.objects.filter(
@@ -1484,13 +1444,11 @@ def clear_chat(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def upload_file(request):
     """Upload a file"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         file = request.FILES.get('file')
         description = request.POST.get('description', '')
         
@@ -1511,16 +1469,148 @@ def upload_file(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def upload_state(upload):
+    response = JsonResponse({
+        'success': True,
+        'upload_id': str(upload.upload_id),
+        'upload_url': f'/api/uploads/{upload.upload_id}/',
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.offset,
+        'complete': upload.status != 'UPLOADING',
+        'sha256': upload.sha256,
+    })
+    response['Upload-Offset'] = str(upload.offset)
+    response['Upload-Length'] = str(upload.size)
+    return response
+
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+def start_upload(request):
+    """Start a resumable upload of a chat attachment or document"""
+    try:
+        data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
+        purpose = (data.get('purpose') or '').upper()
+        
+        if purpose == 'CHAT' and not hasattr(request.user, 'employee_profile'):
+            return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+        if purpose == 'DOCUMENT' and not hasattr(request.user, 'company_admin_profile'):
+            return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+        
+        size = data.get('size') or request.headers.get('Upload-Length')
+        upload = create_upload(
+            request.user,
+            purpose,
+            data.get('filename'),
+            int(size) if size is not None else -1,
+            data.get('content_type', '')
+        )
+        
+        response = upload_state(upload)
+        response.status_code = 201
+        response['Location'] = f'/api/uploads/{upload.upload_id}/'
+        return response
+        
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+@csrf_exempt
+@login_required
+@require_http_methods(["GET", "HEAD", "PATCH"])
+def upload_chunk(request, upload_id):
+    """
+    GET/HEAD: the current offset of an upload. PATCH: append the request body
+    at ``Upload-Offset``, which must equal the current offset.
+    """
+    upload = get_upload(request.user, upload_id)
+    if not upload:
+        return JsonResponse({'success': False, 'error': 'Upload not found'}, status=404)
+    
+    if request.method != 'PATCH':
+        return upload_state(upload)
+    
+    if upload.status != 'UPLOADING':
+        return JsonResponse({'success': False, 'error': 'Upload already complete'}, status=409)
+    
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Upload-Offset and Content-Length are required'}, status=400)
+    
+    if length > upload.size - offset:
+        return JsonResponse({'success': False, 'error': 'Chunk exceeds upload length'}, status=413)
+    
+    # Claim the chunk with a conditional UPDATE on the offset; only one
+    # request at a given offset gets to write
+    if not claim_chunk(upload, offset):
+        upload.refresh_from_db()
+        if upload.status != 'UPLOADING':
+            error = 'Upload already complete'
+        elif offset != upload.offset:
+            error = 'Offset mismatch'
+        else:
+            error = 'Another chunk is being written'
+        response = JsonResponse({'success': False, 'error': error, 'offset': upload.offset}, status=409)
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+    
+    try:
+        # Streams the body (never request.body) so memory use does not grow with the chunk
+        write_chunk(upload, request, length)
+    except Exception as e:
+        print(f"Error writing upload chunk: {e}")
+        upload.refresh_from_db()
+        response = JsonResponse({'success': False, 'error': 'Upload interrupted', 'offset': upload.offset}, status=500)
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+    
+    return upload_state(upload)
+
+@login_required
+@require_http_methods(["GET"])
+def chat_attachment(request, message_id):
+    """Download a chat attachment (room participants only)"""
+    message = ChatMessage.objects.filter(
+        id=message_id,
+        room__participants__user_account=request.user,
+        is_deleted=False
+    ).first()
+    if not message or not message.attachment:
+        return JsonResponse({'success': False, 'error': 'Attachment not found'}, status=404)
+    
+    filename = os.path.basename(message.attachment.name)
+    is_image = (mimetypes.guess_type(filename)[0] or '').startswith('image/')
+    return sendfile_response(message.attachment.name, filename, as_attachment=not is_image)
+
+@login_required
+@require_http_methods(["GET"])
+def download_document(request, document_id):
+    """Download a document the user has access to"""
+    document = Document.objects.filter(id=document_id).first()
+    if not document or not document.file or not document.can_access(request.user):
+        return JsonResponse({'success': False, 'error': 'Document not found'}, status=404)
+    
+    DocumentAccess.objects.create(
+        document=document,
+        user=request.user,
+        access_type='DOWNLOAD',
+        ip_address=request.META.get('REMOTE_ADDR'),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+    )
+    return sendfile_response(document.file.name, document.file_name, document.file_type or None)
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_ticket(request):
     """Create a support ticket"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         title = request.POST.get('title')
         description = request.POST.get('description')
         priority = request.POST.get('priority', 'MEDIUM')
@@ -1543,13 +1633,11 @@ def create_ticket(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_customer(request):
     """Create a customer record"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         name = request.POST.get('name')
         email = request.POST.get('email')
         phone = request.POST.get('phone', '')
@@ -1571,13 +1659,11 @@ def create_customer(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_attendance(request):
     """Create an attendance record"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         employee_id = request.POST.get('employee_id')
         date = request.POST.get('date')
         check_in = request.POST.get('check_in')
@@ -1600,13 +1686,11 @@ def create_attendance(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_benefit(request):
     """Create an employee benefit"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         name = request.POST.get('name')
         description = request.POST.get('description')
         benefit_type = request.POST.get('benefit_type')
@@ -1671,7 +1755,7 @@ def create_leave(request):
             if channel_layer:
                 async_to_sync(channel_layer.group_send)(
                     f'leave_requests_company_{company.id}',
-                    {
+                    frame_event('leave_request_update', {
                         'type': 'leave_request_update',
                         'action': 'new_request',
                         'data': {
@@ -1685,7 +1769,7 @@ def create_leave(request):
                             'status': leave_request.status,
                             'created_at': leave_request.created_at.strftime('%Y-%m-%d %H:%M'),
                         }
-                    }
+                    })
                 )
             
             return JsonResponse({'success': True, 'leave_id': leave_request.id})
@@ -1731,18 +1815,16 @@ def create_leave(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def approve_leave(request, request_id):
     """Approve a leave request"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         try:
             leave_request = LeaveRequest.objects.get(
                 id=request_id,
-                employee__company=company
+                company=company
             )
         except LeaveRequest.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Leave request not found'})
@@ -1796,7 +1878,7 @@ def approve_leave(request, request_id):
             
             async_to_sync(channel_layer.group_send)(
                 f'leave_requests_company_{company.id}',
-                {
+                frame_event('leave_request_update', {
                     'type': 'leave_request_update',
                     'action': 'status_update',
                     'data': {
@@ -1805,13 +1887,13 @@ def approve_leave(request, request_id):
                         'reviewed_by': request.user.username,
                         'reviewed_at': leave_request.reviewed_at.strftime('%Y-%m-%d %H:%M'),
                     }
-                }
+                })
             )
             
             # Send balance update to employee-specific room
             async_to_sync(channel_layer.group_send)(
                 f'employee_balance_{leave_request.employee.id}',
-                {
+                frame_event('leave_balance_update', {
                     'type': 'leave_balance_update',
                     'action': 'balance_changed',
                     'data': {
@@ -1821,7 +1903,7 @@ def approve_leave(request, request_id):
                         'days_used': str(leave_request.total_days),
                         'status': 'APPROVED',
                     }
-                }
+                })
             )
         
         return JsonResponse({'success': True, 'message': 'Leave request approved successfully'})
@@ -1832,18 +1914,16 @@ def approve_leave(request, request_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def reject_leave(request, request_id):
     """Reject a leave request"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         try:
             leave_request = LeaveRequest.objects.get(
                 id=request_id,
-                employee__company=company
+                company=company
             )
         except LeaveRequest.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Leave request not found'})
@@ -1897,7 +1977,7 @@ def reject_leave(request, request_id):
             
             async_to_sync(channel_layer.group_send)(
                 f'leave_requests_company_{company.id}',
-                {
+                frame_event('leave_request_update', {
                     'type': 'leave_request_update',
                     'action': 'status_update',
                     'data': {
@@ -1906,13 +1986,13 @@ def reject_leave(request, request_id):
                         'reviewed_by': request.user.username,
                         'reviewed_at': leave_request.reviewed_at.strftime('%Y-%m-%d %H:%M'),
                     }
-                }
+                })
             )
             
             # Send balance update to employee-specific room (balance unchanged for rejection)
             async_to_sync(channel_layer.group_send)(
                 f'employee_balance_{leave_request.employee.id}',
-                {
+                frame_event('leave_balance_update', {
                     'type': 'leave_balance_update',
                     'action': 'status_changed',
                     'data': {
@@ -1923,7 +2003,7 @@ def reject_leave(request, request_id):
                         'status': 'REJECTED',
                         'message': 'Leave request rejected - balance unchanged'
                     }
-                }
+                })
             )
         
         return JsonResponse({'success': True, 'message': 'Leave request rejected successfully'})
@@ -1934,13 +2014,11 @@ def reject_leave(request, request_id):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_asset(request):
     """Create an asset record"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         name = request.POST.get('name')
         asset_type = request.POST.get('asset_type')
         description = request.POST.get('description')
@@ -1961,13 +2039,11 @@ def create_asset(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_security_setting(request):
     """Create a security setting"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         name = request.POST.get('setting_name')
         setting_type = request.POST.get('setting_type')
         value = request.POST.get('setting_value')
@@ -1990,13 +2066,11 @@ def create_security_setting(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_integration(request):
     """Create an integration"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         name = request.POST.get('integration_name')
         integration_type = request.POST.get('integration_type')
         api_key = request.POST.get('api_key')
@@ -2018,13 +2092,11 @@ def create_integration(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def create_endpoint(request):
     """Create an API endpoint"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         name = request.POST.get('endpoint_name')
         http_method = request.POST.get('http_method')
         url = request.POST.get('endpoint_url')
@@ -2046,13 +2118,11 @@ def create_endpoint(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def update_company_profile(request):
     """Update company profile"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Update company fields
         company.name = request.POST.get('company_name', company.name)
@@ -2074,13 +2144,11 @@ def update_company_profile(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def upload_logo(request):
     """Upload company logo"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         logo_file = request.FILES.get('logo_file')
         
         if not logo_file:
@@ -2095,57 +2163,90 @@ def upload_logo(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def queue_report(request, kind, company, download_url, data=None):
+    """
+    Point to a stored report if one is fresh, otherwise queue a job to build
+    it. The filters come from ``data`` (the POST data by default).
+    """
+    params = report_params(request.POST if data is None else data)
+    key = params_hash(kind, company.id, params)
+    report_url = f'{download_url}?key={key}'
+    
+    if get_fresh_artifact(kind, company, params):
+        return JsonResponse({
+            'success': True,
+            'ready': True,
+            'report_url': report_url,
+            'message': 'Report is ready'
+        })
+    
+    # Reuse a job already building the same report
+    job = Job.objects.filter(
+        job_type=f'{kind}_report', company=company, status__in=['QUEUED', 'RUNNING'], payload__key=key
+    ).first()
+    if job is None:
+        job = enqueue(f'{kind}_report', {
+            'company_id': company.id,
+            'key': key,
+            'params': params,
+            'user_id': request.user.id,
+            'ip_address': request.META.get('REMOTE_ADDR'),
+            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+        }, user=request.user, company=company)
+    
+    return JsonResponse({
+        'success': True,
+        'ready': False,
+        'job_id': job.id,
+        'status_url': f'/api/jobs/{job.id}/',
+        'report_url': report_url,
+        'message': 'Report generation started'
+    }, status=202)
+
+def download_report(request, kind, company):
+    """
+    Stream a stored report. ``key`` selects an artifact built by
+    ``queue_report``; otherwise the filters in the query string are used,
+    and when no fresh artifact matches them a job is queued to build one
+    (202 with its ``status_url``).
+    """
+    key = request.GET.get('key')
+    if key:
+        artifact = ReportArtifact.objects.filter(
+            params_hash=key, kind=kind, company=company, expires_at__gt=timezone.now()
+        ).first()
+        if not artifact:
+            return JsonResponse({'success': False, 'error': 'Report not found or expired'}, status=404)
+        return serve_artifact(request, artifact)
+    
+    params = report_params(request.GET)
+    artifact = get_fresh_artifact(kind, company, params)
+    if artifact is None:
+        return queue_report(request, kind, company, request.path, request.GET)
+    return serve_artifact(request, artifact)
+
+@login_required
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    """Status and progress of a background job started by the current user"""
+    jobs = Job.objects.filter(id=job_id)
+    if not request.user.is_superuser:
+        jobs = jobs.filter(created_by=request.user)
+    job = jobs.first()
+    if not job:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    
+    return JsonResponse({'success': True, 'job': job.to_dict()})
+
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def generate_performance_report(request):
-    """Generate performance report"""
+    """Queue generation of a performance report"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
-        
-        # Get report parameters from request
-        report_type = request.POST.get('report_type', 'summary')
-        date_from = request.POST.get('date_from')
-        date_to = request.POST.get('date_to')
-        department = request.POST.get('department', '')
-        
-        # Generate report data (simplified implementation)
-        report_data = {
-            'company_name': company.name,
-            'report_type': report_type,
-            'date_from': date_from,
-            'date_to': date_to,
-            'department': department,
-            'generated_at': timezone.now().isoformat(),
-            'total_employees': Employee.objects.filter(company=company).count(),
-            'performance_metrics': list(PerformanceMetric.objects.filter(
-                employee__company=company
-            ).values('employee__first_name', 'employee__last_name', 'metric_name', 'value', 'date_recorded'))
-        }
-        
-        # Log activity
-        ActivityLog.objects.create(
-            user=request.user,
-            company=company,
-            action='PERFORMANCE_REPORT_GENERATED',
-            description=f'Generated {report_type} performance report',
-            ip_address=request.META.get('REMOTE_ADDR'),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
-        
-        # Generate downloadable report URL
-        timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
-        report_filename = f"performance_report_{company.name}_{timestamp}.json"
-        
-        return JsonResponse({
-            'success': True, 
-            'data': report_data,
-            'report_url': f'/api/performance/download-report/?filename={report_filename}&data={report_type}',
-            'message': 'Report generated successfully!'
-        })
+        company = request.company
+        return queue_report(request, 'performance', company, '/api/performance/download-report/')
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -2153,39 +2254,12 @@ def generate_performance_report(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def download_performance_report(request):
-    """Download performance report as JSON file"""
+    """Download a stored performance report"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
-        
-        # Get parameters
-        filename = request.GET.get('filename', f'performance_report_{company.name}.json')
-        report_type = request.GET.get('data', 'summary')
-        
-        # Generate the same report data as in generate_performance_report
-        report_data = {
-            'company_name': company.name,
-            'report_type': report_type,
-            'generated_at': timezone.now().isoformat(),
-            'total_employees': Employee.objects.filter(company=company).count(),
-            'performance_metrics': list(PerformanceMetric.objects.filter(
-                employee__company=company
-            ).values('employee__first_name', 'employee__last_name', 'metric_name', 'value', 'date_recorded'))
-        }
-        
-        # Return JSON file
-        from django.http import HttpResponse
-        import json
-        
-        response = HttpResponse(
-            json.dumps(report_data, indent=2),
-            content_type='application/json'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        company = request.company
+        return download_report(request, 'performance', company)
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -2193,13 +2267,11 @@ def download_performance_report(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def export_performance_reviews(request):
     """Export performance reviews to CSV"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get filter parameters
         status_filter = request.GET.get('status', '')
@@ -2268,13 +2340,11 @@ def export_performance_reviews(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def export_performance_goals(request):
     """Export performance goals to CSV"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get filter parameters
         status_filter = request.GET.get('status', '')
@@ -2283,7 +2353,7 @@ def export_performance_goals(request):
         overdue_filter = request.GET.get('overdue', '')
         
         # Base queryset
-        goals = PerformanceGoal.objects.filter(employee__company=company)
+        goals = PerformanceGoal.objects.filter(company=company)
         
         # Apply filters
         if status_filter:
@@ -2358,13 +2428,11 @@ def export_performance_goals(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def export_performance_feedback(request):
     """Export performance feedback to CSV"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get filter parameters
         feedback_type_filter = request.GET.get('feedback_type', '')
@@ -2437,13 +2505,11 @@ def export_performance_feedback(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def export_performance_reports(request):
     """Export performance reports to CSV"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get filter parameters
         report_type_filter = request.GET.get('report_type', '')
@@ -2513,84 +2579,12 @@ def export_performance_reports(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@role_required('company_admin', api=True)
 def generate_attendance_report(request):
-    """Generate attendance report"""
+    """Queue generation of an attendance report"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
-        
-        # Get report parameters from request
-        report_type = request.POST.get('report_type', 'summary')
-        date_from = request.POST.get('date_from')
-        date_to = request.POST.get('date_to')
-        department = request.POST.get('department', '')
-        
-        # Base queryset
-        attendance = Attendance.objects.filter(employee__company=company)
-        
-        # Apply filters
-        if date_from:
-            attendance = attendance.filter(date__gte=date_from)
-        if date_to:
-            attendance = attendance.filter(date__lte=date_to)
-        if department:
-            attendance = attendance.filter(employee__department=department)
-        
-        # Generate report data
-        report_data = {
-            'company_name': company.name,
-            'report_type': report_type,
-            'date_from': date_from,
-            'date_to': date_to,
-            'department': department,
-            'generated_at': timezone.now().isoformat(),
-            'total_employees': Employee.objects.filter(company=company).count(),
-            'total_records': attendance.count(),
-            'attendance_records': []
-        }
-        
-        # Add attendance records to report
-        for record in attendance:
-            hours_worked = 'N/A'
-            if record.check_in_time and record.check_out_time:
-                delta = record.check_out_time - record.check_in_time
-                hours_worked = f"{delta.total_seconds() / 3600:.2f}"
-            
-            report_data['attendance_records'].append({
-                'employee_name': f"{record.employee.first_name} {record.employee.last_name}",
-                'department': record.employee.department or 'N/A',
-                'date': record.date.strftime('%Y-%m-%d'),
-                'status': record.get_status_display(),
-                'check_in': record.check_in_time.strftime('%H:%M:%S') if record.check_in_time else 'N/A',
-                'check_out': record.check_out_time.strftime('%H:%M:%S') if record.check_out_time else 'N/A',
-                'hours_worked': hours_worked,
-                'notes': record.notes or 'N/A'
-            })
-        
-        # Log activity
-        ActivityLog.objects.create(
-            user=request.user,
-            company=company,
-            action='ATTENDANCE_REPORT_GENERATED',
-            description=f'Generated {report_type} attendance report',
-            ip_address=request.META.get('REMOTE_ADDR'),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
-        
-        # Generate downloadable report URL
-        timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
-        report_filename = f"attendance_report_{company.name}_{timestamp}.json"
-        
-        # For now, return the data with a download URL
-        # In a real implementation, you might save this to a file and return the URL
-        return JsonResponse({
-            'success': True, 
-            'data': report_data,
-            'report_url': f'/api/attendance/download-report/?filename={report_filename}&data={report_type}',
-            'message': 'Report generated successfully!'
-        })
+        company = request.company
+        return queue_report(request, 'attendance', company, '/api/attendance/download-report/')
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -2598,58 +2592,12 @@ def generate_attendance_report(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def download_attendance_report(request):
-    """Download attendance report as JSON file"""
+    """Download a stored attendance report"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
-        
-        # Get parameters
-        filename = request.GET.get('filename', f'attendance_report_{company.name}.json')
-        report_type = request.GET.get('data', 'summary')
-        
-        # Generate the same report data as in generate_attendance_report
-        attendance = Attendance.objects.filter(employee__company=company)
-        
-        report_data = {
-            'company_name': company.name,
-            'report_type': report_type,
-            'generated_at': timezone.now().isoformat(),
-            'total_employees': Employee.objects.filter(company=company).count(),
-            'total_records': attendance.count(),
-            'attendance_records': []
-        }
-        
-        # Add attendance records
-        for record in attendance:
-            hours_worked = 'N/A'
-            if record.check_in_time and record.check_out_time:
-                delta = record.check_out_time - record.check_in_time
-                hours_worked = f"{delta.total_seconds() / 3600:.2f}"
-            
-            report_data['attendance_records'].append({
-                'employee_name': f"{record.employee.first_name} {record.employee.last_name}",
-                'department': record.employee.department or 'N/A',
-                'date': record.date.strftime('%Y-%m-%d'),
-                'status': record.get_status_display(),
-                'check_in': record.check_in_time.strftime('%H:%M:%S') if record.check_in_time else 'N/A',
-                'check_out': record.check_out_time.strftime('%H:%M:%S') if record.check_out_time else 'N/A',
-                'hours_worked': hours_worked,
-                'notes': record.notes or 'N/A'
-            })
-        
-        # Return JSON file
-        from django.http import HttpResponse
-        import json
-        
-        response = HttpResponse(
-            json.dumps(report_data, indent=2),
-            content_type='application/json'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        company = request.company
+        return download_report(request, 'attendance', company)
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -2657,13 +2605,11 @@ def download_attendance_report(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
+@role_required('company_admin', api=True)
 def export_attendance_data(request):
     """Export attendance data to CSV"""
     try:
-        if not hasattr(request.user, 'company_admin_profile'):
-            return JsonResponse({'success': False, 'error': 'Access denied'})
-        
-        company = request.user.company_admin_profile.company
+        company = request.company
         
         # Get filter parameters
         date_from = request.GET.get('date_from', '')
@@ -2671,7 +2617,7 @@ def export_attendance_data(request):
         department = request.GET.get('department', '')
         
         # Base queryset
-        attendance = Attendance.objects.filter(employee__company=company)
+        attendance = Attendance.objects.filter(company=company)
         
         # Apply filters
         if date_from:
@@ -2689,27 +2635,11 @@ def export_attendance_data(request):
         writer = csv.writer(output)
         
         # Write header
-        writer.writerow([
-            'Employee Name', 'Department', 'Date', 'Status', 'Check In', 'Check Out', 'Hours Worked', 'Notes'
-        ])
+        writer.writerow(ATTENDANCE_EXPORT_HEADER)
         
         # Write data
-        for record in attendance:
-            hours_worked = 'N/A'
-            if record.check_in_time and record.check_out_time:
-                delta = record.check_out_time - record.check_in_time
-                hours_worked = f"{delta.total_seconds() / 3600:.2f}"
-            
-            writer.writerow([
-                f"{record.employee.first_name} {record.employee.last_name}",
-                record.employee.department or 'N/A',
-                record.date.strftime('%Y-%m-%d'),
-                record.get_status_display(),
-                record.check_in_time.strftime('%H:%M:%S') if record.check_in_time else 'N/A',
-                record.check_out_time.strftime('%H:%M:%S') if record.check_out_time else 'N/A',
-                hours_worked,
-                record.notes or 'N/A'
-            ])
+        for row in attendance_rows(attendance).iterator(chunk_size=2000):
+            writer.writerow(attendance_record(row).values())
         
         csv_content = output.getvalue()
         output.close()
@@ -2754,7 +2684,7 @@ def export_timesheet_data(request):
         date_to = request.GET.get('date_to', '')
         
         # Base queryset
-        timesheets = Timesheet.objects.filter(employee__company=company)
+        timesheets = Timesheet.objects.filter(company=company)
         
         # Apply filters
         if employee_filter:
@@ -2776,34 +2706,11 @@ def export_timesheet_data(request):
         writer = csv.writer(output)
         
         # Write header
-        writer.writerow([
-            'Employee Name', 'Employee Email', 'Department', 'Project', 'Date', 
-            'Start Time', 'End Time', 'Break Duration', 'Total Hours', 
-            'Task Description', 'Work Performed', 'Status', 'Billable', 
-            'Hourly Rate', 'Submitted At', 'Approved By', 'Approved At'
-        ])
+        writer.writerow(TIMESHEET_EXPORT_HEADER)
         
         # Write data rows
-        for timesheet in timesheets:
-            writer.writerow([
-                f"{timesheet.employee.first_name} {timesheet.employee.last_name}",
-                timesheet.employee.email,
-                timesheet.employee.department.name if timesheet.employee.department else 'No Department',
-                timesheet.project.name if timesheet.project else 'No Project',
-                timesheet.date.strftime('%Y-%m-%d'),
-                timesheet.start_time.strftime('%H:%M'),
-                timesheet.end_time.strftime('%H:%M'),
-                str(timesheet.break_duration),
-                str(timesheet.total_hours),
-                timesheet.task_description,
-                timesheet.work_performed,
-                timesheet.get_status_display(),
-                'Yes' if timesheet.billable else 'No',
-                str(timesheet.hourly_rate) if timesheet.hourly_rate else '',
-                timesheet.submitted_at.strftime('%Y-%m-%d %H:%M:%S') if timesheet.submitted_at else '',
-                f"{timesheet.approved_by.first_name} {timesheet.approved_by.last_name}" if timesheet.approved_by else '',
-                timesheet.approved_at.strftime('%Y-%m-%d %H:%M:%S') if timesheet.approved_at else ''
-            ])
+        for row in timesheet_rows(timesheets).iterator(chunk_size=2000):
+            writer.writerow(timesheet_record(row))
         
         csv_content = output.getvalue()
         output.close()
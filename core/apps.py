@@ -4,3 +4,31 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        # Register background job handlers with core.jobs
+        from . import job_handlers  # noqa: F401
+        
+        # Release blob store references when documents and messages are deleted
+        from .blobs import connect_signals
+        connect_signals()
+        
+        # Keep unread notification counters in step with created/deleted notifications
+        from .notification_counters import connect_signals as connect_counter_signals
+        connect_counter_signals()
+        
+        # Rebuild subscription revenue intervals when subscriptions or payments change
+        from .revenue import connect_signals as connect_revenue_signals
+        connect_revenue_signals()
+        
+        # Keep onboarding task counters in step with task assignments deleted along with their task
+        from .onboarding import connect_signals as connect_onboarding_signals
+        connect_onboarding_signals()
+        
+        # Version workflow task graphs, and refuse dependencies that close a cycle
+        from .onboarding_graph import connect_signals as connect_onboarding_graph_signals
+        connect_onboarding_graph_signals()
+        
+        # Fill the denormalized company of tasks, attendance and other company-scoped child rows
+        from .tenancy import connect_signals as connect_tenancy_signals
+        connect_tenancy_signals()
@@ -0,0 +1,24 @@
+"""
+Authentication backend that loads the user's profiles with the user.
+
+``get_user`` runs once per request (and per WebSocket connection). Loading
+the three profile relations in the same query means the many
+``hasattr(request.user, 'company_admin_profile')``-style checks in the
+views read cached values, whether the profile exists or not.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+PROFILE_RELATIONS = (
+    'system_owner_profile',
+    'company_admin_profile__company',
+    'employee_profile__company',
+)
+
+
+class ProfileModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        user = UserModel._default_manager.select_related(*PROFILE_RELATIONS).filter(pk=user_id).first()
+        return user if user and self.user_can_authenticate(user) else None
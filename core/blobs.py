@@ -0,0 +1,155 @@
+"""
+Content-addressed storage for documents and chat attachments.
+
+Each distinct file content is stored once, under
+``MEDIA_ROOT/blobs/<aa>/<sha256>/<filename>`` (the filename of the first
+upload, so links keep a readable name and extension). Every Document,
+DocumentVersion and ChatMessage with the same bytes points its file field
+at that one path.
+
+``FileBlob.ref_count`` counts those rows. ``store_upload()`` and
+``adopt_file()`` take references. The post_delete handlers connected by
+``connect_signals()`` release them, and the file is deleted when the
+transaction that released the last one commits. A reference that is never released only keeps a file alive.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.utils.text import get_valid_filename
+
+from .models import ChatMessage, Document, DocumentVersion, FileBlob
+
+
+BLOB_DIR = 'blobs'
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Models whose file field is stored in the blob store
+BLOB_FIELDS = {
+    Document: 'file',
+    DocumentVersion: 'file',
+    ChatMessage: 'attachment',
+}
+
+
+def blob_name(digest, filename):
+    filename = get_valid_filename(os.path.basename(filename or '')) or 'file'
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}/{filename}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+def hash_file(path):
+    """(sha256, size) of a file, read in blocks"""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            sha.update(block)
+            size += len(block)
+    return sha.hexdigest(), size
+
+
+def _take(digest, size, source_path, filename, refs):
+    """
+    Add ``refs`` references to the blob for ``digest``. ``source_path``
+    holds the content: it becomes the blob file if the blob is new (or its
+    file has gone missing) and is deleted otherwise.
+    """
+    try:
+        with transaction.atomic():
+            blob = FileBlob.objects.select_for_update().filter(sha256=digest).first()
+            if blob is None:
+                blob = FileBlob.objects.create(sha256=digest, name=blob_name(digest, filename), size=size, ref_count=refs)
+            else:
+                FileBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + refs)
+    except IntegrityError:
+        # Created concurrently by another upload of the same content
+        FileBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + refs)
+        blob = FileBlob.objects.get(sha256=digest)
+
+    target = default_storage.path(blob.name)
+    if os.path.abspath(source_path) == os.path.abspath(target):
+        return blob
+    if os.path.exists(target):
+        os.remove(source_path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source_path, target)
+    return blob
+
+
+def store_upload(uploaded_file):
+    """
+    Stream an UploadedFile into the blob store, hashing it as it is written.
+    Returns the FileBlob with one reference taken for the caller's row.
+    """
+    temp_dir = default_storage.path(f'{BLOB_DIR}/tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir, prefix='.tmp-')
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            for chunk in uploaded_file.chunks():
+                sha.update(chunk)
+                target.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return _take(sha.hexdigest(), size, temp_path, uploaded_file.name, 1)
+
+
+def adopt_file(name, digest, size, filename=None, refs=1):
+    """
+    Move a file already under MEDIA_ROOT (a finished chunked upload, or an
+    old upload found by the backfill) into the blob store, dropping it if
+    the content is already there. Returns the FileBlob with ``refs``
+    references taken.
+    """
+    return _take(digest, size, default_storage.path(name), filename or os.path.basename(name), refs)
+
+
+def _delete_file(name):
+    # The same content may have been stored again since the last reference went
+    if FileBlob.objects.filter(name=name, ref_count__gt=0).exists():
+        return
+    default_storage.delete(name)
+    try:
+        os.rmdir(os.path.dirname(default_storage.path(name)))
+    except OSError:
+        pass
+
+
+def release(name):
+    """
+    Drop one reference to the blob at ``name``. The last one deletes the
+    file once the transaction commits, so a rollback finds it still there.
+    """
+    if not is_blob(name):
+        return
+    with transaction.atomic():
+        FileBlob.objects.filter(name=name).update(ref_count=F('ref_count') - 1)
+        blob = FileBlob.objects.filter(name=name, ref_count__lte=0).first()
+        if blob is None:
+            return
+        blob.delete()
+        transaction.on_commit(lambda: _delete_file(name))
+
+
+def _release_deleted(sender, instance, **kwargs):
+    field_file = getattr(instance, BLOB_FIELDS[sender])
+    if field_file:
+        release(field_file.name)
+
+
+def connect_signals():
+    for model in BLOB_FIELDS:
+        post_delete.connect(_release_deleted, sender=model, dispatch_uid=f'release_blob_{model.__name__}')
@@ -0,0 +1,418 @@
+"""
+Owner bulk operations on companies.
+
+Each operation except ``delete`` runs a few set-based statements in one
+transaction, whatever the number of companies:
+
+- ``activate``, ``deactivate`` and ``suspend`` set ``is_active``.
+  ``suspend`` also marks the companies' subscriptions SUSPENDED;
+- ``change_plan`` moves subscriptions to a plan of the chosen type with the
+  same billing cycle, one UPDATE per cycle;
+- ``extend_trial`` pushes back ``trial_end_date`` of TRIAL subscriptions;
+- ``send_notification`` bulk-creates a notification for each company admin;
+- ``apply_discount`` is only audited, since discounts are not modelled.
+
+Each also bulk-creates one AuditLog entry per company it changed. Updates
+bypass save() and its signals, so revenue intervals are rebuilt for the
+subscriptions touched, and unread counters are moved for the new
+notifications.
+
+``delete`` removes one company at a time. Rows cascading from a company are
+deleted DELETE_BATCH_SIZE at a time, each batch in its own transaction.
+The rows cascading from those are batched the same way, down to
+DELETE_BATCH_DEPTH levels. This keeps a large company from being removed
+in one huge transaction, and lets the job report progress as it goes.
+
+``run_employee_operation`` does the same for a company admin's bulk
+``verify`` (one UPDATE) and ``delete`` (batched like companies) of
+employees. ActivityLog entries are bulk-created, and the result gives the
+outcome for each requested ID from the one query that loaded them.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .jobs import JobError
+from .models import ActivityLog, AuditLog, Company, CompanySubscription, Employee, Notification, SubscriptionPlan
+from .notification_counters import adjust_unread
+from .revenue import rebuild_intervals
+
+
+DELETE_BATCH_SIZE = getattr(settings, 'BULK_DELETE_BATCH_SIZE', 1000)
+DELETE_BATCH_DEPTH = 2
+
+# Plan choices offered by the owner page that have no plan of that type
+PLAN_TYPE_ALIASES = {'BASIC': ['BASIC', 'STARTER']}
+
+# Plan types that Company.subscription_type can mirror
+COMPANY_SUBSCRIPTION_TYPES = {value for value, label in Company._meta.get_field('subscription_type').choices}
+
+NOTIFICATION_PRIORITIES = {'info': 'LOW', 'success': 'LOW', 'warning': 'MEDIUM', 'error': 'HIGH'}
+
+
+class BulkResult:
+    """Successes, failures and the audit entries of one bulk operation"""
+
+    def __init__(self, operation, user=None, ip_address=None):
+        self.operation = operation
+        self.user = user
+        self.ip_address = ip_address
+        self.success = 0
+        self.errors = []
+        self.audit_entries = []
+
+    def fail(self, message):
+        self.errors.append(message)
+
+    def audit(self, company_id, company_name, description, action_type='COMPANY_MANAGEMENT',
+              severity='MEDIUM', old_values=None, new_values=None, keep_company=True):
+        self.audit_entries.append(AuditLog(
+            user=self.user,
+            action_type=action_type,
+            resource_type='COMPANY',
+            resource_id=str(company_id),
+            resource_name=company_name,
+            action_description=description,
+            severity=severity,
+            ip_address=self.ip_address,
+            old_values=old_values,
+            new_values=new_values,
+            changed_fields=list(new_values) if new_values else None,
+            company_id=company_id if keep_company else None,
+            additional_data={'bulk_operation': self.operation},
+            tags=['bulk', self.operation],
+        ))
+
+    def save_audit(self):
+        AuditLog.objects.bulk_create(self.audit_entries, batch_size=500)
+        self.audit_entries = []
+
+    def as_dict(self):
+        return {
+            'success': self.success,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'message': f'Operation completed: {self.success} successful, {len(self.errors)} failed',
+        }
+
+
+def _set_active(result, companies, is_active, now):
+    changing = [(company_id, name) for company_id, name, active in companies if active != is_active]
+    Company.objects.filter(id__in=[company[0] for company in companies]).update(is_active=is_active, updated_at=now)
+    verb = 'Activated' if is_active else 'Deactivated'
+    for company_id, name in changing:
+        result.audit(company_id, name, f'{verb} company: {name}', old_values={'is_active': not is_active},
+                     new_values={'is_active': is_active})
+    result.success += len(companies)
+
+
+def activate(result, companies, params, now):
+    _set_active(result, companies, True, now)
+
+
+def deactivate(result, companies, params, now):
+    _set_active(result, companies, False, now)
+
+
+def suspend(result, companies, params, now):
+    company_ids = [company[0] for company in companies]
+    Company.objects.filter(id__in=company_ids).update(is_active=False, updated_at=now)
+    subscriptions = CompanySubscription.objects.filter(company_id__in=company_ids)
+    suspended = set(subscriptions.exclude(status='SUSPENDED').values_list('company_id', flat=True))
+    subscriptions.update(status='SUSPENDED', updated_at=now)
+    rebuild_intervals(CompanySubscription.objects.filter(company_id__in=suspended))
+    for company_id, name, active in companies:
+        result.audit(company_id, name, f'Suspended company: {name}', severity='HIGH',
+                     old_values={'is_active': active}, new_values={'is_active': False, 'subscription_status': 'SUSPENDED'})
+    result.success += len(companies)
+
+
+def _resolve_plans(choice):
+    """Active plans matching ``choice`` (an id, a name or a plan type), by billing cycle"""
+    choice = str(choice or '').strip()
+    plans = SubscriptionPlan.objects.filter(is_active=True)
+    if choice.isdigit():
+        plans = plans.filter(id=int(choice))
+    elif plans.filter(name__iexact=choice).exists():
+        plans = plans.filter(name__iexact=choice)
+    else:
+        plans = plans.filter(plan_type__in=PLAN_TYPE_ALIASES.get(choice.upper(), [choice.upper()]))
+    by_cycle = {}
+    for plan in plans.order_by('sort_order', 'price'):
+        by_cycle.setdefault(plan.billing_cycle, plan)
+    return by_cycle
+
+
+def change_plan(result, companies, params, now):
+    plans = _resolve_plans(params.get('plan'))
+    if not plans:
+        for company_id, name, active in companies:
+            result.fail(f'No plan specified for {name}' if not params.get('plan') else f'Unknown plan for {name}')
+        return
+
+    company_ids = [company[0] for company in companies]
+    current = dict(CompanySubscription.objects.filter(company_id__in=company_ids).values_list(
+        'company_id', 'plan__billing_cycle'
+    ))
+    fallback = plans.get('MONTHLY') or next(iter(plans.values()))
+    for cycle in set(current.values()):
+        plan = plans.get(cycle, fallback)
+        CompanySubscription.objects.filter(company_id__in=company_ids, plan__billing_cycle=cycle).update(
+            plan=plan, updated_at=now
+        )
+    for plan_type in {plans.get(cycle, fallback).plan_type for cycle in current.values()} & COMPANY_SUBSCRIPTION_TYPES:
+        Company.objects.filter(id__in=[
+            company_id for company_id, cycle in current.items() if plans.get(cycle, fallback).plan_type == plan_type
+        ]).update(subscription_type=plan_type, updated_at=now)
+    rebuild_intervals(CompanySubscription.objects.filter(company_id__in=list(current)))
+
+    for company_id, name, active in companies:
+        if company_id not in current:
+            result.fail(f'{name} has no subscription')
+            continue
+        plan = plans.get(current[company_id], fallback)
+        result.audit(company_id, name, f'Changed plan of {name} to {plan.name}', action_type='SUBSCRIPTION_CHANGE',
+                     new_values={'plan': plan.name})
+        result.success += 1
+
+
+def extend_trial(result, companies, params, now):
+    try:
+        days = int(params.get('days', 30))
+    except (TypeError, ValueError):
+        days = 0
+    if days <= 0:
+        for company_id, name, active in companies:
+            result.fail(f'Invalid number of days for {name}')
+        return
+
+    company_ids = [company[0] for company in companies]
+    trials = CompanySubscription.objects.filter(company_id__in=company_ids, status='TRIAL')
+    on_trial = set(trials.values_list('company_id', flat=True))
+    # Extend from the current trial end, or from now if it has passed
+    trials.update(
+        trial_end_date=Greatest(Coalesce(F('trial_end_date'), Value(now)), Value(now)) + timedelta(days=days),
+        updated_at=now,
+    )
+    for company_id, name, active in companies:
+        if company_id not in on_trial:
+            result.fail(f'{name} is not on a trial')
+            continue
+        result.audit(company_id, name, f'Extended trial of {name} by {days} days', action_type='SUBSCRIPTION_CHANGE',
+                     new_values={'trial_extended_days': days})
+        result.success += 1
+
+
+def apply_discount(result, companies, params, now):
+    # Discount records are not modelled yet; the request is only audited
+    for company_id, name, active in companies:
+        result.audit(company_id, name, f'Discount of {params.get("discount", 0)}% requested for {name}',
+                     action_type='SUBSCRIPTION_CHANGE', new_values={'discount': params.get('discount', 0)})
+    result.success += len(companies)
+
+
+def send_notification(result, companies, params, now):
+    subject = (params.get('subject') or '').strip()
+    message = (params.get('message') or '').strip()
+    if not subject or not message:
+        for company_id, name, active in companies:
+            result.fail(f'No subject or message for {name}')
+        return
+
+    admins = dict(Company.objects.filter(
+        id__in=[company[0] for company in companies], admin_user__isnull=False
+    ).values_list('id', 'admin_user_id'))
+    priority = NOTIFICATION_PRIORITIES.get(params.get('type'), 'MEDIUM')
+    notifications = [
+        Notification(
+            notification_type='SYSTEM',
+            title=subject[:200],
+            message=message,
+            priority=priority,
+            company_id=company_id,
+            user_id=admins[company_id],
+            metadata={'bulk_operation': 'send_notification'},
+        )
+        for company_id, name, active in companies if company_id in admins
+    ]
+    Notification.objects.bulk_create(notifications, batch_size=500)
+    adjust_unread([(notification.user_id, notification.company_id) for notification in notifications], 1)
+
+    for company_id, name, active in companies:
+        if company_id not in admins:
+            result.fail(f'No admin user for {name}')
+            continue
+        result.audit(company_id, name, f'Sent notification "{subject[:100]}" to {name}')
+        result.success += 1
+
+
+COMPANY_OPERATIONS = {
+    'activate': activate,
+    'deactivate': deactivate,
+    'suspend': suspend,
+    'change_plan': change_plan,
+    'extend_trial': extend_trial,
+    'apply_discount': apply_discount,
+    'send_notification': send_notification,
+    'delete': None,
+}
+
+
+def _cascading_relations(model):
+    return [
+        relation for relation in model._meta.related_objects
+        if not relation.many_to_many and relation.on_delete is models.CASCADE
+    ]
+
+
+def _delete_in_batches(model, queryset, progress, depth):
+    """Delete ``queryset`` DELETE_BATCH_SIZE rows per transaction, batching cascades ``depth`` levels down"""
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            return deleted
+        if depth:
+            for relation in _cascading_relations(model):
+                related = relation.related_model
+                deleted += _delete_in_batches(
+                    related, related._base_manager.filter(**{f'{relation.field.name}__in': ids}), progress, depth - 1
+                )
+        with transaction.atomic():
+            deleted += model._base_manager.filter(pk__in=ids).delete()[0]
+        progress(deleted)
+
+
+def delete_company(company, progress=None):
+    """Delete ``company`` and everything cascading from it in batches; returns the number of rows deleted"""
+    progress = progress or (lambda deleted: None)
+    deleted = 0
+    for relation in _cascading_relations(Company):
+        related = relation.related_model
+        deleted += _delete_in_batches(
+            related,
+            related._base_manager.filter(**{relation.field.name: company}),
+            lambda count, base=deleted: progress(base + count),
+            DELETE_BATCH_DEPTH - 1,
+        )
+    with transaction.atomic():
+        deleted += company.delete()[0]
+    progress(deleted)
+    return deleted
+
+
+def _delete(result, company_ids, progress):
+    companies = list(Company.objects.filter(id__in=company_ids))
+    total = len(companies)
+    try:
+        for index, company in enumerate(companies):
+            company_id, name = company.id, company.name
+            rows = delete_company(
+                company,
+                lambda deleted: progress(index, total, f'Deleting {name}: {deleted} rows removed'),
+            )
+            result.audit(company_id, name, f'Deleted company: {name} ({rows} rows)',
+                         action_type='DELETE', severity='HIGH', keep_company=False)
+            result.success += 1
+            progress(index + 1, total, f'Deleted {index + 1} of {total} companies')
+    finally:
+        result.save_audit()
+
+
+def run_company_operation(operation, company_ids, params=None, user=None, ip_address=None, progress=None):
+    """Apply ``operation`` to the companies in ``company_ids``; returns the result dict stored on the job"""
+    if operation not in COMPANY_OPERATIONS:
+        raise JobError(f'Unknown operation: {operation}')
+    params = params or {}
+    progress = progress or (lambda done, total, message: None)
+    result = BulkResult(operation, user=user, ip_address=ip_address)
+
+    found = set(Company.objects.filter(id__in=company_ids).values_list('id', flat=True))
+    for company_id in company_ids:
+        if company_id not in found:
+            result.fail(f'Company {company_id} not found')
+
+    if operation == 'delete':
+        _delete(result, list(found), progress)
+        return result.as_dict()
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Lock the companies so concurrent bulk operations apply one after another
+        companies = list(
+            Company.objects.filter(id__in=found).order_by('id').select_for_update().values_list('id', 'name', 'is_active')
+        )
+        COMPANY_OPERATIONS[operation](result, companies, params, now)
+        result.save_audit()
+    progress(1, 1, f'{operation} applied to {len(companies)} companies')
+    return result.as_dict()
+
+
+EMPLOYEE_OPERATIONS = {'verify': 'verified', 'delete': 'deleted'}
+
+
+def run_employee_operation(company, operation, employee_ids, user=None, ip_address=None, progress=None):
+    """
+    Verify or delete the employees of ``company`` in ``employee_ids``.
+    Returns the result dict stored on the job; ``results`` maps each ID to
+    ``verified``, ``already_verified``, ``deleted`` or ``not_found``.
+    """
+    if operation not in EMPLOYEE_OPERATIONS:
+        raise JobError(f'Invalid operation: {operation}')
+    progress = progress or (lambda done, total, message: None)
+
+    employees = Employee.objects.filter(id__in=employee_ids, company=company)
+    found = {
+        employee_id: (f'{first_name} {last_name}', is_verified)
+        for employee_id, first_name, last_name, is_verified
+        in employees.values_list('id', 'first_name', 'last_name', 'is_verified')
+    }
+    results = {employee_id: 'not_found' for employee_id in employee_ids}
+    total = len(found)
+
+    def activity(action, description):
+        return ActivityLog(user=user, company=company, action=action, description=description, ip_address=ip_address)
+
+    if operation == 'verify':
+        pending = [employee_id for employee_id, (name, is_verified) in found.items() if not is_verified]
+        with transaction.atomic():
+            Employee.objects.filter(id__in=pending).update(is_verified=True, updated_at=timezone.now())
+            ActivityLog.objects.bulk_create([
+                activity('EMPLOYEE_VERIFIED', f'Verified employee: {found[employee_id][0]}') for employee_id in pending
+            ], batch_size=500)
+        for employee_id in found:
+            results[employee_id] = 'verified' if employee_id in pending else 'already_verified'
+        progress(total, total, f'Verified {len(pending)} employees')
+        succeeded = len(pending)
+    else:
+        ids = list(found)
+        deleted_ids = []
+        try:
+            for start in range(0, total, DELETE_BATCH_SIZE):
+                batch = ids[start:start + DELETE_BATCH_SIZE]
+                _delete_in_batches(Employee, employees.filter(id__in=batch), lambda deleted: None, DELETE_BATCH_DEPTH - 1)
+                deleted_ids += batch
+                progress(len(deleted_ids), total, f'Deleted {len(deleted_ids)} of {total} employees')
+        finally:
+            ActivityLog.objects.bulk_create([
+                activity('EMPLOYEE_DELETED', f'Deleted employee: {found[employee_id][0]}') for employee_id in deleted_ids
+            ], batch_size=500)
+        for employee_id in deleted_ids:
+            results[employee_id] = 'deleted'
+        succeeded = len(deleted_ids)
+
+    not_found = [employee_id for employee_id, outcome in results.items() if outcome == 'not_found']
+    result = {
+        'message': f'Successfully {EMPLOYEE_OPERATIONS[operation]} {succeeded} employee(s)',
+        'success_count': succeeded,
+        'total_count': len(employee_ids),
+        'results': results,
+    }
+    if not_found:
+        result['errors'] = [f'Employee {employee_id} not found' for employee_id in not_found]
+        result['error_count'] = len(not_found)
+    return result
@@ -1,16 +1,183 @@
+import asyncio
 import json
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from core.models import ChatRoom, ChatMessage, ChatParticipant, Employee
-from django.utils import timezone
+from django.conf import settings
+from core.models import ChatRoom, Employee
+from core.presence import presence, start_flusher
+from core.ws_frames import FrameMixin
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+# Inbound frames allowed per connection: sustained rate and burst size
+CHAT_RATE_LIMIT = getattr(settings, 'CHAT_RATE_LIMIT', 10)
+CHAT_RATE_BURST = getattr(settings, 'CHAT_RATE_BURST', 20)
+
+# A typing user is re-broadcast at most once per TYPING_BROADCAST_INTERVAL
+# and shown as typing until TYPING_TIMEOUT after their last typing frame.
+TYPING_BROADCAST_INTERVAL = 3.0
+TYPING_TIMEOUT = 5.0
+# Typing changes are batched into one typing_users frame per interval
+TYPING_FLUSH_INTERVAL = 0.5
+
+
+async def get_room_member(user, room_id):
+    """
+    Resolve the connecting user's employee profile and the active room they
+    belong to. Returns (employee, room), or (None, None) if the user may not
+    join the room. Consumers call this once in connect() and keep the result.
+    """
+    if not user.is_authenticated:
+        return None, None
+    employee = await Employee.objects.filter(user_account=user).afirst()
+    if employee is None:
+        return None, None
+    room = await ChatRoom.objects.filter(
+        id=room_id,
+        participants=employee,
+        is_active=True
+    ).afirst()
+    if room is None:
+        return None, None
+    return employee, room
+
+
+class TokenBucket:
+    """Per-connection token bucket; allow() spends one token if available"""
+    
+    def __init__(self, rate=None, burst=None):
+        self.rate = CHAT_RATE_LIMIT if rate is None else rate
+        self.capacity = CHAT_RATE_BURST if burst is None else burst
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class TypingMixin:
+    """
+    Rate limiting and coalesced typing indicators for room consumers.
+    
+    Outbound: a user's typing state is broadcast to the room only when it
+    starts, stops, or has not been refreshed for TYPING_BROADCAST_INTERVAL;
+    receivers expire it on their own after TYPING_TIMEOUT, so clients need
+    not send stop_typing. Inbound: each connection keeps the set of users
+    typing in the room and sends it as one batched ``typing_users`` frame.
+    
+    Expects ``room_group_name``, ``employee`` and ``employee_name`` to be
+    set in connect(), and FrameMixin for sending.
+    """
+    
+    def init_typing(self):
+        self.rate_limiter = TokenBucket()
+        self.rate_limited_at = 0
+        self.typing_broadcast_at = 0
+        self.typing_users = {}
+        self.typing_sent = []
+        self.typing_flush_task = None
+        self.typing_changed = asyncio.Event()
+    
+    async def allow_frame(self):
+        """Apply the rate limit to an inbound frame, telling the client (once a second) when it is dropped"""
+        if self.rate_limiter.allow():
+            return True
+        now = time.monotonic()
+        if now - self.rate_limited_at >= 1:
+            self.rate_limited_at = now
+            await self.send_payload({
+                'type': 'error',
+                'message': 'Rate limit exceeded'
+            })
+        return False
+    
+    async def set_typing(self, is_typing):
+        now = time.monotonic()
+        if is_typing:
+            if now - self.typing_broadcast_at < TYPING_BROADCAST_INTERVAL:
+                return
+            self.typing_broadcast_at = now
+        else:
+            if not self.typing_broadcast_at:
+                return
+            self.typing_broadcast_at = 0
+        
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'typing_state',
+                'user': self.employee_name,
+                'user_id': self.employee.id,
+                'is_typing': is_typing
+            }
+        )
+    
+    async def stop_typing_on_disconnect(self):
+        if self.typing_flush_task:
+            self.typing_flush_task.cancel()
+        await self.set_typing(False)
+    
+    # Receive typing state from room group
+    async def typing_state(self, event):
+        if event['is_typing']:
+            self.typing_users[event['user_id']] = (event['user'], time.monotonic() + TYPING_TIMEOUT)
+        else:
+            self.typing_users.pop(event['user_id'], None)
+        self.typing_changed.set()
+        if self.typing_flush_task is None or self.typing_flush_task.done():
+            self.typing_flush_task = asyncio.create_task(self.flush_typing())
+    
+    async def flush_typing(self):
+        """
+        Send the current typers TYPING_FLUSH_INTERVAL after a change, and
+        again when the next one expires, whichever comes first
+        """
+        delay = TYPING_FLUSH_INTERVAL
+        while True:
+            try:
+                await asyncio.wait_for(self.typing_changed.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                # Batch the changes that arrive within the interval
+                await asyncio.sleep(TYPING_FLUSH_INTERVAL)
+            self.typing_changed.clear()
+            now = time.monotonic()
+            self.typing_users = {
+                user_id: (name, expires)
+                for user_id, (name, expires) in self.typing_users.items()
+                if expires > now
+            }
+            users = [{'user_id': user_id, 'user': name} for user_id, (name, _) in sorted(self.typing_users.items())]
+            if users != self.typing_sent:
+                self.typing_sent = users
+                await self.send_payload({
+                    'type': 'typing_users',
+                    'users': users
+                })
+            if not self.typing_users and not self.typing_changed.is_set():
+                return
+            delay = max(min((expires for _, expires in self.typing_users.values()), default=now) - now, TYPING_FLUSH_INTERVAL)
+
+
+class ChatConsumer(FrameMixin, TypingMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'chat_room_{self.room_id}'
         
+        # Resolve membership once; later events use the cached employee/room
+        self.employee, self.room = await get_room_member(self.scope['user'], self.room_id)
+        if self.room is None:
+            await self.close()
+            return
+        self.employee_name = f"{self.employee.first_name} {self.employee.last_name}"
+        self.init_typing()
+        
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -19,10 +186,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Update last seen time
-        await self.update_last_seen()
+        # Track presence; last_seen is written by the batched presence task
+        await presence.connect(self.channel_name, self.employee.id, self.room.company_id, self.room.id)
+        start_flusher()
     
     async def disconnect(self, close_code):
+        if getattr(self, 'room', None) is None:
+            return
+        await presence.disconnect(self.channel_name)
+        await self.stop_typing_on_disconnect()
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -30,68 +202,44 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
     
     async def receive(self, text_data):
+        if not await self.allow_frame():
+            return
         try:
             text_data_json = json.loads(text_data)
             message_type = text_data_json.get('type')
             
             if message_type == 'ping':
                 # Handle ping for connection keep-alive
-                await self.send(text_data=json.dumps({
+                await presence.heartbeat(self.channel_name)
+                await self.send_payload({
                     'type': 'pong'
-                }))
+                })
             elif message_type == 'typing':
-                # Handle typing indicators
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'typing_message',
-                        'user': text_data_json.get('user'),
-                        'is_typing': text_data_json.get('is_typing', False)
-                    }
-                )
+                # Handle typing indicators (coalesced, see TypingMixin)
+                await self.set_typing(text_data_json.get('is_typing', True))
+            elif message_type == 'stop_typing':
+                await self.set_typing(False)
                 
         except json.JSONDecodeError:
             pass
     
     async def chat_message(self, event):
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'new_message',
-            'message': event['message'],
-            'sender': event['sender'],
-            'timestamp': event['timestamp']
-        }))
-    
-    async def typing_message(self, event):
-        # Send typing indicator to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'typing',
-            'user': event['user'],
-            'is_typing': event['is_typing']
-        }))
-    
-    @database_sync_to_async
-    def update_last_seen(self):
-        """Update the user's last seen time in the chat room"""
-        try:
-            user = self.scope['user']
-            if user.is_authenticated and hasattr(user, 'employee_profile'):
-                employee = user.employee_profile
-                participant, created = ChatParticipant.objects.get_or_create(
-                    room_id=self.room_id,
-                    employee=employee
-                )
-                participant.last_seen = timezone.now()
-                participant.save()
-        except Exception as e:
-            print(f"Error updating last seen: {e}")
+        # Send message to WebSocket (pre-encoded by the sender)
+        await self.send_frame(event, 'new_message')
 
 
-class ChatNotificationConsumer(AsyncWebsocketConsumer):
+class ChatNotificationConsumer(FrameMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.user_id = self.scope['url_route']['kwargs']['user_id']
         self.user_group_name = f'chat_notifications_{self.user_id}'
         
+        # Users may only subscribe to their own notifications
+        user = self.scope['user']
+        if not user.is_authenticated or str(user.id) != self.user_id:
+            self.user_group_name = None
+            await self.close()
+            return
+        
         # Join user group
         await self.channel_layer.group_add(
             self.user_group_name,
@@ -99,8 +247,17 @@ class ChatNotificationConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        
+        # Employees with the notification socket open count as online in their company
+        employee = await Employee.objects.filter(user_account=user).afirst()
+        if employee:
+            await presence.connect(self.channel_name, employee.id, employee.company_id)
+            start_flusher()
     
     async def disconnect(self, close_code):
+        if self.user_group_name is None:
+            return
+        await presence.disconnect(self.channel_name)
         # Leave user group
         await self.channel_layer.group_discard(
             self.user_group_name,
@@ -108,11 +265,5 @@ class ChatNotificationConsumer(AsyncWebsocketConsumer):
         )
     
     async def chat_notification(self, event):
-        # Send notification to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'notification',
-            'title': event['title'],
-            'message': event['message'],
-            'room_id': event['room_id'],
-            'sender': event['sender']
-        }))
+        # Send notification to WebSocket (pre-encoded by the sender)
+        await self.send_frame(event, 'notification')
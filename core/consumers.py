@@ -1,14 +1,23 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from .models import ChatRoom, ChatMessage, ChatNotification, Employee
+from .chat_consumers import TypingMixin, get_room_member
+from .presence import presence, start_flusher
+from .ws_frames import FrameMixin, frame_event
+from .models import ChatMessage, ChatNotification
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(FrameMixin, TypingMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'chat_{self.room_id}'
         
+        # Resolve membership once; later events use the cached employee/room
+        self.employee, self.room = await get_room_member(self.scope['user'], self.room_id)
+        if self.room is None:
+            await self.close()
+            return
+        self.employee_name = f"{self.employee.first_name} {self.employee.last_name}"
+        self.init_typing()
+        
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -16,15 +25,25 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+        await presence.connect(self.channel_name, self.employee.id, self.room.company_id, self.room.id)
+        start_flusher()
         
         # Send room info
-        room_info = await self.get_room_info()
-        await self.send(text_data=json.dumps({
+        await self.send_payload({
             'type': 'room_info',
-            'room': room_info
-        }))
+            'room': {
+                'id': self.room.id,
+                'name': self.room.name,
+                'room_type': self.room.room_type,
+                'participants_count': await self.room.participants.acount()
+            }
+        })
 
     async def disconnect(self, close_code):
+        if getattr(self, 'room', None) is None:
+            return
+        await presence.disconnect(self.channel_name)
+        await self.stop_typing_on_disconnect()
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -32,171 +51,70 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
     async def receive(self, text_data):
+        if not await self.allow_frame():
+            return
         text_data_json = json.loads(text_data)
         message_type = text_data_json.get('type')
         
         if message_type == 'chat_message':
             await self.handle_chat_message(text_data_json)
         elif message_type == 'typing':
-            await self.handle_typing(text_data_json)
+            # Coalesced and expired server-side, see TypingMixin
+            await self.set_typing(True)
         elif message_type == 'stop_typing':
-            await self.handle_stop_typing(text_data_json)
+            await self.set_typing(False)
 
     async def handle_chat_message(self, data):
         content = data.get('content', '').strip()
         if not content:
             return
-            
-        # Get user and employee
-        user = self.scope['user']
-        if not user.is_authenticated:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Authentication required'
-            }))
-            return
-            
-        employee = await self.get_employee(user)
-        if not employee:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Employee profile not found'
-            }))
-            return
-            
+        
         # Create message
-        message = await self.create_message(employee, content)
+        message = await ChatMessage.objects.acreate(
+            room=self.room,
+            sender=self.employee,
+            content=content,
+            message_type='TEXT'
+        )
         
-        # Send message to room group
+        # Send message to room group, serialized once for all recipients
         await self.channel_layer.group_send(
             self.room_group_name,
-            {
+            frame_event('chat_message', {
                 'type': 'chat_message',
                 'message': {
                     'id': message.id,
-                    'sender_name': f"{employee.first_name} {employee.last_name}",
-                    'sender_id': employee.id,
+                    'sender_name': self.employee_name,
+                    'sender_id': self.employee.id,
                     'content': message.content,
                     'created_at': message.created_at.strftime('%Y-%m-%d %H:%M:%S'),
                     'is_edited': message.is_edited,
                 }
-            }
+            })
         )
         
         # Create notifications for offline users
-        await self.create_notifications(employee, message)
-
-    async def handle_typing(self, data):
-        user = self.scope['user']
-        if not user.is_authenticated:
-            return
-            
-        employee = await self.get_employee(user)
-        if not employee:
-            return
-            
-        # Send typing indicator to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'typing',
-                'user': f"{employee.first_name} {employee.last_name}",
-                'user_id': employee.id
-            }
-        )
-
-    async def handle_stop_typing(self, data):
-        user = self.scope['user']
-        if not user.is_authenticated:
-            return
-            
-        employee = await self.get_employee(user)
-        if not employee:
-            return
-            
-        # Send stop typing indicator to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'stop_typing',
-                'user_id': employee.id
-            }
-        )
+        await self.create_notifications(message)
 
     # Receive message from room group
     async def chat_message(self, event):
-        message = event['message']
-        
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'chat_message',
-            'message': message
-        }))
-
-    # Receive typing indicator from room group
-    async def typing(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'typing',
-            'user': event['user'],
-            'user_id': event['user_id']
-        }))
-
-    # Receive stop typing indicator from room group
-    async def stop_typing(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'stop_typing',
-            'user_id': event['user_id']
-        }))
-
-    @database_sync_to_async
-    def get_employee(self, user):
-        try:
-            return user.employee_profile
-        except:
-            return None
+        # Send message to WebSocket (pre-encoded by the sender)
+        await self.send_frame(event)
 
-    @database_sync_to_async
-    def get_room_info(self):
-        try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            return {
-                'id': room.id,
-                'name': room.name,
-                'room_type': room.room_type,
-                'participants_count': room.participants.count()
-            }
-        except ChatRoom.DoesNotExist:
-            return None
-
-    @database_sync_to_async
-    def create_message(self, employee, content):
-        try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            message = ChatMessage.objects.create(
-                room=room,
-                sender=employee,
-                content=content,
-                message_type='TEXT'
+    async def create_notifications(self, message):
+        recipient_ids = [
+            employee_id async for employee_id in
+            self.room.participants.exclude(id=self.employee.id).values_list('id', flat=True)
+        ]
+        await ChatNotification.objects.abulk_create([
+            ChatNotification(
+                recipient_id=recipient_id,
+                sender=self.employee,
+                room=self.room,
+                message=message,
+                notification_type='NEW_MESSAGE',
+                title=f'New message in {self.room.name}',
+                content=f'{self.employee.first_name}: {message.content[:100]}...'
             )
-            return message
-        except ChatRoom.DoesNotExist:
-            return None
-
-    @database_sync_to_async
-    def create_notifications(self, sender, message):
-        try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            participants = room.participants.exclude(id=sender.id)
-            
-            for participant in participants:
-                ChatNotification.objects.create(
-                    recipient=participant,
-                    sender=sender,
-                    room=room,
-                    message=message,
-                    notification_type='NEW_MESSAGE',
-                    title=f'New message in {room.name}',
-                    content=f'{sender.first_name}: {message.content[:100]}...'
-                )
-        except ChatRoom.DoesNotExist:
-            pass
\ No newline at end of file
+            for recipient_id in recipient_ids
+        ])
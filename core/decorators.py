@@ -1,14 +1,42 @@
 """
-Decorators for audit logging and automatic action tracking
+Decorators for role checks, audit logging and automatic action tracking
 """
 import json
 from functools import wraps
+from django.contrib import messages
 from django.contrib.auth.models import User
 from django.http import JsonResponse
+from django.shortcuts import redirect
 from django.utils import timezone
+from .middleware import has_role
 from .models import AuditLog
 
 
+ACCESS_DENIED_MESSAGE = 'Access denied. You are not authorized to view this page.'
+
+
+def role_required(role, message=ACCESS_DENIED_MESSAGE, api=False):
+    """
+    Decorator allowing a view only for users with the given role's profile
+    ('company_admin', 'employee' or 'system_owner'; see core.middleware).
+    
+    Others are redirected home with ``message``, or get the API's
+    ``{'success': False, 'error': 'Access denied'}`` response when ``api``.
+    Use below ``login_required``.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not has_role(request.user, role):
+                if api:
+                    return JsonResponse({'success': False, 'error': 'Access denied'})
+                messages.error(request, message)
+                return redirect('core:home')
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 def audit_log(action_type, resource_type, description=None, severity='MEDIUM', capture_changes=True):
     """
     Decorator for automatic audit logging of view functions
@@ -66,11 +94,11 @@ def audit_log(action_type, resource_type, description=None, severity='MEDIUM', c
             elif 'id' in kwargs:
                 audit_data['resource_id'] = str(kwargs['id'])
             
-            # Get company context if available
+            # Get company context if available (resolved by RoleMiddleware)
             company = None
-            if hasattr(request.user, 'company_admin_profile'):
-                company = request.user.company_admin_profile.company
-            elif hasattr(request.user, 'system_owner_profile'):
+            if has_role(request.user, 'company_admin'):
+                company = request.company
+            elif has_role(request.user, 'system_owner'):
                 # For system owners, try to get company from request or context
                 company_id = request.GET.get('company_id') or request.POST.get('company_id')
                 if company_id:
@@ -0,0 +1,147 @@
+"""
+Resized versions of employee photos.
+
+Saving an Employee with a new photo queues a ``photo_derivatives`` job once
+the transaction commits (``schedule_derivatives``). A ``run_jobs`` worker
+then renders every size in DERIVATIVE_SIZES as JPEG, plus WebP when Pillow
+supports it. JPEG sources are decoded with ``Image.draft`` at the smallest
+DCT scale that still covers the largest size, so a large camera photo is
+never decoded at full resolution. Each size is resized from the previous
+one.
+
+The result is recorded in ``Employee.photo_derivatives``::
+
+    {'source': <photo name>, 'sizes': {'150': {'jpeg': <name>, 'webp': <name>}, ...}}
+
+The 150px JPEG is also stored as ``photo_thumbnail``. ``derivative_urls``
+caches the URL map per photo.
+"""
+import hashlib
+import io
+import os
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+from .jobs import enqueue
+from .models import Employee, Job
+
+
+DERIVATIVE_SIZES = (64, 150, 300, 600)
+THUMBNAIL_SIZE = 150
+DERIVATIVE_DIR = 'employee_photos/derivatives'
+QUALITY = {'jpeg': 85, 'webp': 80}
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+URL_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def derivative_formats():
+    return ('jpeg', 'webp') if features.check('webp') else ('jpeg',)
+
+
+def render_derivatives(photo_name, employee_id):
+    """
+    Write every derivative of a stored photo and return
+    ``{size: {format: storage name}}``. Touches only storage, so it can run
+    in another process.
+    """
+    stem = os.path.splitext(os.path.basename(photo_name))[0]
+    prefix = f'{DERIVATIVE_DIR}/{employee_id}/{stem}'
+    largest = max(DERIVATIVE_SIZES)
+
+    with default_storage.open(photo_name, 'rb') as f:
+        image = Image.open(f)
+        # JPEG only: decode at 1/2, 1/4 or 1/8 scale if that still covers the largest size
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+    sizes = {}
+    for size in sorted(DERIVATIVE_SIZES, reverse=True):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        names = {}
+        for fmt in derivative_formats():
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+            name = f'{prefix}_{size}.{EXTENSIONS[fmt]}'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            names[fmt] = default_storage.save(name, ContentFile(buffer.getvalue()))
+        sizes[str(size)] = names
+    return sizes
+
+
+def _delete_files(sizes):
+    for names in sizes.values():
+        for name in names.values():
+            default_storage.delete(name)
+
+
+def record_derivatives(employee_id, photo_name, sizes):
+    """
+    Store rendered derivatives on the employee, unless the photo was
+    replaced meanwhile (then the files are deleted). Returns whether they
+    were recorded.
+    """
+    updated = Employee.objects.filter(pk=employee_id, photo=photo_name).update(
+        photo_derivatives={'source': photo_name, 'sizes': sizes},
+        photo_thumbnail=sizes[str(THUMBNAIL_SIZE)]['jpeg'],
+    )
+    if not updated:
+        _delete_files(sizes)
+    return bool(updated)
+
+
+def generate_derivatives(employee):
+    """Render and record the derivatives of the employee's current photo"""
+    if not employee.photo:
+        return False
+    photo_name = employee.photo.name
+    return record_derivatives(employee.id, photo_name, render_derivatives(photo_name, employee.id))
+
+
+def schedule_derivatives(employee):
+    """Queue the photo_derivatives job when the current transaction commits, once per photo"""
+    payload = {'employee_id': employee.id, 'photo': employee.photo.name}
+
+    def queue():
+        pending = Job.objects.filter(
+            job_type='photo_derivatives',
+            status__in=['QUEUED', 'RUNNING'],
+            payload__employee_id=payload['employee_id'],
+            payload__photo=payload['photo'],
+        ).exists()
+        if not pending:
+            enqueue('photo_derivatives', payload)
+
+    transaction.on_commit(queue)
+
+
+def delete_derivatives(employee):
+    """Delete the derivative files of the employee's photo and clear the fields (without saving)"""
+    _delete_files(employee.photo_derivatives.get('sizes', {}))
+    if employee.photo_thumbnail and not employee.photo_thumbnail.name.startswith(f'{DERIVATIVE_DIR}/'):
+        # Thumbnail made before derivatives existed
+        employee.photo_thumbnail.delete(save=False)
+    employee.photo_thumbnail = None
+    employee.photo_derivatives = {}
+
+
+def derivative_urls(employee):
+    """``{size: {format: url}}`` for the employee's current photo, cached per photo"""
+    derivatives = employee.photo_derivatives or {}
+    if not employee.photo or derivatives.get('source') != employee.photo.name:
+        return {}
+    source_key = hashlib.md5(employee.photo.name.encode('utf-8')).hexdigest()
+    return cache.get_or_set(
+        f'photo_derivative_urls:{employee.id}:{source_key}',
+        lambda: {
+            size: {fmt: default_storage.url(name) for fmt, name in names.items()}
+            for size, names in derivatives['sizes'].items()
+        },
+        URL_CACHE_TIMEOUT
+    )
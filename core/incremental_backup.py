@@ -0,0 +1,544 @@
+"""
+Incremental, content-addressed backups.
+
+Layout under the backup root (``backups/incremental`` by default)::
+
+    objects/ab/abcdef...   blobs named by the SHA-256 of their content
+    manifests/<id>.json    one manifest per backup
+
+A manifest only records what changed relative to its parent backup
+(files added or modified, and paths deleted), so restoring a point in time
+replays the manifest chain from the base backup forward. A restore puts
+the tracked trees and the database back exactly as they were, so files
+and rows created since the backup are removed. File content is stored
+once per distinct SHA-256, so unchanged media and static files cost
+nothing on later runs. Files whose path, size and mtime match the parent
+are not even re-read.
+
+The SQLite database is snapshotted with the online backup API and split
+into page-aligned chunks; each chunk is stored as a blob, so only the pages
+that changed since the previous backup take up new space. Other database
+engines are dumped per model with ``dumpdata`` and each model dump is
+stored as a blob; a restore empties those tables and loads every dump in
+one transaction.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+
+DEFAULT_ROOT = Path('backups') / 'incremental'
+
+# 1 MiB is a multiple of every valid SQLite page size (512 B - 64 KiB),
+# so chunk boundaries always fall on page boundaries.
+DB_CHUNK_SIZE = 1024 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+
+BACKUP_TYPES = ('incremental', 'differential')
+
+
+class IncrementalBackupStore:
+    """Content-addressed blob store plus the manifests that reference it"""
+
+    def __init__(self, root=None):
+        self.root = Path(root) if root else DEFAULT_ROOT
+        self.objects_dir = self.root / 'objects'
+        self.manifests_dir = self.root / 'manifests'
+
+    # ------------------------------------------------------------------
+    # Blobs
+    # ------------------------------------------------------------------
+    def blob_path(self, digest):
+        return self.objects_dir / digest[:2] / digest
+
+    def has_blob(self, digest):
+        return self.blob_path(digest).exists()
+
+    def _commit_temp_blob(self, temp_path, digest):
+        """Move a fully written temp file into place, or drop it if the blob exists"""
+        target = self.blob_path(digest)
+        if target.exists():
+            os.unlink(temp_path)
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, target)
+        return True
+
+    def put_bytes(self, data):
+        """Store a blob from memory. Returns (digest, stored_new)."""
+        digest = hashlib.sha256(data).hexdigest()
+        if self.has_blob(digest):
+            return digest, False
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.objects_dir, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return digest, self._commit_temp_blob(temp_path, digest)
+
+    def put_file(self, path):
+        """
+        Stream a file into the store, hashing it as it is copied.
+        Returns (digest, stored_new).
+        """
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        sha = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.objects_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as target, open(path, 'rb') as source:
+                for block in iter(lambda: source.read(READ_BLOCK_SIZE), b''):
+                    sha.update(block)
+                    target.write(block)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        digest = sha.hexdigest()
+        return digest, self._commit_temp_blob(temp_path, digest)
+
+    def open_blob(self, digest):
+        return open(self.blob_path(digest), 'rb')
+
+    # ------------------------------------------------------------------
+    # Manifests
+    # ------------------------------------------------------------------
+    def manifest_path(self, backup_id):
+        return self.manifests_dir / f'{backup_id}.json'
+
+    def has_manifest(self, backup_id):
+        return self.manifest_path(backup_id).exists()
+
+    def load_manifest(self, backup_id):
+        with open(self.manifest_path(backup_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+        path = self.manifest_path(manifest['id'])
+        fd, temp_path = tempfile.mkstemp(dir=self.manifests_dir, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, path)
+
+    def list_manifests(self):
+        """All manifests, oldest first"""
+        manifests = []
+        if not self.manifests_dir.exists():
+            return manifests
+        for path in self.manifests_dir.glob('*.json'):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    manifests.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable backup manifest {path}: {e}")
+        manifests.sort(key=lambda m: m['created_at'])
+        return manifests
+
+    def chain(self, backup_id):
+        """Manifests from the base backup up to ``backup_id``, oldest first"""
+        chain = []
+        seen = set()
+        current = backup_id
+        while current:
+            if current in seen:
+                raise Exception(f"Backup manifest chain has a cycle at {current}")
+            seen.add(current)
+            manifest = self.load_manifest(current)
+            chain.append(manifest)
+            current = manifest.get('parent')
+        chain.reverse()
+        return chain
+
+    def resolve(self, backup_id):
+        """
+        Replay the manifest chain and return the full state at ``backup_id``:
+        ``{'files': {path: entry}, 'database': {...}}``
+        """
+        files = {}
+        database = None
+        for manifest in self.chain(backup_id):
+            for path in manifest.get('deleted', []):
+                files.pop(path, None)
+            files.update(manifest.get('files', {}))
+            database = manifest.get('database') or database
+        return {'files': files, 'database': database}
+
+    # ------------------------------------------------------------------
+    # Garbage collection
+    # ------------------------------------------------------------------
+    def referenced_blobs(self):
+        referenced = set()
+        for manifest in self.list_manifests():
+            for entry in manifest.get('files', {}).values():
+                referenced.add(entry['sha256'])
+            referenced.update(database_blobs(manifest.get('database')))
+        return referenced
+
+    def collect_garbage(self):
+        """Remove blobs that no remaining manifest references. Returns bytes freed."""
+        if not self.objects_dir.exists():
+            return 0
+        referenced = self.referenced_blobs()
+        freed = 0
+        for path in self.objects_dir.glob('*/*'):
+            if path.name not in referenced:
+                freed += path.stat().st_size
+                path.unlink()
+        return freed
+
+
+def database_blobs(database):
+    """Blob digests referenced by a manifest's database section"""
+    if not database:
+        return []
+    if database['format'] == 'sqlite-pages':
+        return list(database['chunks'])
+    return list(database['models'].values())
+
+
+def _backup_id(backup_name):
+    return re.sub(r'[^\w.-]+', '_', backup_name).strip('_') or datetime.now().strftime('backup_%Y%m%d_%H%M%S')
+
+
+def _tracked_roots():
+    """(prefix, directory) pairs for the file trees included in backups"""
+    roots = [('media', Path(settings.MEDIA_ROOT))]
+    for static_path in settings.STATICFILES_DIRS:
+        roots.append(('static', Path(static_path)))
+    return roots
+
+
+def _scan_files(store, previous):
+    """
+    Walk the tracked trees and build the file delta against ``previous``.
+    Unchanged files (same size and mtime) are not read.
+    """
+    changed = {}
+    seen = set()
+    stats = {'files_scanned': 0, 'files_changed': 0, 'new_blobs': 0, 'new_bytes': 0}
+
+    for prefix, root in _tracked_roots():
+        if not root.exists():
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                file_path = Path(dirpath) / filename
+                rel_path = f'{prefix}/{file_path.relative_to(root).as_posix()}'
+                try:
+                    stat = file_path.stat()
+                except OSError:
+                    continue
+                seen.add(rel_path)
+                stats['files_scanned'] += 1
+
+                old = previous.get(rel_path)
+                if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime_ns:
+                    continue
+
+                digest, stored_new = store.put_file(file_path)
+                if stored_new:
+                    stats['new_blobs'] += 1
+                    stats['new_bytes'] += stat.st_size
+                # A file that was only touched still gets an entry so the
+                # next run sees the new mtime and can skip it again.
+                stats['files_changed'] += 1
+                changed[rel_path] = {
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime_ns,
+                    'sha256': digest,
+                }
+
+    deleted = sorted(path for path in previous if path not in seen)
+    return changed, deleted, stats
+
+
+def _snapshot_sqlite(store, db_path):
+    """Take a consistent copy of the SQLite file and store it as page-aligned chunks"""
+    store.root.mkdir(parents=True, exist_ok=True)
+    fd, snapshot_path = tempfile.mkstemp(dir=store.root, prefix='.snapshot-', suffix='.sqlite3')
+    os.close(fd)
+    try:
+        source = sqlite3.connect(str(db_path))
+        target = sqlite3.connect(snapshot_path)
+        try:
+            source.backup(target)
+            page_size = target.execute('PRAGMA page_size').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+        chunks = []
+        new_blobs = 0
+        new_bytes = 0
+        with open(snapshot_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(DB_CHUNK_SIZE), b''):
+                digest, stored_new = store.put_bytes(chunk)
+                chunks.append(digest)
+                if stored_new:
+                    new_blobs += 1
+                    new_bytes += len(chunk)
+        database = {
+            'format': 'sqlite-pages',
+            'page_size': page_size,
+            'chunk_size': DB_CHUNK_SIZE,
+            'size': os.path.getsize(snapshot_path),
+            'chunks': chunks,
+        }
+        return database, new_blobs, new_bytes
+    finally:
+        os.unlink(snapshot_path)
+
+
+def _snapshot_dump(store):
+    """Dump each model separately so unchanged tables dedupe to existing blobs"""
+    from django.apps import apps
+
+    models = {}
+    new_blobs = 0
+    new_bytes = 0
+    for model in apps.get_models():
+        label = model._meta.label
+        buffer = io.StringIO()
+        call_command('dumpdata', label, format='json', stdout=buffer)
+        data = buffer.getvalue().encode('utf-8')
+        digest, stored_new = store.put_bytes(data)
+        models[label] = digest
+        if stored_new:
+            new_blobs += 1
+            new_bytes += len(data)
+    return {'format': 'json-dump', 'models': models}, new_blobs, new_bytes
+
+
+def _snapshot_database(store):
+    db_settings = settings.DATABASES['default']
+    if db_settings['ENGINE'] == 'django.db.backends.sqlite3':
+        db_path = db_settings['NAME']
+        if not os.path.exists(db_path):
+            return None, 0, 0
+        return _snapshot_sqlite(store, db_path)
+    return _snapshot_dump(store)
+
+
+def _select_parent(store, backup_type):
+    """Incremental backups chain off the newest backup, differential ones off the newest base"""
+    manifests = store.list_manifests()
+    if backup_type == 'differential':
+        manifests = [m for m in manifests if not m.get('parent')]
+    return manifests[-1]['id'] if manifests else None
+
+
+def create_incremental_backup(backup_name, backup_type='incremental', root=None):
+    """
+    Create a backup that only stores what changed since its parent.
+    Returns the manifest dict.
+    """
+    store = IncrementalBackupStore(root)
+    backup_id = _backup_id(backup_name)
+    if store.has_manifest(backup_id):
+        raise Exception(f'A backup named "{backup_id}" already exists')
+
+    parent = _select_parent(store, backup_type)
+    previous = store.resolve(parent)['files'] if parent else {}
+
+    files, deleted, stats = _scan_files(store, previous)
+    database, db_blobs, db_bytes = _snapshot_database(store)
+    stats['new_blobs'] += db_blobs
+    stats['new_bytes'] += db_bytes
+
+    manifest = {
+        'id': backup_id,
+        'name': backup_name,
+        'backup_type': backup_type if parent else 'base',
+        'parent': parent,
+        'created_at': datetime.now().isoformat(),
+        'database_engine': settings.DATABASES['default']['ENGINE'],
+        'files': files,
+        'deleted': deleted,
+        'database': database,
+        'stats': stats,
+    }
+    store.save_manifest(manifest)
+    return manifest
+
+
+def _restore_sqlite(store, database, db_path):
+    db_path = Path(db_path)
+    fd, temp_path = tempfile.mkstemp(dir=db_path.parent, prefix='.restore-', suffix='.sqlite3')
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            for digest in database['chunks']:
+                with store.open_blob(digest) as source:
+                    target.write(source.read())
+        connections.close_all()
+        os.replace(temp_path, db_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _flush_tables(models):
+    """Empty the tables of ``models`` (and their many-to-many tables) without sending delete signals"""
+    connection = connections['default']
+    tables = set()
+    for model in models:
+        tables.add(model._meta.db_table)
+        for field in model._meta.local_many_to_many:
+            if field.remote_field.through._meta.auto_created:
+                tables.add(field.remote_field.through._meta.db_table)
+    sql_list = connection.ops.sql_flush(no_style(), sorted(tables), allow_cascade=True)
+    connection.ops.execute_sql_flush(sql_list)
+
+
+def _restore_dump(store, database):
+    """
+    Replace the dumped tables with the backup's rows. The tables are emptied
+    first so rows created after the backup go, and every fixture is loaded
+    with one ``loaddata`` so foreign keys between models resolve whatever
+    order the models were dumped in. Nothing changes if any of it fails.
+    """
+    from django.apps import apps
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fixtures = []
+        for label, digest in database['models'].items():
+            path = os.path.join(temp_dir, f"{label.replace('.', '_')}.json")
+            with open(path, 'wb') as target, store.open_blob(digest) as source:
+                for block in iter(lambda: source.read(READ_BLOCK_SIZE), b''):
+                    target.write(block)
+            # An empty table dumps as "[]"; its table is still emptied below
+            if os.path.getsize(path) > 4 or Path(path).read_bytes().strip() != b'[]':
+                fixtures.append(path)
+
+        models = [apps.get_model(label) for label in database['models']]
+        with transaction.atomic():
+            _flush_tables(models)
+            if fixtures:
+                call_command('loaddata', *fixtures, verbosity=0)
+
+
+def _restore_files(store, files):
+    """
+    Make the tracked trees match the manifest: write back every file whose
+    on-disk copy differs, and delete the files it does not list. Returns the
+    number of files written or deleted.
+    """
+    roots = {}
+    for prefix, root in _tracked_roots():
+        roots.setdefault(prefix, root)
+
+    restored = 0
+    for rel_path, entry in files.items():
+        prefix, _, sub_path = rel_path.partition('/')
+        root = roots.get(prefix)
+        if root is None:
+            continue
+        target = root / sub_path
+        try:
+            stat = target.stat()
+            if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime']:
+                continue
+        except OSError:
+            pass
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with store.open_blob(entry['sha256']) as source, open(target, 'wb') as dest:
+            for block in iter(lambda: source.read(READ_BLOCK_SIZE), b''):
+                dest.write(block)
+        os.utime(target, ns=(entry['mtime'], entry['mtime']))
+        restored += 1
+
+    # Files created after the backup
+    for prefix, root in _tracked_roots():
+        if not root.exists():
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                file_path = Path(dirpath) / filename
+                if f'{prefix}/{file_path.relative_to(root).as_posix()}' in files:
+                    continue
+                try:
+                    file_path.unlink()
+                except FileNotFoundError:
+                    continue
+                restored += 1
+    return restored
+
+
+def restore_incremental_backup(backup_id, root=None):
+    """Restore the database and files as they were at ``backup_id``"""
+    store = IncrementalBackupStore(root)
+    if not store.has_manifest(backup_id):
+        raise Exception("Backup manifest not found")
+
+    state = store.resolve(backup_id)
+    database = state['database']
+    if database:
+        if database['format'] == 'sqlite-pages':
+            _restore_sqlite(store, database, settings.DATABASES['default']['NAME'])
+        else:
+            _restore_dump(store, database)
+
+    return _restore_files(store, state['files'])
+
+
+def delete_incremental_backup(backup_id, root=None):
+    """
+    Delete a backup. Its changes are folded into its children so their
+    chains stay restorable, then unreferenced blobs are removed.
+    Returns bytes freed.
+    """
+    store = IncrementalBackupStore(root)
+    if not store.has_manifest(backup_id):
+        raise Exception("Backup manifest not found")
+
+    manifest = store.load_manifest(backup_id)
+    for child in store.list_manifests():
+        if child.get('parent') != backup_id:
+            continue
+        files = dict(manifest.get('files', {}))
+        deleted = set(manifest.get('deleted', []))
+        for path in child.get('deleted', []):
+            files.pop(path, None)
+            deleted.add(path)
+        for path, entry in child.get('files', {}).items():
+            files[path] = entry
+            deleted.discard(path)
+        child['files'] = files
+        child['deleted'] = sorted(deleted)
+        child['parent'] = manifest.get('parent')
+        if not child['parent']:
+            child['backup_type'] = 'base'
+        store.save_manifest(child)
+
+    store.manifest_path(backup_id).unlink()
+    return store.collect_garbage()
+
+
+def list_incremental_backups(root=None):
+    """Summaries of incremental backups for the backup page"""
+    store = IncrementalBackupStore(root)
+    backups = []
+    for manifest in store.list_manifests():
+        stats = manifest.get('stats', {})
+        created = datetime.fromisoformat(manifest['created_at'])
+        backups.append({
+            'id': manifest['id'],
+            'name': manifest['name'],
+            'path': str(store.manifest_path(manifest['id'])),
+            'type': manifest['backup_type'].capitalize(),
+            'size': f"{round(stats.get('new_bytes', 0) / (1024**3), 2)} GB",
+            'created': created.strftime('%Y-%m-%d %H:%M:%S'),
+            'status': 'Completed',
+            'parent': manifest.get('parent'),
+            'files_changed': stats.get('files_changed', 0),
+        })
+    return backups
@@ -0,0 +1,51 @@
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from core.models import Job
+from core.ws_frames import FrameMixin
+
+
+class JobProgressConsumer(FrameMixin, AsyncWebsocketConsumer):
+    """Streams status/progress updates for a single background job"""
+
+    async def connect(self):
+        self.job_id = self.scope['url_route']['kwargs']['job_id']
+        self.job_group_name = f'job_{self.job_id}'
+
+        job = await self.get_job()
+        if job is None:
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(
+            self.job_group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+
+        # Send the current state so late subscribers don't miss a finished job
+        await self.send_payload({
+            'type': 'job_update',
+            'job': job
+        })
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
+            self.job_group_name,
+            self.channel_name
+        )
+
+    async def job_update(self, event):
+        await self.send_frame(event)
+
+    @database_sync_to_async
+    def get_job(self):
+        """Return the job as a dict if the connected user owns it"""
+        user = self.scope['user']
+        if not user.is_authenticated:
+            return None
+        jobs = Job.objects.filter(id=self.job_id)
+        if not user.is_superuser:
+            jobs = jobs.filter(created_by=user)
+        job = jobs.first()
+        return job.to_dict() if job else None
@@ -0,0 +1,189 @@
+"""
+Handlers for background jobs (see core.jobs).
+
+Each handler takes a JobContext plus the JSON payload the view queued and
+returns a JSON-serialisable result stored on the Job.
+"""
+import csv
+import io
+
+from django.contrib.auth.models import User
+
+from .bulk_operations import run_company_operation, run_employee_operation
+from .image_derivatives import generate_derivatives
+from .jobs import JobError, job_upload_storage, register_job, schedule_recurring
+from .models import ActivityLog, Company, Employee, OnboardingAssignment
+from .notification_dispatch import NOTIFICATION_DISPATCH_INTERVAL, dispatch_notifications
+from .onboarding_graph import refresh_pending
+from .platform_stats import PLATFORM_STATS_ROLLUP_INTERVAL, refresh_recent
+from .report_artifacts import build_report_artifact, get_fresh_artifact
+from .sessions import SESSION_CLEANUP_INTERVAL, clear_expired_sessions
+
+
+def _get_company(company_id):
+    try:
+        return Company.objects.get(id=company_id)
+    except Company.DoesNotExist:
+        raise JobError(f"Company {company_id} no longer exists")
+
+
+def _get_user(user_id):
+    if not user_id:
+        return None
+    return User.objects.filter(id=user_id).first()
+
+
+@register_job('create_backup')
+def create_backup_job(ctx, backup_name, backup_type='full', backup_location=''):
+    """Run a full or incremental backup outside the request thread"""
+    from .views import create_real_backup
+
+    ctx.progress(0, message=f'Creating {backup_type} backup')
+    backup_path = create_real_backup(backup_name, backup_type, backup_location)
+    return {'backup_name': backup_name, 'backup_path': backup_path}
+
+
+def _report_job(ctx, kind, action, company_id, params, key=None, user_id=None, ip_address=None, user_agent=''):
+    """
+    Write the report to a stored artifact that the download endpoint serves.
+    ``key`` is the params hash; it is only in the payload so views can find
+    a job already building the same report.
+    """
+    company = _get_company(company_id)
+    user = _get_user(user_id)
+
+    artifact = get_fresh_artifact(kind, company, params)
+    if artifact is None:
+        artifact = build_report_artifact(kind, company, params, user=user, progress=ctx.progress)
+
+    ActivityLog.objects.create(
+        user=user,
+        company=company,
+        action=action,
+        description=f'Generated {params["report_type"]} {kind} report',
+        ip_address=ip_address,
+        user_agent=user_agent
+    )
+
+    return {
+        'artifact_id': artifact.id,
+        'key': artifact.params_hash,
+        'filename': artifact.filename,
+        'row_count': artifact.row_count,
+    }
+
+
+@register_job('attendance_report')
+def attendance_report_job(ctx, company_id, params, **kwargs):
+    """Build the attendance report for the filters chosen in the report modal"""
+    return _report_job(ctx, 'attendance', 'ATTENDANCE_REPORT_GENERATED', company_id, params, **kwargs)
+
+
+@register_job('performance_report')
+def performance_report_job(ctx, company_id, params, **kwargs):
+    """Build the performance report for the filters chosen in the report modal"""
+    return _report_job(ctx, 'performance', 'PERFORMANCE_REPORT_GENERATED', company_id, params, **kwargs)
+
+
+@register_job('bulk_company_operations')
+def bulk_company_operations_job(ctx, operation, company_ids, params=None, user_id=None, ip_address=None):
+    """Apply an owner bulk operation to the selected companies (see core.bulk_operations)"""
+    user = _get_user(user_id) or ctx.job.created_by
+    return run_company_operation(
+        operation, company_ids, params, user=user, ip_address=ip_address, progress=ctx.progress
+    )
+
+
+@register_job('bulk_employee_operations')
+def bulk_employee_operations_job(ctx, company_id, operation, employee_ids, user_id=None, ip_address=None):
+    """Verify or delete the selected employees of a company (see core.bulk_operations)"""
+    return run_employee_operation(
+        _get_company(company_id), operation, employee_ids,
+        user=_get_user(user_id), ip_address=ip_address, progress=ctx.progress,
+    )
+
+
+@register_job('import_employees')
+def import_employees_job(ctx, company_id, file_path):
+    """Create employees from an uploaded CSV stashed with ``stash_upload``; the file is deleted afterwards"""
+    try:
+        company = _get_company(company_id)
+        with job_upload_storage.open(file_path, 'rb') as f:
+            decoded_file = f.read().decode('utf-8')
+    except FileNotFoundError:
+        raise JobError("Uploaded CSV file is no longer available")
+    finally:
+        job_upload_storage.delete(file_path)
+
+    rows = list(csv.DictReader(io.StringIO(decoded_file)))
+    total = len(rows)
+    imported_count = 0
+    errors = []
+
+    for index, row in enumerate(rows, start=1):
+        try:
+            Employee.objects.create(
+                company=company,
+                employee_id=row['employee_id'],
+                first_name=row['first_name'],
+                last_name=row['last_name'],
+                email=row['email'],
+                department=row.get('department', ''),
+                position=row.get('position', ''),
+                is_verified=True
+            )
+            imported_count += 1
+        except Exception as e:
+            errors.append(f"Row {index}: {e}")
+        ctx.progress(index, total, f'Imported {imported_count} of {total} rows')
+
+    return {
+        'imported_count': imported_count,
+        'error_count': len(errors),
+        'errors': errors[:100],
+    }
+
+
+@register_job('photo_derivatives')
+def photo_derivatives_job(ctx, employee_id, photo):
+    """Render the resized JPEG/WebP versions of an employee photo"""
+    employee = Employee.objects.filter(id=employee_id, photo=photo).first()
+    if employee is None:
+        # Photo replaced (its own job handles the new one) or employee deleted
+        return {'skipped': True}
+    recorded = generate_derivatives(employee)
+    return {'employee_id': employee_id, 'recorded': recorded}
+
+
+@register_job('clear_expired_sessions')
+def clear_expired_sessions_job(ctx, repeat=False):
+    """Delete expired sessions; a repeating job queues its next run SESSION_CLEANUP_INTERVAL later"""
+    removed = clear_expired_sessions()
+    if repeat:
+        schedule_recurring('clear_expired_sessions', delay=SESSION_CLEANUP_INTERVAL, current_job=ctx.job)
+    return {'removed': removed}
+
+
+@register_job('dispatch_notifications')
+def dispatch_notifications_job(ctx, repeat=False):
+    """Deliver due notifications and build digests; a repeating job runs again NOTIFICATION_DISPATCH_INTERVAL later"""
+    result = dispatch_notifications()
+    if repeat:
+        schedule_recurring('dispatch_notifications', delay=NOTIFICATION_DISPATCH_INTERVAL, current_job=ctx.job)
+    return result
+
+
+@register_job('rollup_platform_stats')
+def rollup_platform_stats_job(ctx, repeat=False):
+    """Re-roll yesterday's and today's DailyPlatformStats; a repeating job runs again PLATFORM_STATS_ROLLUP_INTERVAL later"""
+    days = refresh_recent()
+    if repeat:
+        schedule_recurring('rollup_platform_stats', delay=PLATFORM_STATS_ROLLUP_INTERVAL, current_job=ctx.job)
+    return {'days': days}
+
+
+@register_job('refresh_onboarding_dependencies')
+def refresh_onboarding_dependencies_job(ctx, workflow_id):
+    """Recompute the pending dependencies of a workflow's assignments after its task graph changed"""
+    changed = refresh_pending(OnboardingAssignment.objects.filter(workflow_id=workflow_id))
+    return {'changed': changed}
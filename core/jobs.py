@@ -0,0 +1,268 @@
+"""
+Lightweight DB-backed background job queue.
+
+Views call ``enqueue()`` and return the job ID immediately; the
+``run_jobs`` management command claims queued jobs and runs the registered
+handler in a thread pool. Handlers receive a ``JobContext`` they can use to
+report progress, which is saved on the job and pushed to the ``job_<id>``
+Channels group for live updates.
+
+A worker holds a job through its lease (``locked_by``/``locked_at``).
+The ``run_jobs`` worker renews the leases of the jobs it is running every
+LEASE_RENEW_INTERVAL, however long a handler goes without reporting
+progress, and ``JobContext.progress()`` renews it too. ``run_job`` records
+the outcome only while the worker still holds the lease, so a job requeued
+as stale is never finished by the worker that lost it.
+
+Claiming uses ``SELECT ... FOR UPDATE SKIP LOCKED`` on databases that
+support it so several workers never pick the same row. SQLite has no row
+locks, so there each candidate is claimed with a conditional UPDATE and
+only the worker whose UPDATE matched a QUEUED row runs it.
+"""
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .ws_frames import frame_event
+
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {}
+
+# Retry backoff: base * 2^(attempt - 1) seconds, capped, plus jitter
+RETRY_BACKOFF_BASE = 10
+RETRY_BACKOFF_MAX = 15 * 60
+
+# Running jobs whose lease is older than this are assumed to belong to a
+# dead worker and are put back on the queue.
+STALE_LOCK_TIMEOUT = timedelta(minutes=30)
+
+# Workers renew the leases of running jobs this often
+LEASE_RENEW_INTERVAL = timedelta(minutes=5)
+
+
+# Uploads waiting for a job, kept out of MEDIA_ROOT so they are never served
+job_upload_storage = FileSystemStorage(
+    location=getattr(settings, 'JOB_UPLOAD_ROOT', settings.BASE_DIR / 'job_uploads')
+)
+
+
+def stash_upload(uploaded_file, prefix):
+    """Save an upload for a job under a random name; returns the name to put in the payload"""
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    return job_upload_storage.save(f'{prefix}_{uuid.uuid4().hex}{extension}', uploaded_file)
+
+
+class JobError(Exception):
+    """Raised by handlers for failures that should not be retried"""
+
+
+def register_job(job_type):
+    """Decorator registering a handler: ``handler(ctx, **payload) -> result``"""
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+def enqueue(job_type, payload=None, user=None, company=None, max_attempts=3, delay=None):
+    """Queue a job and return it"""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+    run_after = timezone.now()
+    if delay:
+        run_after += delay
+    return Job.objects.create(
+        job_type=job_type,
+        payload=payload or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+        company=company,
+        max_attempts=max_attempts,
+        run_after=run_after,
+    )
+
+
+def schedule_recurring(job_type, delay=None, current_job=None):
+    """
+    Queue a self-rescheduling job (payload ``{'repeat': True}``) unless a
+    run is already queued or running. Its handler calls this again with
+    ``current_job`` to queue the next run. Returns the new job or None.
+    """
+    pending = Job.objects.filter(job_type=job_type, status__in=['QUEUED', 'RUNNING'])
+    if current_job is not None:
+        pending = pending.exclude(pk=current_job.pk)
+    if pending.exists():
+        return None
+    return enqueue(job_type, {'repeat': True}, delay=delay)
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def broadcast(job):
+    """Push the job's current state to its Channels group"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(job.group_name, frame_event('job_update', {
+            'type': 'job_update',
+            'job': job.to_dict(),
+        }))
+    except Exception as e:
+        print(f"Error broadcasting job {job.pk} update: {e}")
+
+
+class JobContext:
+    """Handed to job handlers for progress reporting"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, done, total=None, message=''):
+        """
+        Report progress as ``done`` out of ``total`` (or a percentage when
+        ``total`` is omitted) and renew the job's lease. Writes are skipped
+        while the percentage and message are unchanged and the lease is
+        recent, so tight loops can call this every iteration.
+        """
+        if total:
+            percent = int(done * 100 / total)
+        else:
+            percent = int(done)
+        percent = max(0, min(100, percent))
+        now = timezone.now()
+        changed = percent != self.job.progress or message[:255] != self.job.progress_message
+        if not changed and now - (self.job.locked_at or now) < LEASE_RENEW_INTERVAL:
+            return
+        self.job.progress = percent
+        self.job.progress_message = message[:255]
+        self.job.locked_at = now
+        Job.objects.filter(pk=self.job.pk, locked_by=self.job.locked_by).update(
+            progress=percent,
+            progress_message=self.job.progress_message,
+            locked_at=now,
+            updated_at=now,
+        )
+        if changed:
+            broadcast(self.job)
+
+
+def _claim_update(worker_id, now):
+    return dict(
+        status='RUNNING',
+        locked_by=worker_id,
+        locked_at=now,
+        started_at=now,
+        attempts=F('attempts') + 1,
+        updated_at=now,
+    )
+
+
+def claim_jobs(worker_id, limit=1):
+    """Atomically claim up to ``limit`` runnable jobs for this worker"""
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    runnable = Job.objects.filter(status='QUEUED', run_after__lte=now).order_by('run_after', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(runnable.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            if ids:
+                Job.objects.filter(id__in=ids).update(**_claim_update(worker_id, now))
+    else:
+        # SQLite fallback: a conditional UPDATE per candidate; rowcount tells
+        # us whether this worker won the race.
+        ids = []
+        for job_id in runnable.values_list('id', flat=True)[:limit]:
+            if Job.objects.filter(id=job_id, status='QUEUED').update(**_claim_update(worker_id, now)):
+                ids.append(job_id)
+
+    return list(Job.objects.filter(id__in=ids).order_by('id'))
+
+
+def renew_leases(worker_id, job_ids):
+    """Renew the leases this worker holds on ``job_ids``; returns how many it still held"""
+    if not job_ids:
+        return 0
+    now = timezone.now()
+    return Job.objects.filter(id__in=job_ids, status='RUNNING', locked_by=worker_id).update(
+        locked_at=now,
+        updated_at=now,
+    )
+
+
+def requeue_stale_jobs(timeout=STALE_LOCK_TIMEOUT):
+    """Put jobs whose worker disappeared back on the queue"""
+    cutoff = timezone.now() - timeout
+    return Job.objects.filter(status='RUNNING', locked_at__lt=cutoff).update(
+        status='QUEUED',
+        locked_by='',
+        locked_at=None,
+        updated_at=timezone.now(),
+    )
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_BACKOFF_BASE * 2 ** max(attempts - 1, 0), RETRY_BACKOFF_MAX)
+    return timedelta(seconds=delay + random.uniform(0, RETRY_BACKOFF_BASE))
+
+
+def _finish(job, **fields):
+    """Record the outcome of ``job`` if this worker still holds its lease; returns whether it did"""
+    fields['updated_at'] = timezone.now()
+    if not Job.objects.filter(pk=job.pk, status='RUNNING', locked_by=job.locked_by).update(**fields):
+        logger.warning('Job %s is no longer held by %s; its outcome was discarded', job.pk, job.locked_by)
+        job.refresh_from_db()
+        return False
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return True
+
+
+def run_job(job):
+    """Execute a claimed job and record the outcome"""
+    handler = JOB_HANDLERS.get(job.job_type)
+    if handler is None:
+        _finish(
+            job,
+            status='FAILED',
+            error=f"No handler registered for job type {job.job_type}",
+            finished_at=timezone.now(),
+        )
+        broadcast(job)
+        return job
+
+    broadcast(job)
+    try:
+        result = handler(JobContext(job), **job.payload)
+    except Exception as e:
+        # The traceback goes to the log only: job errors are shown to users
+        logger.exception('Job %s (%s) failed', job.pk, job.job_type)
+        now = timezone.now()
+        outcome = dict(error=str(e), locked_by='', locked_at=None)
+        if not isinstance(e, JobError) and job.attempts < job.max_attempts:
+            outcome.update(status='QUEUED', run_after=now + retry_delay(job.attempts))
+        else:
+            outcome.update(status='FAILED', finished_at=now)
+        _finish(job, **outcome)
+    else:
+        _finish(job, status='SUCCEEDED', result=result, error='', progress=100, finished_at=timezone.now())
+
+    broadcast(job)
+    return job
@@ -4,8 +4,9 @@ from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
 from core.models import LeaveRequest, Employee, CompanyAdmin
 from django.utils import timezone
+from core.ws_frames import FrameMixin
 
-class LeaveRequestConsumer(AsyncWebsocketConsumer):
+class LeaveRequestConsumer(FrameMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.room_group_name = 'leave_requests'
         
@@ -57,18 +58,10 @@ class LeaveRequestConsumer(AsyncWebsocketConsumer):
 
     # Receive message from room group
     async def leave_request_update(self, event):
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'leave_request_update',
-            'action': event['action'],
-            'data': event['data']
-        }))
+        # Send message to WebSocket (pre-encoded by the sender)
+        await self.send_frame(event)
     
     # Receive leave balance update from room group
     async def leave_balance_update(self, event):
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'leave_balance_update',
-            'action': event['action'],
-            'data': event['data']
-        }))
+        # Send message to WebSocket (pre-encoded by the sender)
+        await self.send_frame(event)
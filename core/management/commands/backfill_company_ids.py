@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.tenancy import COMPANY_SOURCES, backfill
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the denormalized company column of tasks, attendance and other company-scoped child tables, '
+        'e.g. after rows were moved to another parent without save()'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', help='Only refresh this model, e.g. Attendance (repeatable)')
+        parser.add_argument('--batch-size', type=int, help='Rows per UPDATE')
+
+    def handle(self, *args, **options):
+        models = {model.__name__: model for model in COMPANY_SOURCES}
+        names = options['model'] or list(models)
+        unknown = [name for name in names if name not in models]
+        if unknown:
+            raise CommandError(f'Unknown model(s): {", ".join(unknown)}. Choose from {", ".join(models)}')
+
+        for name in names:
+            updated = backfill(models[name], refresh=True, batch_size=options['batch_size'])
+            self.stdout.write(f'{name}: {updated} row(s) updated')
+        self.stdout.write(self.style.SUCCESS('Refresh complete'))
@@ -0,0 +1,68 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.blobs import BLOB_FIELDS, BLOB_DIR, adopt_file, hash_file
+
+
+class Command(BaseCommand):
+    help = 'Move existing documents and chat attachments into the content-addressed blob store, collapsing duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Processes used for hashing')
+        parser.add_argument('--dry-run', action='store_true', help='Report duplicates without changing anything')
+
+    def handle(self, *args, **options):
+        # Storage name -> [(model, field, pk)] for every row not yet in the blob store
+        references = defaultdict(list)
+        for model, field in BLOB_FIELDS.items():
+            rows = (
+                model.objects.exclude(**{f'{field}__isnull': True})
+                .exclude(**{field: ''})
+                .exclude(**{f'{field}__startswith': f'{BLOB_DIR}/'})
+                .values_list('pk', field)
+            )
+            for pk, name in rows.iterator():
+                references[name].append((model, field, pk))
+
+        names = []
+        for name in references:
+            if default_storage.exists(name):
+                names.append(name)
+            else:
+                self.stdout.write(self.style.WARNING(f'Missing file, skipped: {name}'))
+
+        # Hash in worker processes; they must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=django.setup) as pool:
+            hashes = dict(zip(names, pool.map(hash_file, [default_storage.path(n) for n in names], chunksize=16)))
+
+        by_digest = defaultdict(list)
+        for name, (digest, size) in hashes.items():
+            by_digest[digest].append(name)
+        duplicate_files = sum(len(group) - 1 for group in by_digest.values())
+        reclaimed = sum(hashes[group[0]][1] * (len(group) - 1) for group in by_digest.values())
+
+        if not options['dry_run']:
+            for name, (digest, size) in hashes.items():
+                rows = references[name]
+                blob = adopt_file(name, digest, size, refs=len(rows))
+                by_model = defaultdict(list)
+                for model, field, pk in rows:
+                    by_model[(model, field)].append(pk)
+                for (model, field), pks in by_model.items():
+                    updates = {field: blob.name}
+                    if any(f.name == 'file_hash' for f in model._meta.fields):
+                        updates['file_hash'] = digest
+                    model.objects.filter(pk__in=pks).update(**updates)
+
+        verb = 'Would collapse' if options['dry_run'] else 'Collapsed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Hashed {len(hashes)} file(s) into {len(by_digest)} blob(s). '
+            f'{verb} {duplicate_files} duplicate(s), {reclaimed / (1024 * 1024):.1f} MB.'
+        ))
@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.jobs import schedule_recurring
+from core.models import DailyPlatformStats
+from core.platform_stats import first_activity_date, rollup
+
+
+class Command(BaseCommand):
+    help = 'Fill in DailyPlatformStats up to today, or queue the recurring rollup job for run_jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Rebuild from this date (YYYY-MM-DD) instead of the last stored day')
+        parser.add_argument('--full', action='store_true', help='Rebuild from the first day with any activity')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue the rollup_platform_stats job, which re-queues itself every PLATFORM_STATS_ROLLUP_INTERVAL')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            job = schedule_recurring('rollup_platform_stats')
+            if job is None:
+                self.stdout.write('Platform stats rollup job already queued')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Queued {job}'))
+            return
+
+        today = timezone.localdate()
+        if options['since']:
+            try:
+                start = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date (YYYY-MM-DD)')
+        elif options['full']:
+            start = first_activity_date() or today
+        else:
+            # The last stored day may have been rolled up before it ended
+            start = (
+                DailyPlatformStats.objects.order_by('-date').values_list('date', flat=True).first()
+                or first_activity_date()
+                or today
+            )
+
+        days = rollup(min(start, today), today)
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {days} day(s) from {min(start, today)} to {today}'))
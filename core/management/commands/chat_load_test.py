@@ -0,0 +1,131 @@
+import asyncio
+import json
+import time
+
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import re_path
+
+from core import chat_consumers, consumers
+from core.models import ChatRoom
+
+
+# The room consumer is what ws/chat/room/ is routed to; the chat consumer
+# (core.consumers) is not routed, so it gets a path of its own here.
+application = URLRouter([
+    re_path(r'^ws/chat/room/(?P<room_id>\w+)/$', chat_consumers.ChatConsumer.as_asgi()),
+    re_path(r'^ws/chat/(?P<room_id>\w+)/$', consumers.ChatConsumer.as_asgi()),
+])
+
+
+class Client(ApplicationCommunicator):
+    """Minimal in-process WebSocket client (channels.testing needs daphne)"""
+
+    def __init__(self, path, user, subprotocols=()):
+        super().__init__(application, {
+            'type': 'websocket',
+            'path': path,
+            'headers': [],
+            'query_string': b'',
+            'subprotocols': list(subprotocols),
+            'user': user,
+        })
+
+    async def connect(self):
+        await self.send_input({'type': 'websocket.connect'})
+        return (await self.receive_output(timeout=5))['type'] == 'websocket.accept'
+
+    async def send_json(self, data):
+        await self.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_text(self, timeout=30):
+        return (await self.receive_output(timeout))['text']
+
+    async def disconnect(self):
+        await self.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.wait(timeout=5)
+
+
+CONSUMER_PATHS = {
+    'room': 'ws/chat/room/{room_id}/',
+    'chat': 'ws/chat/{room_id}/',
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure chat consumer throughput (events per second in one worker process)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, help='Chat room ID (defaults to the active room with most participants)')
+        parser.add_argument('--clients', type=int, default=10, help='Number of connected clients')
+        parser.add_argument('--messages', type=int, default=500, help='Events sent by the first client')
+        parser.add_argument('--consumer', choices=sorted(CONSUMER_PATHS), default='room')
+        parser.add_argument('--event', choices=['typing', 'chat_message'], default='typing',
+                            help='chat_message is only handled by the chat consumer and writes messages to the database')
+        parser.add_argument('--rate-limit', action='store_true',
+                            help='Keep the per-connection rate limit (off by default so every event is processed)')
+
+    def handle(self, *args, **options):
+        rooms = ChatRoom.objects.filter(is_active=True)
+        if options['room']:
+            rooms = rooms.filter(id=options['room'])
+        room = max(rooms, key=lambda r: r.participants.filter(user_account__isnull=False).count(), default=None)
+        if room is None:
+            raise CommandError('No active chat room found')
+
+        users = [employee.user_account for employee in room.participants.filter(user_account__isnull=False)]
+        if not users:
+            raise CommandError(f'Room {room.id} has no participants with user accounts')
+
+        if not options['rate_limit']:
+            chat_consumers.CHAT_RATE_LIMIT = chat_consumers.CHAT_RATE_BURST = 10 ** 9
+
+        clients = max(1, options['clients'])
+        clients_users = [users[i % len(users)] for i in range(clients)]
+        path = CONSUMER_PATHS[options['consumer']].format(room_id=room.id)
+
+        elapsed, delivered = asyncio.run(
+            self.run_load(path, clients_users, options['messages'], options['event'])
+        )
+
+        sent = options['messages']
+        self.stdout.write(f'Room {room.id} ({room.name}), consumer={options["consumer"]}, event={options["event"]}')
+        self.stdout.write(f'{clients} clients, {sent} events processed in {elapsed:.2f}s, {delivered} frames delivered')
+        self.stdout.write(self.style.SUCCESS(f'{sent / elapsed:.0f} events/s per worker'))
+
+    async def run_load(self, path, users, messages, event):
+        communicators = []
+        for user in users:
+            communicator = Client(path, user)
+            if not await communicator.connect():
+                raise CommandError(f'{user.username} could not join {path}')
+            communicators.append(communicator)
+
+        # The chat consumer sends room info on connect
+        for communicator in communicators:
+            while not await communicator.receive_nothing(timeout=0.05):
+                await communicator.receive_text()
+
+        sender = communicators[0]
+        start = time.perf_counter()
+        for i in range(messages):
+            await sender.send_json({'type': event, 'content': f'load test {i}', 'is_typing': True})
+        # Events are processed in order; wait until the consumer has taken the last one
+        while not sender.input_queue.empty():
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - start
+
+        # Count what reached the clients (typing events are coalesced server-side)
+        async def collect(communicator):
+            delivered = 0
+            while not await communicator.receive_nothing(timeout=1):
+                await communicator.receive_text()
+                delivered += 1
+            return delivered
+
+        delivered = sum(await asyncio.gather(*(collect(c) for c in communicators)))
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return elapsed, delivered
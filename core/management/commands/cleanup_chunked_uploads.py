@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import evict_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned resumable uploads and their partial files'
+
+    def handle(self, *args, **options):
+        removed = evict_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} stale upload(s)'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.report_artifacts import evict_expired_artifacts
+
+
+class Command(BaseCommand):
+    help = 'Delete stored report files whose TTL has expired'
+
+    def handle(self, *args, **options):
+        removed = evict_expired_artifacts()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired report artifact(s)'))
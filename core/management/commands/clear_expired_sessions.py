@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.jobs import schedule_recurring
+from core.sessions import clear_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions, or queue the recurring cleanup job for run_jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue the clear_expired_sessions job, which re-queues itself every SESSION_CLEANUP_INTERVAL')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            job = schedule_recurring('clear_expired_sessions')
+            if job is None:
+                self.stdout.write('Session cleanup job already queued')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Queued {job}'))
+            return
+
+        removed = clear_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired session(s)'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.jobs import schedule_recurring
+from core.notification_dispatch import dispatch_notifications
+
+
+class Command(BaseCommand):
+    help = 'Deliver due notifications and build digests, or queue the recurring dispatch job for run_jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue the dispatch_notifications job, which re-queues itself every NOTIFICATION_DISPATCH_INTERVAL')
+        parser.add_argument('--batch-size', type=int, default=None, help='Users per batch')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            job = schedule_recurring('dispatch_notifications')
+            if job is None:
+                self.stdout.write('Notification dispatch job already queued')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Queued {job}'))
+            return
+
+        result = dispatch_notifications(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['sent']} sent, {result['digests']} digest(s) built, "
+            f"{result['deferred']} deferred, {result['skipped']} skipped"
+        ))
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.forecasting import ForecastUnavailable, METHODS, fit_holt, forecast, np
+
+
+class Command(BaseCommand):
+    help = 'Time the forecasting models on a synthetic daily series (5 years by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=5 * 365, help='Length of the series')
+        parser.add_argument('--horizon', type=int, default=90, help='Days forecast (and held out to score accuracy)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per model; the fastest is reported')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError(str(ForecastUnavailable('Forecasting requires NumPy')))
+        days, horizon = options['days'], options['horizon']
+        if days <= horizon + 30:
+            raise CommandError('--days must exceed --horizon by at least 30')
+
+        # Growing MRR-like series with weekly and yearly seasonality and noise
+        rng = np.random.default_rng(options['seed'])
+        t = np.arange(days, dtype=float)
+        series = (
+            1000 + 2.5 * t
+            + 60 * np.sin(2 * np.pi * t / 7)
+            + 250 * np.sin(2 * np.pi * t / 365.25)
+            + rng.normal(0, 40, days)
+        )
+        train, test = series[:-horizon], series[-horizon:]
+        self.stdout.write(f'{days} days, forecasting {horizon} (held out), best of {options["repeat"]} run(s)')
+
+        for method in METHODS + ('auto',):
+            elapsed, result = self.time(lambda: forecast(train, horizon, method=method), options['repeat'])
+            error = float(np.mean(np.abs(result['forecast'] - test)))
+            covered = float(np.mean((test >= result['lower']) & (test <= result['upper']))) * 100
+            self.stdout.write(
+                f'{method:>9} ({result["method"]:>8}): {elapsed * 1000:8.2f} ms, '
+                f'MAE {error:8.1f}, {covered:5.1f}% of actuals inside the 90% band'
+            )
+
+        # Holt's grid search run one parameter pair at a time, for comparison
+        grid = np.linspace(0.05, 0.95, 10)
+        elapsed, _ = self.time(lambda: [self.holt_sse(train, a, b) for a in grid for b in grid], 1)
+        vectorized, _ = self.time(lambda: fit_holt(train, horizon, 1.645), options['repeat'])
+        self.stdout.write(
+            f'Holt grid search: {elapsed * 1000:.1f} ms pair by pair in Python, '
+            f'{vectorized * 1000:.1f} ms vectorized ({elapsed / vectorized:.0f}x)'
+        )
+
+    def time(self, run, repeat):
+        best, result = None, None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def holt_sse(self, values, alpha, beta):
+        level, trend, sse = values[0], values[1] - values[0], 0.0
+        for value in values[1:]:
+            predicted = level + trend
+            error = value - predicted
+            sse += error * error
+            level = predicted + alpha * error
+            trend += alpha * beta * error
+        return sse
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Context, Template
+from django.utils import timezone
+
+from core.models import NotificationTemplate
+from core.template_cache import compiled_templates
+
+
+SAMPLE_TEMPLATE = {
+    'title_template': 'Happy birthday, {{ first_name }}!',
+    'message_template': (
+        'Everyone at {{ company }} wishes you a great day, {{ first_name }} {{ last_name }}.'
+        '{% if department %} Your friends in {{ department }} have something for you.{% endif %}'
+    ),
+    'email_subject_template': 'Happy birthday from {{ company }}',
+    'email_template': (
+        'Dear {{ first_name }},\n\n{% for wish in wishes %}- {{ wish|capfirst }}\n{% endfor %}\n'
+        'Best regards,\n{{ company }}'
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure NotificationTemplate rendering: parsing per render vs. cached compiled templates and render_many'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=10000, help='Contexts rendered per mode')
+        parser.add_argument('--template-type', help='Benchmark a stored template (defaults to a sample birthday template)')
+
+    def handle(self, *args, **options):
+        if options['template_type']:
+            template = NotificationTemplate.objects.filter(template_type=options['template_type']).first()
+            if template is None:
+                raise CommandError(f'No {options["template_type"]} template found')
+        else:
+            # Not saved; id and updated_at only give it a cache key
+            template = NotificationTemplate(id=0, template_type='BIRTHDAY', updated_at=timezone.now(), **SAMPLE_TEMPLATE)
+
+        contexts = [
+            {
+                'first_name': f'Employee{i}',
+                'last_name': 'Example',
+                'company': 'Example Corp',
+                'department': 'Engineering' if i % 2 else '',
+                'wishes': ['many happy returns', 'enjoy the cake'],
+            }
+            for i in range(options['renders'])
+        ]
+        compiled_templates.clear()
+
+        modes = [
+            ('parse per render', lambda: [self.render_uncached(template, context) for context in contexts]),
+            ('render_template (cached)', lambda: [template.render_template(context) for context in contexts]),
+            ('render_many', lambda: template.render_many(contexts)),
+        ]
+        self.stdout.write(f'{len(contexts)} renders of the {template.template_type} template')
+        baseline = None
+        for label, run in modes:
+            start = time.perf_counter()
+            results = run()
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f'{label:>26}: {elapsed * 1000:8.1f} ms, {len(results) / elapsed:8.0f} renders/s, '
+                f'{baseline / elapsed:5.1f}x'
+            )
+
+    def render_uncached(self, template, context):
+        """What render_template did before compiled templates were cached"""
+        title = Template(template.title_template).render(Context(context))
+        message = Template(template.message_template).render(Context(context))
+        return {
+            'title': title,
+            'message': message,
+            'email_subject': Template(template.email_subject_template).render(Context(context)) if template.email_subject_template else title,
+            'email_content': Template(template.email_template).render(Context(context)) if template.email_template else message
+        }
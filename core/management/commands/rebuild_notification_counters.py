@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.notification_counters import reset_counters
+
+
+class Command(BaseCommand):
+    help = 'Drop the denormalized unread notification counters so they are recounted on next read'
+
+    def handle(self, *args, **options):
+        removed = reset_counters()
+        self.stdout.write(self.style.SUCCESS(f'Reset {removed} counter(s)'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.models import CompanySubscription
+from core.revenue import rebuild_intervals
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SubscriptionInterval table that revenue figures are computed from'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', help='Only rebuild this company (repeatable)')
+
+    def handle(self, *args, **options):
+        subscriptions = CompanySubscription.objects.all()
+        if options['company']:
+            subscriptions = subscriptions.filter(company_id__in=options['company'])
+        written = rebuild_intervals(subscriptions)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} subscription interval(s)'))
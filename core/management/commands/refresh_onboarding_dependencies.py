@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.models import OnboardingAssignment
+from core.onboarding_graph import refresh_pending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the pending dependencies of onboarding task assignments from their workflow task graphs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workflow', type=int, action='append', help='Only refresh this workflow (repeatable)')
+
+    def handle(self, *args, **options):
+        assignments = OnboardingAssignment.objects.all()
+        if options['workflow']:
+            assignments = assignments.filter(workflow_id__in=options['workflow'])
+        changed = refresh_pending(assignments)
+        self.stdout.write(self.style.SUCCESS(f'Updated {changed} task assignment(s)'))
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.image_derivatives import record_derivatives, render_derivatives
+from core.models import Employee
+
+
+class Command(BaseCommand):
+    help = 'Render the resized JPEG/WebP versions of existing employee photos in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Processes used for resizing')
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerate every photo, not only those without current derivatives')
+
+    def handle(self, *args, **options):
+        employees = Employee.objects.exclude(photo='').exclude(photo__isnull=True)
+        photos = [
+            (employee_id, photo, derivatives)
+            for employee_id, photo, derivatives in employees.values_list('id', 'photo', 'photo_derivatives').iterator()
+        ]
+        if not options['all']:
+            photos = [p for p in photos if (p[2] or {}).get('source') != p[1]]
+
+        recorded = failed = 0
+        # Workers render from storage only; they must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=django.setup) as pool:
+            futures = {
+                pool.submit(render_derivatives, photo, employee_id): (employee_id, photo)
+                for employee_id, photo, _ in photos
+            }
+            for future in as_completed(futures):
+                employee_id, photo = futures[future]
+                try:
+                    sizes = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'Employee {employee_id}: could not resize {photo}: {e}'))
+                    continue
+                if record_derivatives(employee_id, photo, sizes):
+                    recorded += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated derivatives for {recorded} of {len(photos)} photo(s), {failed} failed'
+        ))
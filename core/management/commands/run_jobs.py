@@ -0,0 +1,74 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core.jobs import (
+    LEASE_RENEW_INTERVAL, claim_jobs, default_worker_id, renew_leases, requeue_stale_jobs, run_job,
+)
+
+
+def _run_in_thread(job):
+    """Run a job on a pool thread; each thread owns its own DB connection"""
+    try:
+        run_job(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (reports, backups, bulk operations, imports)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Number of jobs to run concurrently')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--worker-id', default=None, help='Identifier stored on claimed jobs')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'])
+        poll_interval = options['poll_interval']
+        worker_id = options['worker_id'] or default_worker_id()
+        self.stopping = False
+
+        def stop(signum, frame):
+            self.stdout.write(self.style.WARNING('Stopping after running jobs finish...'))
+            self.stopping = True
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write(self.style.SUCCESS(f'Job worker {worker_id} started with {threads} threads'))
+        running = {}  # future -> job id
+        renewed_at = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while True:
+                close_old_connections()
+                running = {future: job_id for future, job_id in running.items() if not future.done()}
+                if self.stopping and not running:
+                    break
+
+                # Heartbeat: handlers may run far longer than STALE_LOCK_TIMEOUT
+                if time.monotonic() - renewed_at >= LEASE_RENEW_INTERVAL.total_seconds():
+                    renew_leases(worker_id, list(running.values()))
+                    renewed_at = time.monotonic()
+
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s)'))
+
+                # While stopping, only keep the leases of the running jobs alive
+                jobs = [] if self.stopping else claim_jobs(worker_id, limit=threads - len(running))
+                for job in jobs:
+                    self.stdout.write(f'Running {job}')
+                    running[pool.submit(_run_in_thread, job)] = job.id
+
+                if not jobs:
+                    if options['once'] and not running:
+                        break
+                    time.sleep(poll_interval)
+
+        self.stdout.write(self.style.SUCCESS('Job worker stopped'))
@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'core.sessions',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+# cached_db against DummyCache would measure the db engine
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'session-benchmark',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure authenticated requests per second with each session engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to log in as (defaults to the first company admin)')
+        parser.add_argument('--path', default='/api/notifications/unread/', help='URL requested')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per engine')
+        parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=list(ENGINES))
+        parser.add_argument('--save-every-request', action='store_true',
+                            help='Set SESSION_SAVE_EVERY_REQUEST (sliding expiry), so every request saves the session')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['username']:
+            user = users.filter(username=options['username']).first()
+        else:
+            user = users.filter(company_admin_profile__isnull=False).first()
+        if user is None:
+            raise CommandError('No matching active user found')
+
+        caches = settings.CACHES
+        if caches['default']['BACKEND'] == 'django.core.cache.backends.dummy.DummyCache':
+            caches = BENCHMARK_CACHES
+            self.stdout.write('DummyCache configured; using LocMemCache for the benchmark')
+
+        self.stdout.write(
+            f'{options["requests"]} requests to {options["path"]} as {user.username}, '
+            f'SESSION_SAVE_EVERY_REQUEST={options["save_every_request"]}'
+        )
+        for name in options['engines']:
+            with override_settings(CACHES=caches, SESSION_ENGINE=ENGINES[name],
+                                   SESSION_SAVE_EVERY_REQUEST=options['save_every_request']):
+                elapsed, queries, session_queries = self.run_engine(user, options['path'], options['requests'])
+            requests = options['requests']
+            self.stdout.write(
+                f'{name:>15}: {requests / elapsed:7.0f} req/s, '
+                f'{queries / requests:.2f} queries/request ({session_queries / requests:.2f} on sessions)'
+            )
+
+    def run_engine(self, user, path, requests):
+        client = Client()
+        client.force_login(user)
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path} returned {response.status_code} for {user.username}')
+
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            for _ in range(requests):
+                client.get(path)
+            elapsed = time.perf_counter() - start
+        session_queries = sum(1 for query in captured.captured_queries if 'django_session' in query['sql'])
+        return elapsed, len(captured.captured_queries), session_queries
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.management.commands.chat_load_test import Client
+from core.models import ChatRoom
+from core.ws_frames import COMPACT_SUBPROTOCOL, frame_event
+
+
+class Command(BaseCommand):
+    help = 'Measure CPU time per chat message fan-out: per-recipient json.dumps vs. pre-encoded frames'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, help='Chat room ID (defaults to the first active room with participants)')
+        parser.add_argument('--members', type=int, default=500, help='Connected clients in the room')
+        parser.add_argument('--messages', type=int, default=50, help='Fan-outs per mode')
+
+    def handle(self, *args, **options):
+        rooms = ChatRoom.objects.filter(is_active=True, participants__user_account__isnull=False)
+        if options['room']:
+            rooms = rooms.filter(id=options['room'])
+        room = rooms.first()
+        if room is None:
+            raise CommandError('No active chat room with participants found')
+        employee = room.participants.filter(user_account__isnull=False).first()
+
+        payload = {
+            'message': {
+                'id': 1,
+                'content': 'Benchmark message ' * 10,
+                'attachment': None,
+                'attachment_name': None,
+                'is_edited': False,
+                'created_at': timezone.now().isoformat(),
+            },
+            'sender': {
+                'id': employee.id,
+                'first_name': employee.first_name,
+                'last_name': employee.last_name,
+                'position': employee.position or 'Employee',
+            },
+            'timestamp': timezone.now().isoformat(),
+        }
+
+        modes = [
+            # (label, compact clients, event builder)
+            ('per-recipient json.dumps', False, lambda: {'type': 'chat_message', **payload}),
+            ('pre-encoded JSON', False, lambda: frame_event('chat_message', {'type': 'new_message', **payload})),
+            ('pre-encoded compact', True, lambda: frame_event('chat_message', {'type': 'new_message', **payload})),
+        ]
+
+        self.stdout.write(f'Room {room.id}, {options["members"]} members, {options["messages"]} fan-outs per mode')
+        for label, compact, build_event in modes:
+            cpu, frame_size = asyncio.run(self.run_mode(
+                room.id, employee.user_account, options['members'], options['messages'], compact, build_event
+            ))
+            self.stdout.write(
+                f'{label:<26} {cpu * 1000 / options["messages"]:8.2f} ms CPU per fan-out, {frame_size} bytes per frame'
+            )
+
+    async def run_mode(self, room_id, user, members, messages, compact, build_event):
+        subprotocols = [COMPACT_SUBPROTOCOL] if compact else []
+        clients = [Client(f'ws/chat/room/{room_id}/', user, subprotocols) for _ in range(members)]
+        for client in clients:
+            if not await client.connect():
+                raise CommandError(f'{user.username} could not join room {room_id}')
+
+        channel_layer = get_channel_layer()
+        frame_size = 0
+        start = time.process_time()
+        for _ in range(messages):
+            await channel_layer.group_send(f'chat_room_{room_id}', build_event())
+            frames = await asyncio.gather(*(client.receive_text() for client in clients))
+            frame_size = len(frames[0])
+        cpu = time.process_time() - start
+
+        for client in clients:
+            await client.disconnect()
+        return cpu, frame_size
@@ -0,0 +1,53 @@
+"""
+Per-request role resolution.
+
+``RoleMiddleware`` sets ``request.role`` ('system_owner', 'company_admin',
+'employee' or None), ``request.company`` and ``request.profile`` from the
+profiles ProfileModelBackend already loaded with the user, so resolving
+them costs no queries. The role decorators in core.decorators read these
+attributes.
+"""
+from django.contrib.auth import BACKEND_SESSION_KEY
+
+
+PROFILE_BACKEND = 'core.backends.ProfileModelBackend'
+LEGACY_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+# Role -> profile relation on User, in priority order
+ROLE_PROFILES = {
+    'system_owner': 'system_owner_profile',
+    'company_admin': 'company_admin_profile',
+    'employee': 'employee_profile',
+}
+
+
+def has_role(user, role):
+    return user.is_authenticated and getattr(user, ROLE_PROFILES[role], None) is not None
+
+
+def resolve_role(user):
+    """
+    (role, company, profile) for a user, or (None, None, None) without a
+    profile. The company comes from the company admin profile, else the
+    employee profile, whatever the role.
+    """
+    if not user.is_authenticated:
+        return None, None, None
+    profiles = {role: getattr(user, relation, None) for role, relation in ROLE_PROFILES.items()}
+    role = next((role for role, profile in profiles.items() if profile is not None), None)
+    company_profile = profiles['company_admin'] or profiles['employee']
+    return role, company_profile.company if company_profile else None, profiles.get(role)
+
+
+class RoleMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Sessions created before ProfileModelBackend was configured name the
+        # stock backend; point them at the new one rather than logging users out.
+        if request.session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND:
+            request.session[BACKEND_SESSION_KEY] = PROFILE_BACKEND
+
+        request.role, request.company, request.profile = resolve_role(request.user)
+        return self.get_response(request)
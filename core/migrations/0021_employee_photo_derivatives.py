@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_fileblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='photo_derivatives',
+            field=models.JSONField(blank=True, default=dict, help_text='Resized JPEG/WebP versions of the photo, see core.image_derivatives'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_employee_photo_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationdigest',
+            name='digest_type',
+            field=models.CharField(choices=[('HOURLY', 'Hourly Digest'), ('DAILY', 'Daily Digest'), ('WEEKLY', 'Weekly Digest'), ('MONTHLY', 'Monthly Digest')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_sent', 'scheduled_at'], name='core_notifi_is_sent_916e9b_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_notification_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPlatformStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('new_companies', models.IntegerField(default=0)),
+                ('new_users', models.IntegerField(default=0)),
+                ('new_employees', models.IntegerField(default=0)),
+                ('new_subscriptions', models.IntegerField(default=0)),
+                ('total_companies', models.IntegerField(default=0)),
+                ('active_companies', models.IntegerField(default=0)),
+                ('total_users', models.IntegerField(default=0)),
+                ('active_users', models.IntegerField(default=0)),
+                ('total_employees', models.IntegerField(default=0)),
+                ('verified_employees', models.IntegerField(default=0)),
+                ('registered_employees', models.IntegerField(default=0)),
+                ('mrr', models.DecimalField(decimal_places=2, default=0, help_text='Monthly recurring revenue of paying subscriptions', max_digits=12)),
+                ('mrr_by_plan', models.JSONField(blank=True, default=dict, help_text='{plan name: MRR}')),
+                ('churned_subscriptions', models.IntegerField(default=0, help_text='Paid subscriptions that ended that day without renewal')),
+                ('churned_mrr', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily platform stats',
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:10
+
+from datetime import timedelta
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Frozen copy of core.revenue.build_intervals as of this migration, run
+# against the historical models so later model changes cannot break it
+PAYING_STATUSES = ('ACTIVE', 'EXPIRED', 'CANCELLED')
+RENEWAL_GRACE_DAYS = 7
+MONTHS_PER_CYCLE = {'MONTHLY': 1, 'QUARTERLY': 3, 'YEARLY': 12}
+CENT = Decimal('0.01')
+
+
+def build_intervals(apps, schema_editor):
+    CompanySubscription = apps.get_model('core', 'CompanySubscription')
+    SubscriptionInterval = apps.get_model('core', 'SubscriptionInterval')
+
+    def subscription_intervals(subscription):
+        payments = [payment for payment in subscription.payments.all() if payment.status == 'COMPLETED']
+        intervals = []
+        for payment in payments:
+            start = timezone.localdate(payment.billing_period_start)
+            end = timezone.localdate(payment.billing_period_end)
+            if end <= start:
+                continue
+            months = max(1, round((end - start).days / (365.25 / 12)))
+            intervals.append(SubscriptionInterval(
+                subscription_id=subscription.id, company_id=subscription.company_id, plan_id=subscription.plan_id,
+                source='PAYMENT', start_date=start, end_date=end, mrr=(payment.amount / months).quantize(CENT),
+                amount=payment.amount, paid_on=timezone.localdate(payment.payment_date),
+            ))
+        if not payments and subscription.status in PAYING_STATUSES:
+            start = timezone.localdate(subscription.start_date)
+            end = timezone.localdate(subscription.end_date)
+            if end > start:
+                plan = subscription.plan
+                mrr = Decimal(plan.price / MONTHS_PER_CYCLE.get(plan.billing_cycle, 1)).quantize(CENT)
+                intervals.append(SubscriptionInterval(
+                    subscription_id=subscription.id, company_id=subscription.company_id, plan_id=subscription.plan_id,
+                    source='SUBSCRIPTION', start_date=start, end_date=end, mrr=mrr,
+                ))
+
+        intervals = [interval for interval in intervals if interval.mrr > 0]
+        intervals.sort(key=lambda interval: (interval.start_date, interval.end_date))
+        grace = timedelta(days=RENEWAL_GRACE_DAYS)
+        covered_until = None
+        for index, interval in enumerate(intervals):
+            interval.is_new = covered_until is None or interval.start_date > covered_until + grace
+            covered_until = max(covered_until or interval.end_date, interval.end_date)
+            following = intervals[index + 1] if index + 1 < len(intervals) else None
+            interval.is_churn = following is None or following.start_date > covered_until + grace
+        return intervals
+
+    subscriptions = CompanySubscription.objects.select_related('plan').prefetch_related('payments').order_by('pk')
+    for subscription in subscriptions.iterator(chunk_size=500):
+        SubscriptionInterval.objects.bulk_create(subscription_intervals(subscription), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_daily_platform_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('PAYMENT', 'Payment'), ('SUBSCRIPTION', 'Subscription')], max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('mrr', models.DecimalField(decimal_places=2, help_text='Monthly recurring revenue while the interval lasts', max_digits=10)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, help_text='Amount collected, for payment intervals', max_digits=10, null=True)),
+                ('paid_on', models.DateField(blank=True, null=True)),
+                ('is_new', models.BooleanField(default=False, help_text='Not a renewal of an earlier interval')),
+                ('is_churn', models.BooleanField(default=False, help_text='Not renewed by a later interval')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscription_intervals', to='core.company')),
+                ('plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.subscriptionplan')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intervals', to='core.companysubscription')),
+            ],
+            options={
+                'ordering': ['start_date'],
+                'indexes': [models.Index(fields=['start_date', 'end_date'], name='core_subscr_start_d_8a3096_idx'), models.Index(fields=['end_date'], name='core_subscr_end_dat_e3eeb9_idx'), models.Index(fields=['paid_on'], name='core_subscr_paid_on_f32cc9_idx')],
+            },
+        ),
+        migrations.RunPython(build_intervals, migrations.RunPython.noop),
+    ]
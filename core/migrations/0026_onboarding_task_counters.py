@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_tasks(apps, schema_editor):
+    OnboardingAssignment = apps.get_model('core', 'OnboardingAssignment')
+    OnboardingTaskAssignment = apps.get_model('core', 'OnboardingTaskAssignment')
+
+    def task_count(condition=Q()):
+        return Coalesce(Subquery(
+            OnboardingTaskAssignment.objects.filter(condition, onboarding_assignment=OuterRef('pk'))
+            .order_by().values('onboarding_assignment').annotate(n=Count('pk')).values('n')
+        ), Value(0))
+
+    OnboardingAssignment.objects.update(
+        total_tasks=task_count(),
+        completed_tasks=task_count(Q(status='COMPLETED')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_subscription_interval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onboardingassignment',
+            name='completed_tasks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='onboardingassignment',
+            name='total_tasks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_onboarding_task_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onboardingtaskassignment',
+            name='pending_dependencies',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='onboardingworkflow',
+            name='graph_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,128 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Frozen copy of core.tenancy.COMPANY_SOURCES as of this migration:
+# (model, parent field, parent model, path from the parent to its company id)
+COMPANY_SOURCES = [
+    ('task', 'project', 'project', 'company_id'),
+    ('attendance', 'employee', 'employee', 'company_id'),
+    ('leaverequest', 'employee', 'employee', 'company_id'),
+    ('timesheet', 'employee', 'employee', 'company_id'),
+    ('performancegoal', 'employee', 'employee', 'company_id'),
+    ('performancemetric', 'employee', 'employee', 'company_id'),
+    ('onboardingtaskassignment', 'onboarding_assignment', 'onboardingassignment', 'workflow__company_id'),
+]
+BATCH_SIZE = 1000
+
+
+def backfill_companies(apps, schema_editor):
+    for model_name, field, parent_name, path in COMPANY_SOURCES:
+        model = apps.get_model('core', model_name)
+        parent = apps.get_model('core', parent_name)
+        company = Subquery(parent.objects.filter(pk=OuterRef(f'{field}_id')).values(path)[:1])
+        last_id = 0
+        while True:
+            ids = list(
+                model.objects.filter(company__isnull=True, pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                break
+            model.objects.filter(pk__in=ids).update(company=company)
+            last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_onboarding_task_graph'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_records', to='core.company'),
+        ),
+        migrations.AddField(
+            model_name='leaverequest',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leave_requests', to='core.company'),
+        ),
+        migrations.AddField(
+            model_name='onboardingtaskassignment',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='onboarding_task_assignments', to='core.company'),
+        ),
+        migrations.AddField(
+            model_name='performancegoal',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='performance_goals', to='core.company'),
+        ),
+        migrations.AddField(
+            model_name='performancemetric',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='performance_metrics', to='core.company'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='core.company'),
+        ),
+        migrations.AddField(
+            model_name='timesheet',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='timesheets', to='core.company'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['company', 'date'], name='core_attend_company_ff30cd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['company', 'status'], name='core_leaver_company_574a2b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['company', 'start_date'], name='core_leaver_company_f0db62_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onboardingtaskassignment',
+            index=models.Index(fields=['company', 'status'], name='core_onboar_company_ecc4ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancegoal',
+            index=models.Index(fields=['company', 'status'], name='core_perfor_company_46b912_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancegoal',
+            index=models.Index(fields=['company', 'target_date'], name='core_perfor_company_8e98d7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='performancemetric',
+            index=models.Index(fields=['company', 'period_end'], name='core_perfor_company_f9b5cf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['company', 'status'], name='core_task_company_117e25_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['company', 'created_at'], name='core_task_company_b75857_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timesheet',
+            index=models.Index(fields=['company', 'date'], name='core_timesh_company_e32500_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timesheet',
+            index=models.Index(fields=['company', 'status'], name='core_timesh_company_d20b1b_idx'),
+        ),
+        migrations.RunPython(backfill_companies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Frozen copy of core.tenancy.COMPANY_SOURCES as of this migration:
+# (model, parent field, parent model, path from the parent to its company id)
+COMPANY_SOURCES = [
+    ('task', 'project', 'project', 'company_id'),
+    ('attendance', 'employee', 'employee', 'company_id'),
+    ('leaverequest', 'employee', 'employee', 'company_id'),
+    ('timesheet', 'employee', 'employee', 'company_id'),
+    ('performancegoal', 'employee', 'employee', 'company_id'),
+    ('performancemetric', 'employee', 'employee', 'company_id'),
+    ('onboardingtaskassignment', 'onboarding_assignment', 'onboardingassignment', 'workflow__company_id'),
+]
+BATCH_SIZE = 1000
+
+
+def backfill_companies(apps, schema_editor):
+    """Fill the rows written without a company since 0028, before the column becomes NOT NULL"""
+    for model_name, field, parent_name, path in COMPANY_SOURCES:
+        model = apps.get_model('core', model_name)
+        parent = apps.get_model('core', parent_name)
+        company = Subquery(parent.objects.filter(pk=OuterRef(f'{field}_id')).values(path)[:1])
+        last_id = 0
+        while True:
+            ids = list(
+                model.objects.filter(company__isnull=True, pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                break
+            model.objects.filter(pk__in=ids).update(company=company)
+            last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    # The backfill commits before the columns are altered (PostgreSQL refuses
+    # to ALTER a table with pending foreign key checks in the same transaction)
+    atomic = False
+
+    dependencies = [
+        ('core', '0029_chunked_upload_write_lease'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_companies, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='attendance',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_records', to='core.company'),
+        ),
+        migrations.AlterField(
+            model_name='leaverequest',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='leave_requests', to='core.company'),
+        ),
+        migrations.AlterField(
+            model_name='onboardingtaskassignment',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='onboarding_task_assignments', to='core.company'),
+        ),
+        migrations.AlterField(
+            model_name='performancegoal',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='performance_goals', to='core.company'),
+        ),
+        migrations.AlterField(
+            model_name='performancemetric',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='performance_metrics', to='core.company'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='core.company'),
+        ),
+        migrations.AlterField(
+            model_name='timesheet',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='timesheets', to='core.company'),
+        ),
+    ]
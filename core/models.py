@@ -1,13 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
 import uuid
 import secrets
-import os
-from PIL import Image
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from datetime import datetime, timedelta
 
 def generate_company_key():
@@ -73,6 +70,7 @@ class Employee(models.Model):
     user_account = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True, related_name='employee_profile')
     photo = models.ImageField(upload_to='employee_photos/', null=True, blank=True, help_text="Employee profile photo")
     photo_thumbnail = models.ImageField(upload_to='employee_photos/thumbnails/', null=True, blank=True, help_text="Thumbnail version of photo")
+    photo_derivatives = models.JSONField(default=dict, blank=True, help_text="Resized JPEG/WebP versions of the photo, see core.image_derivatives")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -85,41 +83,15 @@ class Employee(models.Model):
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
         
-        # Process photo if uploaded
-        if self.photo and not self.photo_thumbnail:
-            self.create_thumbnail()
+        # Resize a new photo in the background once it is committed
+        if self.photo and self.photo_derivatives.get('source') != self.photo.name:
+            from .image_derivatives import schedule_derivatives
+            schedule_derivatives(self)
     
     def create_thumbnail(self):
-        """Create a thumbnail version of the photo"""
-        if not self.photo:
-            return
-        
-        try:
-            # Open the original image
-            with default_storage.open(self.photo.name, 'rb') as f:
-                image = Image.open(f)
-                
-                # Convert to RGB if necessary
-                if image.mode in ('RGBA', 'LA', 'P'):
-                    image = image.convert('RGB')
-                
-                # Create thumbnail (150x150)
-                image.thumbnail((150, 150), Image.Resampling.LANCZOS)
-                
-                # Save thumbnail
-                thumb_name = f"thumb_{os.path.basename(self.photo.name)}"
-                thumb_path = f"employee_photos/thumbnails/{thumb_name}"
-                
-                # Save to storage
-                thumb_io = ContentFile(b'')
-                image.save(thumb_io, format='JPEG', quality=85)
-                thumb_io.seek(0)
-                
-                self.photo_thumbnail.save(thumb_path, thumb_io, save=False)
-                super().save(update_fields=['photo_thumbnail'])
-                
-        except Exception as e:
-            print(f"Error creating thumbnail: {e}")
+        """Generate the thumbnail and other photo derivatives now (normally done by a background job)"""
+        from .image_derivatives import generate_derivatives
+        generate_derivatives(self)
     
     def get_photo_url(self):
         """Get the photo URL or return None"""
@@ -133,6 +105,11 @@ class Employee(models.Model):
             return self.photo_thumbnail.url
         return None
     
+    def get_photo_derivative_urls(self):
+        """URLs of the resized photo versions by size and format (empty until they are generated)"""
+        from .image_derivatives import derivative_urls
+        return derivative_urls(self)
+    
     def get_avatar_display(self):
         """Get avatar display (photo or initials)"""
         if self.photo:
@@ -499,6 +476,40 @@ class SubscriptionPayment(models.Model):
         return f"{self.subscription.company.name} - ${self.amount} ({self.status})"
 
 
+class SubscriptionInterval(models.Model):
+    """A span a subscription was paid for, rebuilt by core.revenue from its payments (or its dates)"""
+    SOURCES = [
+        ('PAYMENT', 'Payment'),
+        ('SUBSCRIPTION', 'Subscription'),
+    ]
+    
+    subscription = models.ForeignKey(CompanySubscription, on_delete=models.CASCADE, related_name='intervals')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='subscription_intervals')
+    plan = models.ForeignKey(SubscriptionPlan, on_delete=models.SET_NULL, null=True, blank=True)
+    source = models.CharField(max_length=20, choices=SOURCES)
+    
+    # Paid for from start_date up to, not including, end_date
+    start_date = models.DateField()
+    end_date = models.DateField()
+    mrr = models.DecimalField(max_digits=10, decimal_places=2, help_text="Monthly recurring revenue while the interval lasts")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Amount collected, for payment intervals")
+    paid_on = models.DateField(null=True, blank=True)
+    
+    is_new = models.BooleanField(default=False, help_text="Not a renewal of an earlier interval")
+    is_churn = models.BooleanField(default=False, help_text="Not renewed by a later interval")
+    
+    class Meta:
+        ordering = ['start_date']
+        indexes = [
+            models.Index(fields=['start_date', 'end_date']),
+            models.Index(fields=['end_date']),
+            models.Index(fields=['paid_on']),
+        ]
+    
+    def __str__(self):
+        return f"{self.company_id}: {self.start_date} - {self.end_date} (${self.mrr}/month)"
+
+
 # Enhanced Analytics & Reporting Models
 class ActivityLog(models.Model):
     """Track user activities for analytics"""
@@ -519,6 +530,8 @@ class ActivityLog(models.Model):
 class PerformanceMetric(models.Model):
     """Employee performance tracking"""
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='performance_metrics')
+    # employee.company, denormalized by core.tenancy
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, blank=True, editable=False, db_index=False, related_name='performance_metrics')
     metric_type = models.CharField(max_length=50, choices=[
         ('PRODUCTIVITY', 'Productivity'),
         ('ATTENDANCE', 'Attendance'),
@@ -534,6 +547,9 @@ class PerformanceMetric(models.Model):
     
     class Meta:
         ordering = ['-period_end']
+        indexes = [
+            models.Index(fields=['company', 'period_end']),
+        ]
     
     def __str__(self):
         return f"{self.employee} - {self.metric_type}: {self.value}"
@@ -639,6 +655,8 @@ class PerformanceGoal(models.Model):
     ]
     
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='performance_goals')
+    # employee.company, denormalized by core.tenancy
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, blank=True, editable=False, db_index=False, related_name='performance_goals')
     title = models.CharField(max_length=200)
     description = models.TextField()
     goal_type = models.CharField(max_length=20, choices=GOAL_TYPES, default='SMART')
@@ -670,6 +688,10 @@ class PerformanceGoal(models.Model):
     
     class Meta:
         ordering = ['-target_date', 'priority']
+        indexes = [
+            models.Index(fields=['company', 'status']),
+            models.Index(fields=['company', 'target_date']),
+        ]
     
     def __str__(self):
         return f"{self.employee} - {self.title}"
@@ -800,6 +822,8 @@ class Attendance(models.Model):
     ]
     
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_records')
+    # employee.company, denormalized by core.tenancy
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, blank=True, editable=False, db_index=False, related_name='attendance_records')
     date = models.DateField()
     clock_in = models.DateTimeField(null=True, blank=True)
     clock_out = models.DateTimeField(null=True, blank=True)
@@ -831,6 +855,9 @@ class Attendance(models.Model):
     class Meta:
         ordering = ['-date', '-clock_in']
         unique_together = ['employee', 'date']
+        indexes = [
+            models.Index(fields=['company', 'date']),
+        ]
     
     def __str__(self):
         return f"{self.employee} - {self.date} ({self.get_status_display()})"
@@ -896,6 +923,8 @@ class LeaveRequest(models.Model):
     ]
     
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_requests')
+    # employee.company, denormalized by core.tenancy
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, blank=True, editable=False, db_index=False, related_name='leave_requests')
     leave_type = models.CharField(max_length=20, choices=LEAVE_TYPES)
     start_date = models.DateField()
     end_date = models.DateField()
@@ -921,6 +950,10 @@ class LeaveRequest(models.Model):
     
     class Meta:
         ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['company', 'status']),
+            models.Index(fields=['company', 'start_date']),
+        ]
     
     def __str__(self):
         return f"{self.employee} - {self.get_leave_type_display()} ({self.start_date} to {self.end_date})"
@@ -950,6 +983,8 @@ class Timesheet(models.Model):
     ]
     
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='timesheets')
+    # employee.company, denormalized by core.tenancy
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, blank=True, editable=False, db_index=False, related_name='timesheets')
     project = models.ForeignKey('Project', on_delete=models.CASCADE, null=True, blank=True, related_name='timesheet_entries')
     date = models.DateField()
     
@@ -977,6 +1012,10 @@ class Timesheet(models.Model):
     
     class Meta:
         ordering = ['-date', '-start_time']
+        indexes = [
+            models.Index(fields=['company', 'date']),
+            models.Index(fields=['company', 'status']),
+        ]
     
     def __str__(self):
         return f"{self.employee} - {self.date} ({self.total_hours}h)"
@@ -1102,6 +1141,8 @@ class Project(models.Model):
 class Task(models.Model):
     """Task management within projects"""
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='tasks')
+    # project.company, denormalized by core.tenancy
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, blank=True, editable=False, db_index=False, related_name='tasks')
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=[
@@ -1125,6 +1166,10 @@ class Task(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['company', 'status']),
+            models.Index(fields=['company', 'created_at']),
+        ]
     
     def __str__(self):
         return self.title
@@ -1349,6 +1394,10 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Pending deliveries (core.notification_dispatch)
+            models.Index(fields=['is_sent', 'scheduled_at']),
+        ]
     
     def __str__(self):
         return f"{self.get_notification_type_display()}: {self.title}"
@@ -1369,11 +1418,17 @@ class Notification(models.Model):
     
     def mark_as_read(self, user=None):
         """Mark notification as read"""
+        was_unread = not self.is_read and not self.is_archived
+        # The counters to move are those of the owner it was unread for
+        owner = (self.user_id, self.company_id)
         self.is_read = True
         self.read_at = timezone.now()
         if user:
             self.user = user
         self.save()
+        if was_unread:
+            from .notification_counters import adjust_unread
+            adjust_unread([owner], -1)
     
     def mark_as_sent(self):
         """Mark notification as sent"""
@@ -1425,28 +1480,60 @@ class NotificationTemplate(models.Model):
     def __str__(self):
         return f"{self.get_template_type_display()} Template"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .template_cache import compiled_templates
+        compiled_templates.evict(self.pk)
+    
+    def delete(self, *args, **kwargs):
+        from .template_cache import compiled_templates
+        compiled_templates.evict(self.pk)
+        return super().delete(*args, **kwargs)
+    
+    def get_compiled_templates(self):
+        """
+        Compiled (title, message, email subject, email body) templates, cached
+        per template version; None if a source does not parse
+        """
+        from .template_cache import compile_sources, compiled_templates
+        sources = (self.title_template, self.message_template, self.email_subject_template, self.email_template)
+        if self.pk is None:
+            return compile_sources(sources)
+        return compiled_templates.get(self.pk, self.updated_at, sources)
+    
     def render_template(self, context=None):
         """Render template with context variables"""
-        if not context:
-            context = {}
+        return self.render_many([context])[0]
+    
+    def render_many(self, contexts):
+        """Render the template once per context (a list of dicts), compiling it at most once"""
+        from django.template import Context
+        compiled = self.get_compiled_templates()
+        fallback = {
+            'title': self.title_template,
+            'message': self.message_template,
+            'email_subject': self.email_subject_template or self.title_template,
+            'email_content': self.email_template or self.message_template
+        }
+        if compiled is None:
+            return [dict(fallback) for _ in contexts]
         
-        try:
-            from django.template import Template, Context
-            title = Template(self.title_template).render(Context(context))
-            message = Template(self.message_template).render(Context(context))
-            return {
-                'title': title,
-                'message': message,
-                'email_subject': Template(self.email_subject_template).render(Context(context)) if self.email_subject_template else title,
-                'email_content': Template(self.email_template).render(Context(context)) if self.email_template else message
-            }
-        except Exception as e:
-            return {
-                'title': self.title_template,
-                'message': self.message_template,
-                'email_subject': self.email_subject_template or self.title_template,
-                'email_content': self.email_template or self.message_template
-            }
+        title, message, email_subject, email = compiled
+        rendered = []
+        for context in contexts:
+            try:
+                context = Context(context or {})
+                rendered_title = title.render(context) if title else ''
+                rendered_message = message.render(context) if message else ''
+                rendered.append({
+                    'title': rendered_title,
+                    'message': rendered_message,
+                    'email_subject': email_subject.render(context) if email_subject else rendered_title,
+                    'email_content': email.render(context) if email else rendered_message
+                })
+            except Exception:
+                rendered.append(dict(fallback))
+        return rendered
 
 class NotificationPreference(models.Model):
     """User notification preferences"""
@@ -1556,6 +1643,7 @@ class NotificationPreference(models.Model):
 class NotificationDigest(models.Model):
     """Notification digest for batch delivery"""
     DIGEST_TYPES = [
+        ('HOURLY', 'Hourly Digest'),
         ('DAILY', 'Daily Digest'),
         ('WEEKLY', 'Weekly Digest'),
         ('MONTHLY', 'Monthly Digest'),
@@ -1598,6 +1686,17 @@ class NotificationDigest(models.Model):
         self.sent_at = timezone.now()
         self.save()
 
+class NotificationCounter(models.Model):
+    """Unread notification count of a user or a company, see core.notification_counters"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True, related_name='notification_counter')
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, null=True, blank=True, related_name='notification_counter')
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        owner = self.user.username if self.user_id else self.company.name
+        return f"{owner}: {self.unread_count} unread"
+
 # Onboarding & Workflow Models
 class OnboardingWorkflow(models.Model):
     """Onboarding workflow templates"""
@@ -1627,6 +1726,8 @@ class OnboardingWorkflow(models.Model):
     is_default = models.BooleanField(default=False)
     estimated_duration_days = models.IntegerField(default=7)
     auto_assign = models.BooleanField(default=True)
+    # Bumped whenever a task or dependency changes (see core.onboarding_graph)
+    graph_version = models.PositiveIntegerField(default=0)
     
     # Target criteria
     target_departments = models.JSONField(default=list, blank=True)
@@ -1751,6 +1852,9 @@ class OnboardingAssignment(models.Model):
     # Status tracking
     status = models.CharField(max_length=20, choices=ASSIGNMENT_STATUS, default='NOT_STARTED')
     progress_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    # Task assignments, and how many are COMPLETED (kept up to date by the task assignments)
+    total_tasks = models.IntegerField(default=0)
+    completed_tasks = models.IntegerField(default=0)
     
     # Assignment metadata
     notes = models.TextField(blank=True)
@@ -1782,13 +1886,11 @@ class OnboardingAssignment(models.Model):
         return None
     
     def update_progress(self):
-        """Update progress percentage based on completed tasks"""
-        total_tasks = self.workflow.get_total_tasks()
-        if total_tasks == 0:
+        """Update progress percentage based on the task counters"""
+        if self.total_tasks == 0:
             self.progress_percentage = 100
         else:
-            completed_tasks = self.workflow.get_completed_tasks(self.employee)
-            self.progress_percentage = (completed_tasks / total_tasks) * 100
+            self.progress_percentage = (self.completed_tasks / self.total_tasks) * 100
         
         # Update status based on progress
         if self.progress_percentage == 100:
@@ -1797,7 +1899,17 @@ class OnboardingAssignment(models.Model):
         elif self.progress_percentage > 0:
             self.status = 'IN_PROGRESS'
         
-        self.save()
+        self.save(update_fields=['progress_percentage', 'status', 'completed_at', 'updated_at'])
+    
+    def adjust_task_counts(self, total=0, completed=0):
+        """Move the task counters by ``total`` and ``completed``, then update progress"""
+        with transaction.atomic():
+            OnboardingAssignment.objects.filter(pk=self.pk).update(
+                total_tasks=models.F('total_tasks') + total,
+                completed_tasks=models.F('completed_tasks') + completed,
+            )
+            self.refresh_from_db(fields=['total_tasks', 'completed_tasks'])
+            self.update_progress()
 
 class OnboardingTaskAssignment(models.Model):
     """Individual task assignments within onboarding"""
@@ -1812,6 +1924,8 @@ class OnboardingTaskAssignment(models.Model):
     
     onboarding_assignment = models.ForeignKey(OnboardingAssignment, on_delete=models.CASCADE, related_name='task_assignments')
     task = models.ForeignKey(OnboardingTask, on_delete=models.CASCADE, related_name='task_assignments')
+    # onboarding_assignment.workflow.company, denormalized by core.tenancy
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, blank=True, editable=False, db_index=False, related_name='onboarding_task_assignments')
     
     # Assignment details
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tasks')
@@ -1822,6 +1936,8 @@ class OnboardingTaskAssignment(models.Model):
     
     # Status tracking
     status = models.CharField(max_length=20, choices=TASK_STATUS, default='NOT_STARTED')
+    # Dependencies of the task not yet completed in this onboarding; the task is ready at 0
+    pending_dependencies = models.IntegerField(default=0)
     
     # Task completion
     completion_notes = models.TextField(blank=True)
@@ -1838,6 +1954,9 @@ class OnboardingTaskAssignment(models.Model):
     class Meta:
         ordering = ['task__order', 'assigned_at']
         unique_together = ['onboarding_assignment', 'task']
+        indexes = [
+            models.Index(fields=['company', 'status']),
+        ]
     
     def __str__(self):
         return f"{self.task.name} - {self.onboarding_assignment.employee.first_name} {self.onboarding_assignment.employee.last_name}"
@@ -1857,11 +1976,31 @@ class OnboardingTaskAssignment(models.Model):
             return max(0, delta.days)
         return None
     
+    def save_status(self):
+        """
+        Save, refusing to start a task with unfinished dependencies. When the
+        task enters or leaves COMPLETED, move the assignment's completed count
+        and the pending dependencies of the tasks that depend on it.
+        """
+        from .onboarding_graph import unlock_dependents
+        
+        with transaction.atomic():
+            previous, pending = OnboardingTaskAssignment.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('status', 'pending_dependencies').first()
+            if pending and previous in ('NOT_STARTED', 'OVERDUE') and self.status != previous:
+                raise ValidationError(f'{self.task.name} is waiting on {pending} unfinished task(s)')
+            self.save()
+            change = (self.status == 'COMPLETED') - (previous == 'COMPLETED')
+            if change:
+                self.onboarding_assignment.adjust_task_counts(completed=change)
+                unlock_dependents(self, change)
+    
     def mark_as_started(self):
         """Mark task as started"""
         self.status = 'IN_PROGRESS'
         self.started_at = timezone.now()
-        self.save()
+        self.save_status()
     
     def mark_as_completed(self, notes='', attachments=None):
         """Mark task as completed"""
@@ -1874,10 +2013,7 @@ class OnboardingTaskAssignment(models.Model):
         self.completion_notes = notes
         if attachments:
             self.completion_attachments = attachments
-        self.save()
-        
-        # Update onboarding assignment progress
-        self.onboarding_assignment.update_progress()
+        self.save_status()
     
     def approve_task(self, approver, notes=''):
         """Approve task completion"""
@@ -1886,10 +2022,7 @@ class OnboardingTaskAssignment(models.Model):
         self.approved_at = timezone.now()
         self.approval_notes = notes
         self.completed_at = timezone.now()
-        self.save()
-        
-        # Update onboarding assignment progress
-        self.onboarding_assignment.update_progress()
+        self.save_status()
     
     def reject_task(self, approver, notes=''):
         """Reject task completion"""
@@ -1897,7 +2030,7 @@ class OnboardingTaskAssignment(models.Model):
         self.approved_by = approver
         self.approved_at = timezone.now()
         self.approval_notes = notes
-        self.save()
+        self.save_status()
 
 class OnboardingDocument(models.Model):
     """Required documents for onboarding"""
@@ -2635,3 +2768,210 @@ class ChatNotification(models.Model):
     
     def __str__(self):
         return f"{self.title} - {self.recipient.first_name}"
+
+# Background Job Models
+class Job(models.Model):
+    """Background job queued from a request and executed by the run_jobs worker"""
+    JOB_STATUS = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    
+    job_type = models.CharField(max_length=50, help_text="Name of the registered job handler")
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='QUEUED')
+    payload = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    # Progress reporting
+    progress = models.IntegerField(default=0, help_text="Completion percentage (0-100)")
+    progress_message = models.CharField(max_length=255, blank=True)
+    
+    # Retry/backoff
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Job is not picked up before this time")
+    
+    # Worker lease
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    
+    # Ownership
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['created_by', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.job_type} #{self.pk} ({self.status})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('SUCCEEDED', 'FAILED', 'CANCELLED')
+    
+    @property
+    def group_name(self):
+        """Channels group that receives progress updates for this job"""
+        return f'job_{self.pk}'
+    
+    def to_dict(self):
+        return {
+            'id': self.pk,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': self.progress,
+            'progress_message': self.progress_message,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ReportArtifact(models.Model):
+    """Generated report file, reused for every download with the same parameters until it expires"""
+    REPORT_KINDS = [
+        ('attendance', 'Attendance'),
+        ('performance', 'Performance'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('json', 'JSON'),
+        ('csv', 'CSV'),
+    ]
+    
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='report_artifacts')
+    kind = models.CharField(max_length=20, choices=REPORT_KINDS)
+    params_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of kind, company and report parameters")
+    params = models.JSONField(default=dict, blank=True)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='json')
+    
+    # Gzip-compressed report stored under MEDIA_ROOT/reports/
+    file = models.FileField(upload_to='reports/')
+    filename = models.CharField(max_length=255, help_text="Download filename")
+    size = models.BigIntegerField(default=0, help_text="Compressed size in bytes")
+    row_count = models.IntegerField(default=0)
+    
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_artifacts')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.kind} report for {self.company.name} ({self.params_hash[:12]})"
+    
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+class ChunkedUpload(models.Model):
+    """Resumable upload of a chat attachment or document, written in chunks"""
+    PURPOSE_CHOICES = [
+        ('CHAT', 'Chat Attachment'),
+        ('DOCUMENT', 'Document'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('UPLOADING', 'Uploading'),
+        ('COMPLETE', 'Complete'),
+        ('ATTACHED', 'Attached'),
+    ]
+    
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    
+    size = models.BigIntegerField(help_text="Total length declared when the upload was created")
+    offset = models.BigIntegerField(default=0, help_text="Bytes received so far")
+    sha256 = models.CharField(max_length=64, blank=True)
+    
+    # Set once the upload is complete; a path in the blob store (core.blobs)
+    file = models.FileField(upload_to='uploads/', blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='UPLOADING')
+    # Lease of the request writing a chunk (core.uploads.claim_chunk)
+    writing_until = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+    
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
+
+class FileBlob(models.Model):
+    """Stored file content, shared by every Document, DocumentVersion and ChatMessage with the same bytes"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=500, unique=True, help_text="Storage path under MEDIA_ROOT/blobs/")
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0, help_text="Rows whose file field points at this blob")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+class DailyPlatformStats(models.Model):
+    """Platform-wide figures for one day, written by the rollup job in core.platform_stats"""
+    date = models.DateField(unique=True)
+    
+    # Created that day
+    new_companies = models.IntegerField(default=0)
+    new_users = models.IntegerField(default=0)
+    new_employees = models.IntegerField(default=0)
+    new_subscriptions = models.IntegerField(default=0)
+    
+    # Totals at the end of the day
+    total_companies = models.IntegerField(default=0)
+    active_companies = models.IntegerField(default=0)
+    total_users = models.IntegerField(default=0)
+    active_users = models.IntegerField(default=0)
+    total_employees = models.IntegerField(default=0)
+    verified_employees = models.IntegerField(default=0)
+    registered_employees = models.IntegerField(default=0)
+    
+    # Subscription revenue
+    mrr = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Monthly recurring revenue of paying subscriptions")
+    mrr_by_plan = models.JSONField(default=dict, blank=True, help_text="{plan name: MRR}")
+    churned_subscriptions = models.IntegerField(default=0, help_text="Paid subscriptions that ended that day without renewal")
+    churned_mrr = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'Daily platform stats'
+    
+    def __str__(self):
+        return f"Platform stats {self.date}"
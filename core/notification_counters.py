@@ -0,0 +1,120 @@
+"""
+Denormalized unread notification counts.
+
+A notification is unread for its ``user`` and for its ``company`` until it
+is read or archived. NotificationCounter keeps both totals, so the polled
+unread endpoint reads one row instead of running a COUNT. A counter is
+created from a COUNT the first time it is read. After that, every change
+moves it in the same transaction:
+
+- the post_save/pre_delete handlers from ``connect_signals()`` cover
+  notifications that are created or deleted;
+- ``mark_read()`` and ``archive()`` lock the rows they change, update them
+  with one UPDATE per batch, and move the counters by what they changed.
+
+Code that changes ``is_read``/``is_archived`` some other way, or that
+bulk_creates notifications, must call ``adjust_unread`` itself.
+``reset_counters()`` drops every counter so each is recounted on its next
+read.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save, pre_delete
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter
+
+
+UNREAD = Q(is_read=False, is_archived=False)
+BATCH_SIZE = 1000
+
+
+def adjust_unread(rows, delta):
+    """Move the counters of each ``(user_id, company_id)`` in ``rows`` by ``delta``"""
+    totals = Counter()
+    for user_id, company_id in rows:
+        if user_id:
+            totals[('user_id', user_id)] += delta
+        if company_id:
+            totals[('company_id', company_id)] += delta
+    now = timezone.now()
+    for (field, owner_id), change in totals.items():
+        if change:
+            # Counters not created yet are counted when first read
+            NotificationCounter.objects.filter(**{field: owner_id}).update(
+                unread_count=F('unread_count') + change,
+                updated_at=now,
+            )
+
+
+def unread_count(user=None, company=None):
+    """Unread notifications of a company (when given) or a user"""
+    owner = {'company': company} if company is not None else {'user': user}
+    count = NotificationCounter.objects.filter(**owner).values_list('unread_count', flat=True).first()
+    if count is not None:
+        return count
+
+    try:
+        with transaction.atomic():
+            count = Notification.objects.filter(UNREAD, **owner).count()
+            NotificationCounter.objects.create(unread_count=count, **owner)
+    except IntegrityError:
+        # Created concurrently: that counter is the one kept up to date
+        count = NotificationCounter.objects.filter(**owner).values_list('unread_count', flat=True).first()
+    return count
+
+
+def _change(queryset, pending, counted_unless, **changes):
+    """
+    Apply ``changes`` to the rows of ``queryset`` matching ``pending``,
+    BATCH_SIZE locked rows per transaction. Rows where ``counted_unless`` was
+    false were unread and leave the counters. Returns the number changed.
+    """
+    changed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                queryset.filter(pending, id__gt=last_id).order_by('id').select_for_update()
+                .values_list('id', 'user_id', 'company_id', counted_unless)[:BATCH_SIZE]
+            )
+            if not rows:
+                return changed
+            Notification.objects.filter(id__in=[row[0] for row in rows]).update(**changes)
+            adjust_unread([(user_id, company_id) for _, user_id, company_id, flag in rows if not flag], -1)
+        changed += len(rows)
+        last_id = rows[-1][0]
+
+
+def mark_read(queryset):
+    """Mark the unread notifications in ``queryset`` read; returns how many changed"""
+    now = timezone.now()
+    return _change(queryset, Q(is_read=False), 'is_archived', is_read=True, read_at=now, updated_at=now)
+
+
+def archive(queryset):
+    """Archive the notifications in ``queryset``; returns how many changed"""
+    now = timezone.now()
+    return _change(queryset, Q(is_archived=False), 'is_read', is_archived=True, archived_at=now, updated_at=now)
+
+
+def reset_counters():
+    """Delete all counters; each is recounted on its next read"""
+    return NotificationCounter.objects.all().delete()[0]
+
+
+def _notification_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not instance.is_read and not instance.is_archived:
+        adjust_unread([(instance.user_id, instance.company_id)], 1)
+
+
+def _notification_deleting(sender, instance, **kwargs):
+    if not instance.is_read and not instance.is_archived:
+        adjust_unread([(instance.user_id, instance.company_id)], -1)
+
+
+def connect_signals():
+    post_save.connect(_notification_saved, sender=Notification, dispatch_uid='notification_counter_saved')
+    pre_delete.connect(_notification_deleting, sender=Notification, dispatch_uid='notification_counter_deleting')
@@ -0,0 +1,239 @@
+"""
+Delivery of pending notifications.
+
+The ``dispatch_notifications`` job (re-queued every
+NOTIFICATION_DISPATCH_INTERVAL) takes the users with due notifications, that
+is ``is_sent=False`` and ``scheduled_at`` empty or past, NOTIFICATION_DISPATCH_BATCH_SIZE
+users at a time. For each batch it loads their notifications and
+preferences in one query each. Each notification is then:
+
+- skipped if it has expired, or if the user's preferences turn off its
+  type or channel (or they chose NEVER);
+- sent if the frequency is IMMEDIATE. IN_APP, PUSH and BROWSER
+  notifications are pushed to the user's ``chat_notifications_<id>``
+  WebSocket group. EMAIL notifications are sent over one mail connection;
+- added to a NotificationDigest for HOURLY, DAILY and WEEKLY users once the
+  period it was created in has ended. Until then it is deferred.
+
+Deferring means setting ``scheduled_at`` to when the notification can go
+out: the end of its digest period, or the end of the user's quiet hours
+(CRITICAL notifications ignore quiet hours). Deferred notifications leave
+the pending set until that time.
+
+Sent and digested notifications are marked with one UPDATE per batch.
+Skipped ones get ``is_sent=True`` without ``sent_at``. Notifications
+without a user are company-wide; they are shown in-app by query and only
+marked sent.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification, NotificationDigest, NotificationPreference
+from .ws_frames import frame_event
+
+
+NOTIFICATION_DISPATCH_BATCH_SIZE = getattr(settings, 'NOTIFICATION_DISPATCH_BATCH_SIZE', 500)
+NOTIFICATION_DISPATCH_INTERVAL = getattr(settings, 'NOTIFICATION_DISPATCH_INTERVAL', timedelta(minutes=1))
+
+DIGEST_FREQUENCIES = ('HOURLY', 'DAILY', 'WEEKLY')
+PUSHED_CHANNELS = ('IN_APP', 'PUSH', 'BROWSER')
+DIGEST_LINE_LENGTH = 200
+
+
+def due_notifications(now):
+    return Notification.objects.filter(is_sent=False).filter(Q(scheduled_at__isnull=True) | Q(scheduled_at__lte=now))
+
+
+def digest_period(frequency, moment):
+    """(start, end) of the HOURLY, DAILY or WEEKLY digest period containing ``moment``"""
+    moment = timezone.localtime(moment)
+    if frequency == 'HOURLY':
+        start = moment.replace(minute=0, second=0, microsecond=0)
+        return start, start + timedelta(hours=1)
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if frequency == 'DAILY':
+        return start, start + timedelta(days=1)
+    start -= timedelta(days=start.weekday())
+    return start, start + timedelta(days=7)
+
+
+def quiet_hours_end(preference, now):
+    """When the preference's current quiet hours end, or None outside quiet hours"""
+    if preference is None or not preference.is_quiet_hours():
+        return None
+    end = now.replace(
+        hour=preference.quiet_hours_end.hour,
+        minute=preference.quiet_hours_end.minute,
+        second=0,
+        microsecond=0,
+    )
+    if end < now:
+        end += timedelta(days=1)
+    return end
+
+
+def deliver(notifications):
+    """Send IMMEDIATE notifications on their channel; returns the IDs delivered"""
+    delivered = []
+    emails = []
+    channel_layer = get_channel_layer()
+    for notification in notifications:
+        if notification.channel == 'EMAIL' and notification.user.email:
+            emails.append(notification)
+            continue
+        if notification.channel in PUSHED_CHANNELS and channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(
+                f'chat_notifications_{notification.user_id}',
+                frame_event('chat_notification', {
+                    'type': 'notification',
+                    'notification_id': notification.id,
+                    'notification_type': notification.notification_type,
+                    'priority': notification.priority,
+                    'title': notification.title,
+                    'message': notification.message,
+                    'action_url': notification.action_url,
+                })
+            )
+        # SMS (no provider yet) and users without an email address: shown in-app only
+        delivered.append(notification.id)
+
+    if emails:
+        try:
+            get_connection(fail_silently=False).send_messages([
+                EmailMessage(notification.title, notification.message, to=[notification.user.email])
+                for notification in emails
+            ])
+            delivered.extend(notification.id for notification in emails)
+        except Exception as e:
+            # Left pending; retried on the next run
+            print(f"Error sending notification emails: {e}")
+    return delivered
+
+
+def build_digests(groups, now):
+    """Create and send one NotificationDigest per ``(user, company, frequency, period)``"""
+    digests = []
+    for (user, company_id, frequency, start, end, email_enabled), notifications in groups.items():
+        lines = [f"- {n.title}: {n.message[:DIGEST_LINE_LENGTH]}" for n in notifications]
+        digests.append(NotificationDigest(
+            user=user,
+            company_id=company_id,
+            digest_type=frequency,
+            title=f"{frequency.title()} digest: {len(notifications)} notification{'s' if len(notifications) != 1 else ''}",
+            content='\n'.join(lines),
+            delivery_method='EMAIL' if email_enabled else 'PUSH',
+            period_start=start,
+            period_end=end,
+        ))
+    digests = NotificationDigest.objects.bulk_create(digests)
+
+    Through = NotificationDigest.notifications.through
+    Through.objects.bulk_create([
+        Through(notificationdigest_id=digest.id, notification_id=notification.id)
+        for digest, notifications in zip(digests, groups.values())
+        for notification in notifications
+    ])
+
+    emailed = [digest for digest in digests if digest.delivery_method == 'EMAIL' and digest.user.email]
+    sent_ids = []
+    if emailed:
+        try:
+            get_connection(fail_silently=False).send_messages([
+                EmailMessage(digest.title, digest.content, to=[digest.user.email]) for digest in emailed
+            ])
+            sent_ids = [digest.id for digest in emailed]
+        except Exception as e:
+            # Left pending in the digest list
+            print(f"Error sending notification digests: {e}")
+    if sent_ids:
+        NotificationDigest.objects.filter(id__in=sent_ids).update(is_sent=True, sent_at=now)
+    return len(digests)
+
+
+def dispatch_batch(user_ids, now):
+    """Process the due notifications of ``user_ids``; returns counts by outcome"""
+    notifications = list(
+        due_notifications(now).filter(user_id__in=user_ids).select_related('user').order_by('created_at', 'id')
+    )
+    preferences = {}
+    for preference in NotificationPreference.objects.filter(user_id__in=user_ids).order_by('id'):
+        preferences[(preference.user_id, preference.company_id)] = preference
+        # Notifications without a company use the user's first preference
+        preferences.setdefault((preference.user_id, None), preference)
+
+    immediate = []
+    skipped = []
+    deferred = defaultdict(list)
+    digest_groups = defaultdict(list)
+    for notification in notifications:
+        preference = (preferences.get((notification.user_id, notification.company_id))
+                      or preferences.get((notification.user_id, None)))
+        frequency = preference.digest_frequency if preference else 'IMMEDIATE'
+
+        if notification.expires_at and notification.expires_at <= now:
+            skipped.append(notification.id)
+        elif preference and (frequency == 'NEVER' or not preference.should_send_notification(
+                notification.notification_type, notification.channel)):
+            skipped.append(notification.id)
+        elif frequency in DIGEST_FREQUENCIES:
+            start, end = digest_period(frequency, notification.created_at)
+            if end > now:
+                deferred[end].append(notification.id)
+            else:
+                company_id = notification.company_id or preference.company_id
+                digest_groups[(notification.user, company_id, frequency, start, end, preference.email_enabled)].append(notification)
+        else:
+            quiet_end = None if notification.priority == 'CRITICAL' else quiet_hours_end(preference, now)
+            if quiet_end:
+                deferred[quiet_end].append(notification.id)
+            else:
+                immediate.append(notification)
+
+    sent = deliver(immediate)
+    digests = build_digests(digest_groups, now) if digest_groups else 0
+    sent += [notification.id for group in digest_groups.values() for notification in group]
+
+    if sent:
+        Notification.objects.filter(id__in=sent).update(is_sent=True, sent_at=now)
+    if skipped:
+        Notification.objects.filter(id__in=skipped).update(is_sent=True)
+    for scheduled_at, ids in deferred.items():
+        Notification.objects.filter(id__in=ids).update(scheduled_at=scheduled_at)
+
+    return {
+        'sent': len(sent),
+        'digests': digests,
+        'deferred': sum(len(ids) for ids in deferred.values()),
+        'skipped': len(skipped),
+    }
+
+
+def dispatch_notifications(now=None, batch_size=None):
+    """Dispatch every due notification, one batch of users at a time; returns totals"""
+    now = now or timezone.now()
+    batch_size = batch_size or NOTIFICATION_DISPATCH_BATCH_SIZE
+    totals = {
+        'sent': due_notifications(now).filter(user__isnull=True).update(is_sent=True, sent_at=now),
+        'digests': 0,
+        'deferred': 0,
+        'skipped': 0,
+    }
+
+    last_user_id = 0
+    while True:
+        user_ids = list(
+            due_notifications(now).filter(user_id__gt=last_user_id)
+            .order_by('user_id').values_list('user_id', flat=True).distinct()[:batch_size]
+        )
+        if not user_ids:
+            return totals
+        for key, count in dispatch_batch(user_ids, now).items():
+            totals[key] += count
+        last_user_id = user_ids[-1]
@@ -0,0 +1,105 @@
+"""
+Onboarding assignment in bulk, and the task counters behind progress.
+
+``assign_workflow`` gives a workflow to a whole set of employees, such as a
+department or everyone who joined in a date range. It uses one bulk_create
+for the assignments and one for their task assignments, whatever the size
+of the set. Employees who already have the workflow are skipped. Each task
+assignment starts with the number of dependencies its task has in the
+workflow's graph (see core.onboarding_graph).
+
+Each OnboardingAssignment keeps ``total_tasks`` (its task assignments) and
+``completed_tasks`` (those COMPLETED), so progress never needs a COUNT:
+
+- ``assign_workflow`` sets ``total_tasks`` when it creates the assignment;
+- ``OnboardingTaskAssignment.save_status()``, used by the task's
+  ``mark_*``/``approve``/``reject`` methods, moves ``completed_tasks`` when
+  a task enters or leaves COMPLETED;
+- the post_delete handler from ``connect_signals()`` takes a task
+  assignment deleted on its own, or with its task, off both counters.
+
+``assignment_counts`` annotates workflows with their assignment totals, so
+the dashboard lists every workflow's performance from one query.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete
+
+from .models import OnboardingAssignment, OnboardingTask, OnboardingTaskAssignment
+from .onboarding_graph import load_graph
+
+
+ONBOARDING_BATCH_SIZE = getattr(settings, 'ONBOARDING_BATCH_SIZE', 500)
+
+OPEN_STATUSES = ('NOT_STARTED', 'IN_PROGRESS', 'PENDING_APPROVAL')
+
+
+def assign_workflow(workflow, employees, assigned_by=None, due_date=None, notes=''):
+    """
+    Assign ``workflow`` and all its tasks to the employees in ``employees``
+    (a queryset) who do not have it yet. Returns ``(new assignments,
+    number of employees skipped)``. Raises TaskCycleError when the
+    workflow's task dependencies form a cycle.
+    """
+    graph = load_graph(workflow.id)
+    with transaction.atomic():
+        assigned = set(OnboardingAssignment.objects.filter(
+            workflow=workflow, employee__in=employees
+        ).values_list('employee_id', flat=True))
+        assignments = [
+            OnboardingAssignment(
+                employee_id=employee_id,
+                workflow=workflow,
+                assigned_by=assigned_by,
+                due_date=due_date,
+                notes=notes,
+                total_tasks=len(graph.order),
+            )
+            for employee_id in employees.values_list('id', flat=True)
+            if employee_id not in assigned
+        ]
+        OnboardingAssignment.objects.bulk_create(assignments, batch_size=ONBOARDING_BATCH_SIZE)
+        OnboardingTaskAssignment.objects.bulk_create([
+            OnboardingTaskAssignment(
+                onboarding_assignment=assignment,
+                company_id=workflow.company_id,
+                task_id=task_id,
+                due_date=due_date,
+                pending_dependencies=len(graph.dependencies[task_id]),
+            )
+            for assignment in assignments
+            for task_id in graph.order
+        ], batch_size=ONBOARDING_BATCH_SIZE)
+    return assignments, len(assigned)
+
+
+def assignment_counts(workflows):
+    """Annotate ``workflows`` with ``total_assigned``, ``completed_count`` and ``in_progress_count``"""
+    return workflows.annotate(
+        total_assigned=Count('workflow_assignments'),
+        completed_count=Count('workflow_assignments', filter=Q(workflow_assignments__status='COMPLETED')),
+        in_progress_count=Count('workflow_assignments', filter=Q(workflow_assignments__status='IN_PROGRESS')),
+    )
+
+
+def completion_rate(workflow):
+    """Percentage of an annotated workflow's assignments that are completed"""
+    if not workflow.total_assigned:
+        return 0
+    return workflow.completed_count / workflow.total_assigned * 100
+
+
+def _task_assignment_deleted(sender, instance, origin=None, **kwargs):
+    # Only tasks removed from a workflow change a surviving assignment's counters
+    if getattr(origin, 'model', type(origin)) not in (OnboardingTask, OnboardingTaskAssignment):
+        return
+    assignment = OnboardingAssignment.objects.filter(pk=instance.onboarding_assignment_id).first()
+    if assignment is not None:
+        assignment.adjust_task_counts(total=-1, completed=-1 if instance.status == 'COMPLETED' else 0)
+
+
+def connect_signals():
+    post_delete.connect(
+        _task_assignment_deleted, sender=OnboardingTaskAssignment, dispatch_uid='onboarding_task_assignment_deleted'
+    )
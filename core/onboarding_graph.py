@@ -0,0 +1,227 @@
+"""
+Dependency graphs of onboarding workflows.
+
+A task waits on the tasks in its ``depends_on``. A task with
+``is_sequential`` also waits on the task just before it in the workflow's
+order. ``load_graph(workflow_id)`` reads a workflow's tasks and
+dependencies with two queries into a TaskGraph. The graph is cached under
+the workflow's ``graph_version``, which the signal handlers from
+``connect_signals()`` bump whenever a task or dependency changes. A
+TaskGraph holds the topological order and answers readiness questions in
+memory. Building one raises TaskCycleError if the dependencies form a
+cycle, and adding a dependency that would close a cycle is refused.
+
+Each OnboardingTaskAssignment keeps ``pending_dependencies``: how many of
+its task's dependencies are not yet completed within the same onboarding.
+``assign_workflow`` (core.onboarding) sets it from the graph. When a task
+completes, ``unlock_dependents`` moves the counts of the tasks that depend
+on it with one UPDATE, so finding the ready tasks never walks the graph in
+the database. After the graph of a workflow changes, the
+``refresh_onboarding_dependencies`` job recomputes the counts of its
+assignments with ``refresh_pending``.
+"""
+import heapq
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .models import OnboardingTask, OnboardingTaskAssignment, OnboardingWorkflow
+
+
+ONBOARDING_GRAPH_CACHE_TIMEOUT = getattr(settings, 'ONBOARDING_GRAPH_CACHE_TIMEOUT', 24 * 60 * 60)
+BATCH_SIZE = 500
+
+
+class TaskCycleError(ValueError):
+    """Raised when onboarding task dependencies form a cycle"""
+
+    def __init__(self, task_ids):
+        self.task_ids = task_ids
+        super().__init__(f'Onboarding tasks {task_ids} are part of, or wait on, a dependency cycle')
+
+
+class TaskGraph:
+    """The tasks of one workflow and what each waits on"""
+
+    def __init__(self, tasks, edges):
+        """``tasks``: task ids in workflow order; ``edges``: ``(task, dependency)`` pairs"""
+        self.tasks = list(tasks)
+        self.dependencies = {task: set() for task in self.tasks}
+        self.dependents = {task: set() for task in self.tasks}
+        for task, dependency in edges:
+            # Dependencies on tasks of other workflows are ignored
+            if task in self.dependencies and dependency in self.dependencies and task != dependency:
+                self.dependencies[task].add(dependency)
+                self.dependents[dependency].add(task)
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        """Tasks with each after all it waits on, otherwise in workflow order (Kahn's algorithm)"""
+        position = {task: index for index, task in enumerate(self.tasks)}
+        waiting = {task: len(dependencies) for task, dependencies in self.dependencies.items()}
+        available = [position[task] for task in self.tasks if not waiting[task]]
+        heapq.heapify(available)
+        order = []
+        while available:
+            task = self.tasks[heapq.heappop(available)]
+            order.append(task)
+            for dependent in self.dependents[task]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    heapq.heappush(available, position[dependent])
+        if len(order) < len(self.tasks):
+            raise TaskCycleError([task for task in self.tasks if waiting[task]])
+        return order
+
+    def edges(self):
+        return [(task, dependency) for task, dependencies in self.dependencies.items() for dependency in dependencies]
+
+    def with_edges(self, edges):
+        """A new graph with ``edges`` added; raises TaskCycleError if they close a cycle"""
+        return TaskGraph(self.tasks, self.edges() + list(edges))
+
+    def pending(self, task, completed):
+        """Number of ``task``'s dependencies not in ``completed``"""
+        return len(self.dependencies[task] - completed)
+
+    def ready(self, completed):
+        """Tasks not in ``completed`` whose dependencies all are, in topological order"""
+        return [
+            task for task in self.order
+            if task not in completed and self.dependencies[task] <= completed
+        ]
+
+    def unlocked_by(self, task, completed):
+        """Dependents of ``task`` that completing it (with ``completed`` done) makes ready"""
+        done = completed | {task}
+        return [
+            dependent for dependent in self.order
+            if dependent in self.dependents[task] and dependent not in done and self.dependencies[dependent] <= done
+        ]
+
+
+def _read_graph(workflow_id):
+    tasks = list(
+        OnboardingTask.objects.filter(workflow_id=workflow_id).order_by('order', 'created_at', 'id')
+        .values_list('id', 'is_sequential')
+    )
+    edges = list(
+        OnboardingTask.depends_on.through.objects.filter(from_onboardingtask__workflow_id=workflow_id)
+        .values_list('from_onboardingtask_id', 'to_onboardingtask_id')
+    )
+    for (previous, _), (task, is_sequential) in zip(tasks, tasks[1:]):
+        if is_sequential:
+            edges.append((task, previous))
+    return TaskGraph([task for task, _ in tasks], edges)
+
+
+def load_graph(workflow_id):
+    """The TaskGraph of a workflow, cached per ``graph_version``"""
+    version = OnboardingWorkflow.objects.filter(pk=workflow_id).values_list('graph_version', flat=True).first()
+    return cache.get_or_set(
+        f'onboarding_graph:{workflow_id}:{version}',
+        lambda: _read_graph(workflow_id),
+        ONBOARDING_GRAPH_CACHE_TIMEOUT,
+    )
+
+
+def unlock_dependents(task_assignment, change):
+    """
+    Move the pending dependencies of the tasks depending on
+    ``task_assignment``'s task, within the same onboarding: ``change`` is
+    1 when the task was completed and -1 when it no longer is
+    """
+    dependents = load_graph(task_assignment.task.workflow_id).dependents.get(task_assignment.task_id)
+    if dependents:
+        OnboardingTaskAssignment.objects.filter(
+            onboarding_assignment_id=task_assignment.onboarding_assignment_id, task_id__in=dependents
+        ).update(pending_dependencies=F('pending_dependencies') - change)
+
+
+def _task_statuses(assignments):
+    """``(assignment id, workflow id, [(task assignment id, task id, status, pending)])`` per assignment"""
+    rows = OnboardingTaskAssignment.objects.filter(onboarding_assignment__in=assignments).order_by(
+        'onboarding_assignment_id'
+    ).values_list(
+        'onboarding_assignment_id', 'onboarding_assignment__workflow_id', 'id', 'task_id', 'status',
+        'pending_dependencies',
+    )
+    for (assignment_id, workflow_id), group in groupby(rows.iterator(), key=lambda row: row[:2]):
+        yield assignment_id, workflow_id, [row[2:] for row in group]
+
+
+def _satisfied(graph, tasks):
+    """Tasks no one waits on in an onboarding: those completed, and those added to the workflow after it was assigned"""
+    assigned = {task_id for _, task_id, _, _ in tasks}
+    completed = {task_id for _, task_id, status, _ in tasks if status == 'COMPLETED'}
+    return completed | (set(graph.tasks) - assigned)
+
+
+def ready_tasks(assignments):
+    """``{assignment id: [ready task ids]}`` for ``assignments`` (a queryset), from one query"""
+    graphs = {}
+    ready = {}
+    for assignment_id, workflow_id, tasks in _task_statuses(assignments):
+        if workflow_id not in graphs:
+            graphs[workflow_id] = load_graph(workflow_id)
+        done = _satisfied(graphs[workflow_id], tasks)
+        assigned = {task_id for _, task_id, _, _ in tasks}
+        ready[assignment_id] = [task for task in graphs[workflow_id].ready(done) if task in assigned]
+    return ready
+
+
+def refresh_pending(assignments):
+    """Recompute ``pending_dependencies`` for ``assignments`` (a queryset); returns how many changed"""
+    graphs = {}
+    changed = []
+    for assignment_id, workflow_id, tasks in _task_statuses(assignments):
+        if workflow_id not in graphs:
+            graphs[workflow_id] = load_graph(workflow_id)
+        graph = graphs[workflow_id]
+        done = _satisfied(graph, tasks)
+        for task_assignment_id, task_id, status, pending in tasks:
+            expected = graph.pending(task_id, done) if task_id in graph.dependencies else 0
+            if expected != pending:
+                changed.append(OnboardingTaskAssignment(id=task_assignment_id, pending_dependencies=expected))
+    OnboardingTaskAssignment.objects.bulk_update(changed, ['pending_dependencies'], batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+def graph_changed(workflow_id):
+    """Invalidate the cached graph of a workflow and queue the refresh of its pending counts"""
+    from .jobs import enqueue
+
+    OnboardingWorkflow.objects.filter(pk=workflow_id).update(graph_version=F('graph_version') + 1)
+    transaction.on_commit(lambda: enqueue('refresh_onboarding_dependencies', {'workflow_id': workflow_id}))
+
+
+def _task_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        graph_changed(instance.workflow_id)
+
+
+def _task_deleted(sender, instance, origin=None, **kwargs):
+    # Tasks deleted along with their workflow leave no graph to refresh
+    if getattr(origin, 'model', type(origin)) is OnboardingTask:
+        graph_changed(instance.workflow_id)
+
+
+def _dependencies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_add' and pk_set:
+        edges = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        # Raises TaskCycleError before the dependencies are stored
+        load_graph(instance.workflow_id).with_edges(edges)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        graph_changed(instance.workflow_id)
+
+
+def connect_signals():
+    post_save.connect(_task_saved, sender=OnboardingTask, dispatch_uid='onboarding_graph_task_saved')
+    post_delete.connect(_task_deleted, sender=OnboardingTask, dispatch_uid='onboarding_graph_task_deleted')
+    m2m_changed.connect(
+        _dependencies_changed, sender=OnboardingTask.depends_on.through, dispatch_uid='onboarding_graph_dependencies'
+    )
@@ -0,0 +1,268 @@
+"""
+Daily platform rollups for the owner analytics pages.
+
+``rollup(start, end)`` writes one DailyPlatformStats row per day. It makes
+the same number of queries however many days the range covers:
+
+- for companies, users and employees, one GROUP BY day query for rows
+  created in the range, plus one aggregate for rows created before it.
+  Totals are running sums of these;
+- one query for the subscription intervals (see core.revenue) that overlap
+  the range. MRR per plan is then swept day by day from their start and
+  end dates, and one query counts new subscriptions.
+
+Counts that depend on a flag (active companies and users, verified and
+registered employees) use the flag's value at rollup time. Once a day has
+been rolled up after it ended, its row keeps those values. An interval
+that is not renewed counts as churn on its end date.
+
+The ``rollup_platform_stats`` job re-rolls yesterday and today every
+PLATFORM_STATS_ROLLUP_INTERVAL. The first run after midnight therefore
+finalizes the previous day. ``ensure_rollups()`` fills any gap up to today
+before a page reads the table, and ``backfill_platform_stats`` rebuilds
+history. The analytics views read the table through ``latest_stats``,
+``stats_rows``, ``window_sums`` and ``row_on``. Company size buckets depend
+on each company's current headcount, so ``company_size_counts`` gets them
+live, in one query.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Company, CompanySubscription, DailyPlatformStats, Employee
+from .revenue import interval_events
+
+
+PLATFORM_STATS_ROLLUP_INTERVAL = getattr(settings, 'PLATFORM_STATS_ROLLUP_INTERVAL', timedelta(hours=1))
+
+# (model, created field, {count name: filter}) for the per-day counts
+ENTITY_COUNTS = {
+    'companies': (Company, 'created_at', {'active_companies': Q(is_active=True)}),
+    'users': (User, 'date_joined', {'active_users': Q(is_active=True)}),
+    'employees': (Employee, 'created_at', {
+        'verified_employees': Q(is_verified=True),
+        'registered_employees': Q(user_account__isnull=False),
+    }),
+}
+
+STAT_FIELDS = [
+    'new_companies', 'new_users', 'new_employees', 'new_subscriptions',
+    'total_companies', 'active_companies', 'total_users', 'active_users',
+    'total_employees', 'verified_employees', 'registered_employees',
+    'mrr', 'mrr_by_plan', 'churned_subscriptions', 'churned_mrr',
+]
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _entity_series(model, field, flags, start, end):
+    """
+    Per-day new counts and running totals (overall and per flag) for
+    ``model`` over ``start``..``end``: ``{day: {'new': n, 'total': n, flag: n}}``
+    """
+    counts = {'n': Count('pk')}
+    counts.update({name: Count('pk', filter=condition) for name, condition in flags.items()})
+
+    base = model.objects.filter(**{f'{field}__lt': day_start(start)}).aggregate(**counts)
+    per_day = {
+        row['day']: row
+        for row in model.objects.filter(**{
+            f'{field}__gte': day_start(start),
+            f'{field}__lt': day_start(end + timedelta(days=1)),
+        }).annotate(day=TruncDate(field)).values('day').annotate(**counts).order_by()
+    }
+
+    running = {name: base[name] or 0 for name in counts}
+    series = {}
+    day = start
+    while day <= end:
+        row = per_day.get(day, {})
+        for name in counts:
+            running[name] += row.get(name, 0)
+        series[day] = {'new': row.get('n', 0), 'total': running['n'], **{name: running[name] for name in flags}}
+        day += timedelta(days=1)
+    return series
+
+
+def _subscription_series(start, end):
+    """Per-day MRR (total and by plan), churn and new subscriptions over ``start``..``end``"""
+    # day -> {plan: MRR change}; the sweep below accumulates them
+    changes = defaultdict(lambda: defaultdict(Decimal))
+    churn = defaultdict(lambda: [0, Decimal('0')])
+    for interval in interval_events(start, end, fields=('plan__name', 'is_churn')):
+        plan = interval['plan__name'] or 'Other'
+        changes[max(interval['start_date'], start)][plan] += interval['mrr']
+        if interval['end_date'] <= end:
+            changes[interval['end_date']][plan] -= interval['mrr']
+            if interval['is_churn']:
+                churn[interval['end_date']][0] += 1
+                churn[interval['end_date']][1] += interval['mrr']
+
+    new = defaultdict(int)
+    for created in CompanySubscription.objects.filter(
+        created_at__gte=day_start(start), created_at__lt=day_start(end + timedelta(days=1))
+    ).values_list('created_at', flat=True):
+        new[timezone.localdate(created)] += 1
+
+    by_plan = defaultdict(Decimal)
+    series = {}
+    day = start
+    while day <= end:
+        for plan, change in changes.get(day, {}).items():
+            by_plan[plan] += change
+        plans = {plan: round(float(amount), 2) for plan, amount in sorted(by_plan.items()) if amount > 0}
+        series[day] = {
+            'mrr': sum((amount for amount in by_plan.values() if amount > 0), Decimal('0')).quantize(Decimal('0.01')),
+            'mrr_by_plan': plans,
+            'churned_subscriptions': churn[day][0] if day in churn else 0,
+            'churned_mrr': (churn[day][1] if day in churn else Decimal('0')).quantize(Decimal('0.01')),
+            'new_subscriptions': new.get(day, 0),
+        }
+        day += timedelta(days=1)
+    return series
+
+
+def rollup(start, end):
+    """Write (or rewrite) the DailyPlatformStats rows for ``start``..``end``; returns the number of days"""
+    if end < start:
+        return 0
+    companies = _entity_series(*ENTITY_COUNTS['companies'], start, end)
+    users = _entity_series(*ENTITY_COUNTS['users'], start, end)
+    employees = _entity_series(*ENTITY_COUNTS['employees'], start, end)
+    subscriptions = _subscription_series(start, end)
+
+    rows = []
+    day = start
+    while day <= end:
+        rows.append(DailyPlatformStats(
+            date=day,
+            new_companies=companies[day]['new'],
+            total_companies=companies[day]['total'],
+            active_companies=companies[day]['active_companies'],
+            new_users=users[day]['new'],
+            total_users=users[day]['total'],
+            active_users=users[day]['active_users'],
+            new_employees=employees[day]['new'],
+            total_employees=employees[day]['total'],
+            verified_employees=employees[day]['verified_employees'],
+            registered_employees=employees[day]['registered_employees'],
+            **subscriptions[day],
+        ))
+        day += timedelta(days=1)
+
+    with transaction.atomic():
+        DailyPlatformStats.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=STAT_FIELDS + ['updated_at'],
+        )
+    return len(rows)
+
+
+def first_activity_date():
+    """Day of the earliest company, user, employee or subscription, or None"""
+    candidates = [
+        Company.objects.aggregate(first=Min('created_at'))['first'],
+        User.objects.aggregate(first=Min('date_joined'))['first'],
+        Employee.objects.aggregate(first=Min('created_at'))['first'],
+        CompanySubscription.objects.aggregate(first=Min('start_date'))['first'],
+    ]
+    candidates = [timezone.localdate(value) for value in candidates if value]
+    return min(candidates) if candidates else None
+
+
+def ensure_rollups(today=None):
+    """
+    Roll up from the last stored day (which may have been partial) through
+    today if today has no row yet. Returns the number of days written.
+    """
+    today = today or timezone.localdate()
+    last = DailyPlatformStats.objects.order_by('-date').values_list('date', flat=True).first()
+    if last is not None and last >= today:
+        return 0
+    start = last or first_activity_date() or today
+    return rollup(min(start, today), today)
+
+
+def refresh_recent(today=None):
+    """Re-roll yesterday and today (the periodic job)"""
+    today = today or timezone.localdate()
+    last = DailyPlatformStats.objects.order_by('-date').values_list('date', flat=True).first()
+    start = today - timedelta(days=1)
+    if last is not None and last < start:
+        start = last
+    elif last is None:
+        start = first_activity_date() or start
+    return rollup(min(start, today), today)
+
+
+def latest_stats():
+    """Today's row (rolled up first if missing)"""
+    ensure_rollups()
+    return DailyPlatformStats.objects.order_by('-date').first()
+
+
+def stats_rows(start, end):
+    """Rows for ``start``..``end`` as dicts, oldest first"""
+    return list(DailyPlatformStats.objects.filter(date__range=(start, end)).values('date', *STAT_FIELDS))
+
+
+def trailing_windows(today, count, days):
+    """``count`` consecutive ``days``-day ``(start, end)`` windows ending on ``today``, oldest first"""
+    return [
+        (today - timedelta(days=days * i + days - 1), today - timedelta(days=days * i))
+        for i in reversed(range(count))
+    ]
+
+
+def window_sums(rows, windows, fields):
+    """
+    Sum ``fields`` of ``rows`` (from ``stats_rows``) within each
+    ``(start, end)`` window, inclusive; one dict per window
+    """
+    sums = [dict.fromkeys(fields, 0) for _ in windows]
+    for row in rows:
+        for index, (start, end) in enumerate(windows):
+            if start <= row['date'] <= end:
+                for field in fields:
+                    sums[index][field] += row[field]
+    return sums
+
+
+def row_on(rows, day):
+    """The last row in ``rows`` dated on or before ``day``, or None"""
+    found = None
+    for row in rows:
+        if row['date'] > day:
+            break
+        found = row
+    return found
+
+
+def company_size_counts(sizes, since=None, **filters):
+    """
+    Number of companies whose employee count falls in each ``{'min', 'max'}``
+    of ``sizes`` (and of those created since ``since``), in one query
+    """
+    counts = {}
+    for index, size in enumerate(sizes):
+        in_range = Q(employee_count__gte=size['min'], employee_count__lte=size['max'])
+        counts[f'size_{index}'] = Count('pk', filter=in_range)
+        if since is not None:
+            counts[f'new_{index}'] = Count('pk', filter=in_range & Q(created_at__gte=since))
+    totals = Company.objects.filter(**filters).annotate(employee_count=Count('employees')).aggregate(**counts)
+    return [
+        {'total': totals[f'size_{index}'], 'new': totals.get(f'new_{index}', 0)}
+        for index in range(len(sizes))
+    ]
@@ -0,0 +1,259 @@
+"""
+Chat presence, shared by every process through the ``presence`` cache.
+
+Consumers call ``presence.connect()`` / ``heartbeat()`` / ``disconnect()``.
+Each company and each room has one set of online employee ids in the
+``presence`` cache (Redis in production, so the web workers see what the
+Channels workers record). In Redis it is a sorted set scored by the time
+each entry expires, PRESENCE_TTL seconds after its last refresh. A client's
+ping refreshes its entries, and the presence task of each process
+refreshes the entries of all its connections every PRESENCE_FLUSH_INTERVAL
+seconds. The employees of a worker that dies therefore drop off once their
+entries expire. ``online_in_company()`` / ``online_in_room()`` read a set
+with one call, whatever the size of the company.
+
+Presence is tracked per WebSocket connection, so an employee with several
+tabs open in a process stays online until the last one closes. Tabs open in
+other processes put the entry back on their next refresh.
+
+Room activity also records a pending ``ChatParticipant.last_seen`` value.
+``start_flusher()`` runs the presence task on the consumer event loop. It
+writes the pending values in one batch every PRESENCE_FLUSH_INTERVAL
+seconds, instead of one write per connect. Values still pending when the
+task is cancelled or the process exits are written then.
+"""
+import asyncio
+import atexit
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChatParticipant
+
+
+PRESENCE_FLUSH_INTERVAL = 30
+# Long enough to survive a couple of missed refreshes (clients ping every 30 seconds)
+PRESENCE_TTL = getattr(settings, 'PRESENCE_TTL', 90)
+PRESENCE_CACHE = getattr(settings, 'PRESENCE_CACHE', 'presence')
+
+
+def _company_set(company_id):
+    return f'chat_presence:company:{company_id}'
+
+
+def _room_set(room_id):
+    return f'chat_presence:room:{room_id}'
+
+
+def _sets(employee_id, company_id, room_id):
+    """``(set, employee id)`` entries of one connection"""
+    entries = [(_company_set(company_id), employee_id)]
+    if room_id is not None:
+        entries.append((_room_set(room_id), employee_id))
+    return entries
+
+
+class RedisPresenceSets:
+    """Sorted sets of employee ids scored by expiry time, one Redis round trip per call"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def _client(self):
+        # The redis-py client behind Django's RedisCache; the cache API has no sets
+        return self.cache._cache.get_client(write=True)
+
+    def add(self, entries):
+        now = time.time()
+        pipe = self._client().pipeline()
+        for name, employee_id in entries:
+            key = self.cache.make_key(name)
+            pipe.zadd(key, {employee_id: now + PRESENCE_TTL})
+            pipe.zremrangebyscore(key, '-inf', now)
+            pipe.expire(key, PRESENCE_TTL)
+        pipe.execute()
+
+    def remove(self, entries):
+        pipe = self._client().pipeline()
+        for name, employee_id in entries:
+            pipe.zrem(self.cache.make_key(name), employee_id)
+        pipe.execute()
+
+    def members(self, name):
+        return {int(member) for member in self._client().zrangebyscore(self.cache.make_key(name), time.time(), '+inf')}
+
+
+class CachePresenceSets:
+    """
+    The same sets as ``{employee id: expiry}`` dicts in any other cache
+    backend, e.g. local memory in development. Updates read and rewrite the
+    dict, so they are only safe within one process.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.lock = threading.Lock()
+
+    def _update(self, entries, change):
+        now = time.time()
+        with self.lock:
+            names = {name for name, _ in entries}
+            sets = self.cache.get_many(names)
+            for name, employee_id in entries:
+                change(sets.setdefault(name, {}), employee_id, now)
+            self.cache.set_many({
+                name: {member: expires for member, expires in members.items() if expires > now}
+                for name, members in sets.items()
+            }, PRESENCE_TTL)
+
+    def add(self, entries):
+        self._update(entries, lambda members, employee_id, now: members.__setitem__(employee_id, now + PRESENCE_TTL))
+
+    def remove(self, entries):
+        self._update(entries, lambda members, employee_id, now: members.pop(employee_id, None))
+
+    def members(self, name):
+        now = time.time()
+        return {member for member, expires in (self.cache.get(name) or {}).items() if expires > now}
+
+
+class PresenceRegistry:
+    """The connections of this process, published to the presence sets"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = {}      # channel_name -> (employee_id, company_id, room_id)
+        self.pending_last_seen = {}  # (room_id, employee_id) -> datetime
+        self._sets = None
+
+    @property
+    def sets(self):
+        if self._sets is None:
+            cache = caches[PRESENCE_CACHE]
+            self._sets = RedisPresenceSets(cache) if isinstance(cache, RedisCache) else CachePresenceSets(cache)
+        return self._sets
+
+    async def connect(self, channel_name, employee_id, company_id, room_id=None):
+        with self.lock:
+            self.connections[channel_name] = (employee_id, company_id, room_id)
+            if room_id is not None:
+                self.pending_last_seen[(room_id, employee_id)] = timezone.now()
+        await sync_to_async(self.sets.add)(_sets(employee_id, company_id, room_id))
+
+    async def heartbeat(self, channel_name):
+        with self.lock:
+            connection = self.connections.get(channel_name)
+            if connection is None:
+                return
+            employee_id, _, room_id = connection
+            if room_id is not None:
+                self.pending_last_seen[(room_id, employee_id)] = timezone.now()
+        await sync_to_async(self.sets.add)(_sets(*connection))
+
+    async def disconnect(self, channel_name):
+        with self.lock:
+            connection = self.connections.pop(channel_name, None)
+            if connection is None:
+                return
+            employee_id, company_id, room_id = connection
+            if room_id is not None:
+                self.pending_last_seen[(room_id, employee_id)] = timezone.now()
+            remaining = [other for other in self.connections.values() if other[0] == employee_id]
+
+        # Only drop the entries no other connection of this process still holds
+        gone = []
+        if not any(other[1] == company_id for other in remaining):
+            gone.append((_company_set(company_id), employee_id))
+        if room_id is not None and not any(other[2] == room_id for other in remaining):
+            gone.append((_room_set(room_id), employee_id))
+        if gone:
+            await sync_to_async(self.sets.remove)(gone)
+
+    async def refresh(self):
+        """Renew the presence entries of every connection of this process"""
+        with self.lock:
+            connections = set(self.connections.values())
+        entries = {entry for connection in connections for entry in _sets(*connection)}
+        if entries:
+            await sync_to_async(self.sets.add)(list(entries))
+
+    def online_in_company(self, company_id):
+        """Ids of the employees online in the company"""
+        return self.sets.members(_company_set(company_id))
+
+    def online_in_room(self, room_id):
+        """Ids of the employees with the room open"""
+        return self.sets.members(_room_set(room_id))
+
+    def take_pending_last_seen(self):
+        with self.lock:
+            pending, self.pending_last_seen = self.pending_last_seen, {}
+        return pending
+
+
+presence = PresenceRegistry()
+
+
+def flush_last_seen(registry=presence):
+    """Write pending last_seen values in one batch; returns the number of rows written"""
+    pending = registry.take_pending_last_seen()
+    if not pending:
+        return 0
+
+    room_ids = {room_id for room_id, _ in pending}
+    employee_ids = {employee_id for _, employee_id in pending}
+    existing = {
+        (participant.room_id, participant.employee_id): participant
+        for participant in ChatParticipant.objects.filter(room_id__in=room_ids, employee_id__in=employee_ids)
+    }
+
+    updated = []
+    created = []
+    for key, last_seen in pending.items():
+        participant = existing.get(key)
+        if participant is None:
+            created.append(ChatParticipant(room_id=key[0], employee_id=key[1], last_seen=last_seen))
+        else:
+            participant.last_seen = last_seen
+            updated.append(participant)
+
+    with transaction.atomic():
+        ChatParticipant.objects.bulk_update(updated, ['last_seen'], batch_size=500)
+        ChatParticipant.objects.bulk_create(created, batch_size=500, ignore_conflicts=True)
+    return len(pending)
+
+
+_flusher = None
+
+
+async def _flush_forever():
+    try:
+        while True:
+            await asyncio.sleep(PRESENCE_FLUSH_INTERVAL)
+            try:
+                await presence.refresh()
+                await sync_to_async(flush_last_seen)()
+            except Exception as e:
+                print(f"Error flushing chat presence: {e}")
+    finally:
+        # Cancelled when the server shuts down: keep what is still pending
+        try:
+            await sync_to_async(flush_last_seen)()
+        except Exception as e:
+            print(f"Error flushing chat last_seen: {e}")
+
+
+def start_flusher():
+    """Start the presence task on the running event loop (once per process)"""
+    global _flusher
+    if _flusher is None:
+        # Anything recorded after the task stopped is written at exit
+        atexit.register(flush_last_seen)
+    if _flusher is None or _flusher.done():
+        _flusher = asyncio.get_running_loop().create_task(_flush_forever())
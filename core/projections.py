@@ -0,0 +1,83 @@
+"""
+Row projections shared by the attendance and timesheet reports and exports.
+
+Each ``*_rows()`` helper takes an already-filtered queryset and returns a
+``.values()`` queryset that pulls employee/project columns through joins and
+computes hours worked in SQL, so an export is one query however many rows it
+has. The matching ``*_record()`` helper formats one row for output.
+"""
+from django.db.models import DurationField, ExpressionWrapper, F
+
+from .models import Attendance, Timesheet
+
+
+ATTENDANCE_STATUS_LABELS = dict(Attendance.ATTENDANCE_STATUS)
+TIMESHEET_STATUS_LABELS = dict(Timesheet.TIMESHEET_STATUS)
+
+ATTENDANCE_EXPORT_HEADER = [
+    'Employee Name', 'Department', 'Date', 'Status', 'Check In', 'Check Out', 'Hours Worked', 'Notes'
+]
+
+TIMESHEET_EXPORT_HEADER = [
+    'Employee Name', 'Employee Email', 'Department', 'Project', 'Date',
+    'Start Time', 'End Time', 'Break Duration', 'Total Hours',
+    'Task Description', 'Work Performed', 'Status', 'Billable',
+    'Hourly Rate', 'Submitted At', 'Approved By', 'Approved At'
+]
+
+
+def attendance_rows(queryset):
+    """Attendance rows with employee columns and ``worked`` (clock_out - clock_in) from SQL"""
+    return queryset.annotate(
+        worked=ExpressionWrapper(F('clock_out') - F('clock_in'), output_field=DurationField())
+    ).values(
+        'employee__first_name', 'employee__last_name', 'employee__department',
+        'date', 'status', 'clock_in', 'clock_out', 'worked', 'notes'
+    )
+
+
+def attendance_record(row):
+    """Format an ``attendance_rows()`` row; keys follow ATTENDANCE_EXPORT_HEADER"""
+    return {
+        'employee_name': f"{row['employee__first_name']} {row['employee__last_name']}",
+        'department': row['employee__department'] or 'N/A',
+        'date': row['date'].strftime('%Y-%m-%d'),
+        'status': ATTENDANCE_STATUS_LABELS.get(row['status'], row['status']),
+        'check_in': row['clock_in'].strftime('%H:%M:%S') if row['clock_in'] else 'N/A',
+        'check_out': row['clock_out'].strftime('%H:%M:%S') if row['clock_out'] else 'N/A',
+        'hours_worked': f"{row['worked'].total_seconds() / 3600:.2f}" if row['worked'] is not None else 'N/A',
+        'notes': row['notes'] or 'N/A',
+    }
+
+
+def timesheet_rows(queryset):
+    """Timesheet rows with employee, project and approver columns"""
+    return queryset.values(
+        'employee__first_name', 'employee__last_name', 'employee__email', 'employee__department',
+        'project__name', 'date', 'start_time', 'end_time', 'break_duration', 'total_hours',
+        'task_description', 'work_performed', 'status', 'billable', 'hourly_rate',
+        'submitted_at', 'approved_by__first_name', 'approved_by__last_name', 'approved_at'
+    )
+
+
+def timesheet_record(row):
+    """Format a ``timesheet_rows()`` row as a list matching TIMESHEET_EXPORT_HEADER"""
+    return [
+        f"{row['employee__first_name']} {row['employee__last_name']}",
+        row['employee__email'],
+        row['employee__department'] or 'No Department',
+        row['project__name'] or 'No Project',
+        row['date'].strftime('%Y-%m-%d'),
+        row['start_time'].strftime('%H:%M'),
+        row['end_time'].strftime('%H:%M'),
+        str(row['break_duration']),
+        str(row['total_hours']),
+        row['task_description'],
+        row['work_performed'],
+        TIMESHEET_STATUS_LABELS.get(row['status'], row['status']),
+        'Yes' if row['billable'] else 'No',
+        str(row['hourly_rate']) if row['hourly_rate'] else '',
+        row['submitted_at'].strftime('%Y-%m-%d %H:%M:%S') if row['submitted_at'] else '',
+        f"{row['approved_by__first_name']} {row['approved_by__last_name']}" if row['approved_by__first_name'] is not None else '',
+        row['approved_at'].strftime('%Y-%m-%d %H:%M:%S') if row['approved_at'] else '',
+    ]
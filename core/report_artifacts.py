@@ -0,0 +1,284 @@
+"""
+Stored report artifacts.
+
+A report is generated once for a given set of parameters, written as
+gzip-compressed JSON or CSV under ``MEDIA_ROOT/reports/`` and recorded as a
+``ReportArtifact`` keyed by a hash of those parameters. Later downloads with
+the same parameters stream the stored file (with Range support) instead of
+querying the database again. Artifacts expire after ``REPORT_ARTIFACT_TTL``.
+"""
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+from .models import Attendance, Employee, PerformanceMetric, ReportArtifact
+from .projections import attendance_record, attendance_rows
+
+
+REPORT_ARTIFACT_TTL = getattr(settings, 'REPORT_ARTIFACT_TTL', timedelta(hours=24))
+REPORTS_DIR = 'reports'
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+}
+
+
+def report_params(data):
+    """
+    Normalise report filters from a request's POST/GET data. The report
+    modals send ``start_date``/``end_date``; the API also accepts
+    ``date_from``/``date_to``.
+    """
+    return {
+        'report_type': data.get('report_type') or 'summary',
+        'date_from': data.get('date_from') or data.get('start_date') or None,
+        'date_to': data.get('date_to') or data.get('end_date') or None,
+        'department': data.get('department', ''),
+        'format': 'csv' if (data.get('format') or '').lower() == 'csv' else 'json',
+    }
+
+
+def params_hash(kind, company_id, params):
+    key = json.dumps({'kind': kind, 'company_id': company_id, **params}, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def get_fresh_artifact(kind, company, params):
+    """Return the unexpired artifact for these parameters, if its file still exists"""
+    artifact = ReportArtifact.objects.filter(
+        params_hash=params_hash(kind, company.id, params),
+        expires_at__gt=timezone.now()
+    ).first()
+    if artifact and default_storage.exists(artifact.file.name):
+        return artifact
+    return None
+
+
+def evict_expired_artifacts(now=None):
+    """Delete expired artifacts and their files; returns the number removed"""
+    expired = ReportArtifact.objects.filter(expires_at__lte=now or timezone.now())
+    count = 0
+    for artifact in expired:
+        try:
+            default_storage.delete(artifact.file.name)
+        except Exception as e:
+            print(f"Error deleting report file {artifact.file.name}: {e}")
+        artifact.delete()
+        count += 1
+    return count
+
+
+# Report builders: a .values() queryset of rows plus a formatter for each row
+
+def _attendance_rows(company, params):
+    attendance = Attendance.objects.filter(company=company)
+    if params['date_from']:
+        attendance = attendance.filter(date__gte=params['date_from'])
+    if params['date_to']:
+        attendance = attendance.filter(date__lte=params['date_to'])
+    if params['department']:
+        attendance = attendance.filter(employee__department=params['department'])
+    return attendance_rows(attendance.order_by('date', 'employee__last_name'))
+
+
+def _performance_rows(company, params):
+    metrics = PerformanceMetric.objects.filter(company=company)
+    if params['date_from']:
+        metrics = metrics.filter(period_end__gte=params['date_from'])
+    if params['date_to']:
+        metrics = metrics.filter(period_start__lte=params['date_to'])
+    if params['department']:
+        metrics = metrics.filter(employee__department=params['department'])
+    return metrics.order_by('period_start', 'employee__last_name').values(
+        'employee__first_name', 'employee__last_name', 'metric_type', 'value', 'period_start', 'period_end'
+    )
+
+
+def _format_performance(row):
+    return {
+        'employee_name': f"{row['employee__first_name']} {row['employee__last_name']}",
+        'metric_type': row['metric_type'],
+        'value': str(row['value']),
+        'period_start': row['period_start'].isoformat(),
+        'period_end': row['period_end'].isoformat(),
+    }
+
+
+REPORT_BUILDERS = {
+    'attendance': (_attendance_rows, attendance_record, 'attendance_records'),
+    'performance': (_performance_rows, _format_performance, 'performance_metrics'),
+}
+
+
+def _write_json(out, header, records_key, records):
+    # Stream the records array so large reports are never held in memory
+    head = json.dumps({**header, records_key: []}, indent=2)
+    out.write(head[:head.rindex('[') + 1])
+    first = True
+    for record in records:
+        out.write('\n    ' if first else ',\n    ')
+        out.write(json.dumps(record))
+        first = False
+    out.write('\n  ]\n}' if not first else ']\n}')
+
+
+def _write_csv(out, header, records_key, records):
+    writer = None
+    for record in records:
+        if writer is None:
+            writer = csv.DictWriter(out, fieldnames=list(record.keys()))
+            writer.writeheader()
+        writer.writerow(record)
+
+
+def build_report_artifact(kind, company, params, user=None, progress=None):
+    """
+    Generate a report to a gzip file and record it as a ReportArtifact.
+    ``progress(done, total, message)`` is called as rows are written.
+    """
+    evict_expired_artifacts()
+
+    get_rows, format_row, records_key = REPORT_BUILDERS[kind]
+    rows = get_rows(company, params)
+    total = rows.count()
+    key = params_hash(kind, company.id, params)
+    fmt = params['format']
+
+    header = {
+        'company_name': company.name,
+        'report_type': params['report_type'],
+        'date_from': params['date_from'],
+        'date_to': params['date_to'],
+        'department': params['department'],
+        'generated_at': timezone.now().isoformat(),
+        'total_employees': Employee.objects.filter(company=company).count(),
+        'total_records': total,
+    }
+
+    def records():
+        for index, row in enumerate(rows.iterator(chunk_size=2000), start=1):
+            yield format_row(row)
+            if progress:
+                progress(index, total, f'Writing {kind} report')
+
+    relative_path = f'{REPORTS_DIR}/{key}.{fmt}.gz'
+    path = default_storage.path(relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as out:
+        if fmt == 'csv':
+            _write_csv(out, header, records_key, records())
+        else:
+            _write_json(out, header, records_key, records())
+    os.replace(tmp_path, path)
+
+    timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
+    artifact, _ = ReportArtifact.objects.update_or_create(
+        params_hash=key,
+        defaults={
+            'company': company,
+            'kind': kind,
+            'params': params,
+            'format': fmt,
+            'file': relative_path,
+            'filename': f"{kind}_report_{company.name}_{timestamp}.{fmt}",
+            'size': os.path.getsize(path),
+            'row_count': total,
+            'created_by': user,
+            'expires_at': timezone.now() + REPORT_ARTIFACT_TTL,
+        }
+    )
+    return artifact
+
+
+def _parse_range(header, size):
+    """Return (start, end) for a single ``bytes=`` range, or None if unsatisfiable"""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last N bytes
+        length = min(int(end), size)
+        return (size - length, size - 1) if length else None
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return None
+    return start, end
+
+
+def _read_chunks(f, start=0, length=None):
+    """Yield ``length`` bytes of ``f`` from ``start`` (to EOF when omitted), then close it"""
+    try:
+        if start:
+            f.seek(start)
+        while length is None or length > 0:
+            chunk = f.read(CHUNK_SIZE if length is None else min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_artifact(request, artifact):
+    """
+    Stream a stored report. Clients that accept gzip get the stored bytes
+    as-is with ``Content-Encoding: gzip`` and byte-range support; others get
+    the decompressed file, so every response varies on Accept-Encoding.
+    """
+    path = artifact.file.path
+    content_type = CONTENT_TYPES[artifact.format]
+    disposition = f'attachment; filename="{artifact.filename}"'
+    etag = f'"{artifact.params_hash[:32]}-{int(artifact.created_at.timestamp())}"'
+
+    if 'gzip' not in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        # Streamed from a generator so FileResponse doesn't seek through the whole file for Content-Length
+        response = FileResponse(_read_chunks(gzip.open(path, 'rb')), content_type=content_type)
+        response['Content-Disposition'] = disposition
+        response['Accept-Ranges'] = 'none'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+    size = artifact.size or os.path.getsize(path)
+    range_header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            patch_vary_headers(response, ['Accept-Encoding'])
+            return response
+        start, end = byte_range
+        response = FileResponse(_read_chunks(open(path, 'rb'), start, end - start + 1), status=206,
+                                content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(_read_chunks(open(path, 'rb')), content_type=content_type)
+        response['Content-Length'] = str(size)
+
+    response['Content-Encoding'] = 'gzip'
+    response['Content-Disposition'] = disposition
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
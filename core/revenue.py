@@ -0,0 +1,254 @@
+"""
+Subscription revenue: MRR, ARR, ARPU and churn.
+
+Figures come from SubscriptionInterval rather than from the subscriptions
+and payments themselves. An interval is a span of days that a subscription
+was paid for, together with its monthly value (MRR):
+
+- each COMPLETED SubscriptionPayment gives an interval covering its billing
+  period. Its MRR is the amount divided by the period length in months;
+- a subscription with no completed payments that is ACTIVE, or that was
+  paid before it EXPIRED or was CANCELLED, gives one interval. It covers the
+  subscription's own dates at the plan's monthly price. TRIAL and SUSPENDED
+  subscriptions give none;
+- intervals worth nothing (free plans, zero payments) are dropped, so the
+  companies on them count neither as paying nor as churned.
+
+Intervals of a subscription that follow one another within
+RENEWAL_GRACE_DAYS are renewals. The first interval of a run is marked
+``is_new``, and the last one ``is_churn``. Each date range can then be
+answered by one filtered aggregate over intervals:
+
+- MRR on a day is the sum over the intervals covering it;
+- new and churned MRR are the sums of ``is_new`` intervals starting, and
+  ``is_churn`` intervals ending, in the range.
+
+``rebuild_intervals`` rewrites a subscription's intervals. The signal
+handlers from ``connect_signals()`` call it whenever a subscription or one
+of its payments changes. Migration 0025 builds the intervals of existing
+subscriptions, and the ``rebuild_subscription_intervals`` command rebuilds
+all of them, for example after a plan's price was corrected.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import Company, CompanySubscription, SubscriptionInterval, SubscriptionPayment
+
+
+RENEWAL_GRACE_DAYS = getattr(settings, 'RENEWAL_GRACE_DAYS', 7)
+
+PAYING_STATUSES = ('ACTIVE', 'EXPIRED', 'CANCELLED')
+DAYS_PER_MONTH = 365.25 / 12
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+BATCH_SIZE = 500
+
+
+def period_months(start, end):
+    """Whole months in a billing period (at least one)"""
+    return max(1, round((end - start).days / DAYS_PER_MONTH))
+
+
+def build_intervals(subscription):
+    """Unsaved SubscriptionIntervals for ``subscription`` (payments must be prefetched or cheap to query)"""
+    payments = [payment for payment in subscription.payments.all() if payment.status == 'COMPLETED']
+    intervals = []
+    for payment in payments:
+        start = timezone.localdate(payment.billing_period_start)
+        end = timezone.localdate(payment.billing_period_end)
+        if end <= start:
+            continue
+        intervals.append(SubscriptionInterval(
+            subscription=subscription,
+            company_id=subscription.company_id,
+            plan_id=subscription.plan_id,
+            source='PAYMENT',
+            start_date=start,
+            end_date=end,
+            mrr=(payment.amount / period_months(start, end)).quantize(CENT),
+            amount=payment.amount,
+            paid_on=timezone.localdate(payment.payment_date),
+        ))
+
+    if not payments and subscription.status in PAYING_STATUSES:
+        start = timezone.localdate(subscription.start_date)
+        end = timezone.localdate(subscription.end_date)
+        if end > start:
+            intervals.append(SubscriptionInterval(
+                subscription=subscription,
+                company_id=subscription.company_id,
+                plan_id=subscription.plan_id,
+                source='SUBSCRIPTION',
+                start_date=start,
+                end_date=end,
+                mrr=Decimal(subscription.plan.monthly_price).quantize(CENT),
+            ))
+
+    # Free plans and zero payments bring in nothing: such companies are not paying customers
+    intervals = [interval for interval in intervals if interval.mrr > 0]
+    intervals.sort(key=lambda interval: (interval.start_date, interval.end_date))
+    grace = timedelta(days=RENEWAL_GRACE_DAYS)
+    covered_until = None
+    for index, interval in enumerate(intervals):
+        interval.is_new = covered_until is None or interval.start_date > covered_until + grace
+        covered_until = max(covered_until or interval.end_date, interval.end_date)
+        following = intervals[index + 1] if index + 1 < len(intervals) else None
+        interval.is_churn = following is None or following.start_date > covered_until + grace
+    return intervals
+
+
+def rebuild_intervals(subscriptions=None):
+    """
+    Rewrite the intervals of ``subscriptions`` (a queryset; all of them by
+    default), BATCH_SIZE subscriptions per transaction. Returns the number
+    of intervals written.
+    """
+    if subscriptions is None:
+        subscriptions = CompanySubscription.objects.all()
+    subscriptions = subscriptions.select_related('plan').prefetch_related('payments').order_by('pk')
+
+    written = 0
+    last_id = 0
+    while True:
+        batch = list(subscriptions.filter(pk__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            return written
+        intervals = [interval for subscription in batch for interval in build_intervals(subscription)]
+        with transaction.atomic():
+            SubscriptionInterval.objects.filter(subscription__in=batch).delete()
+            SubscriptionInterval.objects.bulk_create(intervals, batch_size=BATCH_SIZE)
+        written += len(intervals)
+        last_id = batch[-1].pk
+
+
+def _covering(day):
+    return Q(start_date__lte=day, end_date__gt=day)
+
+
+def revenue_summary(start, end):
+    """
+    MRR, ARR, ARPU, new business, churn and collected revenue for
+    ``start``..``end`` (inclusive), from one aggregate query. Money values
+    are Decimals. The churn rate is the share of companies paying on
+    ``start`` or starting within the range whose subscription stopped
+    within it.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    churned = Q(is_churn=True, end_date__gt=start, end_date__lte=end)
+    new = Q(is_new=True, start_date__gte=start, start_date__lte=end)
+    totals = SubscriptionInterval.objects.filter(
+        Q(start_date__lte=end, end_date__gte=start) | Q(paid_on__range=(start, end))
+    ).aggregate(
+        mrr_end=Coalesce(Sum('mrr', filter=_covering(end)), Value(ZERO), output_field=money),
+        mrr_start=Coalesce(Sum('mrr', filter=_covering(start)), Value(ZERO), output_field=money),
+        paying_companies=Count('company', distinct=True, filter=_covering(end)),
+        paying_companies_start=Count('company', distinct=True, filter=_covering(start)),
+        new_mrr=Coalesce(Sum('mrr', filter=new), Value(ZERO), output_field=money),
+        new_companies=Count('company', distinct=True, filter=new),
+        churned_mrr=Coalesce(Sum('mrr', filter=churned), Value(ZERO), output_field=money),
+        churned_companies=Count('company', distinct=True, filter=churned),
+        revenue=Coalesce(Sum('amount', filter=Q(paid_on__range=(start, end))), Value(ZERO), output_field=money),
+    )
+    totals['mrr'] = totals.pop('mrr_end')
+    for name in ('mrr', 'mrr_start', 'new_mrr', 'churned_mrr', 'revenue'):
+        totals[name] = totals[name].quantize(CENT)
+    totals['arr'] = totals['mrr'] * 12
+    totals['arpu'] = (totals['mrr'] / totals['paying_companies']).quantize(CENT) if totals['paying_companies'] else ZERO
+    customers = totals['paying_companies_start'] + totals['new_companies']
+    totals['churn_rate'] = totals['churned_companies'] / customers * 100 if customers else 0
+    return totals
+
+
+def mrr_on(day=None):
+    """MRR on ``day`` (today by default)"""
+    day = day or timezone.localdate()
+    return SubscriptionInterval.objects.filter(_covering(day)).aggregate(
+        total=Coalesce(Sum('mrr'), Value(ZERO), output_field=DecimalField(max_digits=12, decimal_places=2))
+    )['total'].quantize(CENT)
+
+
+def interval_events(start, end, fields=()):
+    """
+    Intervals overlapping ``start``..``end`` (one query), as dicts with
+    ``start_date``, ``end_date``, ``mrr`` and ``fields``
+    """
+    return SubscriptionInterval.objects.filter(start_date__lte=end, end_date__gt=start).values(
+        'start_date', 'end_date', 'mrr', *fields
+    )
+
+
+def mrr_series(start, end):
+    """``[(day, MRR)]`` for every day of ``start``..``end``, from one query"""
+    changes = defaultdict(Decimal)
+    for interval in interval_events(start, end):
+        changes[max(interval['start_date'], start)] += interval['mrr']
+        changes[interval['end_date']] -= interval['mrr']
+
+    series = []
+    mrr = ZERO
+    day = start
+    while day <= end:
+        mrr += changes.get(day, ZERO)
+        series.append((day, mrr))
+        day += timedelta(days=1)
+    return series
+
+
+def company_mrr(day):
+    """Expression for a company's MRR on ``day``, to annotate Company querysets with"""
+    return Coalesce(
+        Subquery(
+            SubscriptionInterval.objects.filter(_covering(day), company=OuterRef('pk'))
+            .values('company').annotate(total=Sum('mrr')).values('total')
+        ),
+        Value(ZERO),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def revenue_by_company_size(sizes, day=None, **filters):
+    """
+    Companies, and their MRR on ``day``, per employee-count range of
+    ``sizes`` (``{'min', 'max'}`` dicts), in one query
+    """
+    day = day or timezone.localdate()
+    aggregates = {}
+    for index, size in enumerate(sizes):
+        in_range = Q(employee_count__gte=size['min'], employee_count__lte=size['max'])
+        aggregates[f'companies_{index}'] = Count('pk', filter=in_range)
+        aggregates[f'mrr_{index}'] = Sum('mrr', filter=in_range)
+    totals = Company.objects.filter(**filters).annotate(
+        employee_count=Count('employees'),
+        mrr=company_mrr(day),
+    ).aggregate(**aggregates)
+    return [
+        {'companies': totals[f'companies_{index}'], 'mrr': (totals[f'mrr_{index}'] or ZERO).quantize(CENT)}
+        for index in range(len(sizes))
+    ]
+
+
+def _subscription_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rebuild_intervals(CompanySubscription.objects.filter(pk=instance.pk))
+
+
+def _payment_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Payments deleted along with their subscription or company need no rebuild
+    if origin is not None and getattr(origin, 'model', type(origin)) is not SubscriptionPayment:
+        return
+    if not raw:
+        rebuild_intervals(CompanySubscription.objects.filter(pk=instance.subscription_id))
+
+
+def connect_signals():
+    post_save.connect(_subscription_changed, sender=CompanySubscription, dispatch_uid='revenue_subscription_saved')
+    post_save.connect(_payment_changed, sender=SubscriptionPayment, dispatch_uid='revenue_payment_saved')
+    post_delete.connect(_payment_changed, sender=SubscriptionPayment, dispatch_uid='revenue_payment_deleted')
@@ -0,0 +1,78 @@
+"""
+Session storage.
+
+``SESSION_ENGINE = 'core.sessions'`` is Django's cached_db store with write
+coalescing. Sessions are read from the cache, so an authenticated request
+needs no session query. A save that changes nothing but the expiry (every
+request with SESSION_SAVE_EVERY_REQUEST) refreshes only the cache copy. The
+database row is rewritten when the data changes, or once every
+SESSION_DB_WRITE_INTERVAL seconds to move its expiry forward.
+
+``clear_expired_sessions`` deletes expired rows for whichever engine is
+configured; the ``clear_expired_sessions`` job runs it periodically.
+"""
+import hashlib
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.utils import timezone
+
+
+SESSION_DB_WRITE_INTERVAL = getattr(settings, 'SESSION_DB_WRITE_INTERVAL', 300)
+SESSION_CLEANUP_INTERVAL = getattr(settings, 'SESSION_CLEANUP_INTERVAL', timedelta(hours=24))
+DELETE_BATCH_SIZE = 1000
+
+
+class SessionStore(cached_db.SessionStore):
+    @property
+    def written_key(self):
+        # (digest of the data, time) of the last database write
+        return f'{self.cache_key}:written'
+
+    def _digest(self):
+        return hashlib.sha1(self.serializer().dumps(self._get_session())).hexdigest()
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key is not None:
+            written = self._cache.get(self.written_key)
+            if (written and written[0] == self._digest()
+                    and time.time() - written[1] < SESSION_DB_WRITE_INTERVAL):
+                # Row already holds this data and a recent expiry
+                self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+                return
+        super().save(must_create)
+        self._cache.set(self.written_key, (self._digest(), time.time()), self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            session_key = self.session_key
+        if session_key is not None:
+            self._cache.delete(f'{self.cache_key_prefix}{session_key}:written')
+        super().delete(session_key)
+
+
+def clear_expired_sessions():
+    """
+    Delete expired sessions of the configured SESSION_ENGINE in batches and
+    return how many rows were removed. Engines without server-side rows
+    (signed cookies, cache) have nothing to delete.
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    if not issubclass(engine.SessionStore, DBStore):
+        engine.SessionStore.clear_expired()
+        return 0
+
+    model = engine.SessionStore.get_model_class()
+    removed = 0
+    while True:
+        keys = list(
+            model.objects.filter(expire_date__lt=timezone.now())
+            .values_list('session_key', flat=True)[:DELETE_BATCH_SIZE]
+        )
+        if not keys:
+            return removed
+        removed += model.objects.filter(session_key__in=keys).delete()[0]
@@ -0,0 +1,64 @@
+"""
+Compiled NotificationTemplate sources.
+
+Parsing a Django template costs far more than rendering it, so
+``NotificationTemplate.render_template`` and ``render_many`` take the four
+compiled templates (title, message, email subject, email body) from an LRU
+cache keyed by ``(template_id, updated_at)``. Editing a template changes
+``updated_at``, so a stale entry is never used; ``save()`` and ``delete()``
+also evict it so it does not take up a slot. Unsaved edits to a stored
+template's sources are not seen until it is saved. The cache is per process.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.template import Template, TemplateSyntaxError
+
+
+NOTIFICATION_TEMPLATE_CACHE_SIZE = getattr(settings, 'NOTIFICATION_TEMPLATE_CACHE_SIZE', 256)
+
+
+def compile_sources(sources):
+    """Template for each source (None for an empty one), or None if a source does not parse"""
+    try:
+        return tuple(Template(source) if source else None for source in sources)
+    except TemplateSyntaxError:
+        return None
+
+
+class CompiledTemplateCache:
+    """Thread-safe LRU of compiled template tuples"""
+
+    def __init__(self, maxsize=NOTIFICATION_TEMPLATE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, template_id, updated_at, sources):
+        key = (template_id, updated_at)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        # Compile outside the lock; a concurrent miss just compiles twice
+        compiled = compile_sources(sources)
+        with self.lock:
+            self.entries[key] = compiled
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return compiled
+
+    def evict(self, template_id):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == template_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+compiled_templates = CompiledTemplateCache()
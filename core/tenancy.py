@@ -0,0 +1,148 @@
+"""
+Denormalized ``company`` on company-scoped child tables.
+
+Tasks, attendance, leave requests, timesheets, performance goals and
+metrics, and onboarding task assignments reach their company through a
+parent. Each also stores the company in its own ``company`` column, so
+tenant queries filter on one indexed column without joining to the parent.
+Each of these tables has composite indexes led by ``company``.
+
+COMPANY_SOURCES maps each model to the parent that owns the company, and
+to the path from that parent to the company. The company is kept in step:
+
+- on save, by the pre_save handler from ``connect_signals()``. The company
+  is derived again from the row's parent every time, so moving a task to
+  another project also moves it to that project's company. A row whose
+  parent is already loaded copies the company from it; otherwise it is
+  looked up with one query;
+- when a parent changes company (an employee or project moved to another
+  company, an onboarding assignment moved to another workflow, ...). The
+  post_save handlers for COMPANY_CARRIERS update the company of the
+  parent's rows with one UPDATE per child table;
+- by ``backfill()``, for rows saved before the column existed or written
+  without save(). It fills rows in primary-key batches, one UPDATE with a
+  subquery per batch. Migrations 0028 and 0030 fill existing rows the same
+  way, and the ``backfill_company_ids`` command runs it with ``refresh``
+  to recompute every row.
+
+The column is NOT NULL. Code that bulk_creates these rows must set
+``company`` itself, and code that moves parents with ``update()`` must
+run ``backfill(model, refresh=True)`` afterwards.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_init, post_save, pre_save
+
+from .models import (
+    Attendance, Employee, LeaveRequest, OnboardingAssignment, OnboardingTaskAssignment, OnboardingWorkflow,
+    PerformanceGoal, PerformanceMetric, Project, Task, Timesheet,
+)
+
+
+TENANCY_BACKFILL_BATCH_SIZE = getattr(settings, 'TENANCY_BACKFILL_BATCH_SIZE', 1000)
+
+# model -> (parent field, parent model, path from the parent to its company id)
+COMPANY_SOURCES = {
+    Task: ('project', Project, 'company_id'),
+    Attendance: ('employee', Employee, 'company_id'),
+    LeaveRequest: ('employee', Employee, 'company_id'),
+    Timesheet: ('employee', Employee, 'company_id'),
+    PerformanceGoal: ('employee', Employee, 'company_id'),
+    PerformanceMetric: ('employee', Employee, 'company_id'),
+    OnboardingTaskAssignment: ('onboarding_assignment', OnboardingAssignment, 'workflow__company_id'),
+}
+
+# Models whose ``field`` decides the company of COMPANY_SOURCES rows:
+# model -> (field, [(child model, path from the child to the model)])
+COMPANY_CARRIERS = {
+    Project: ('company', [(Task, 'project')]),
+    Employee: ('company', [
+        (Attendance, 'employee'),
+        (LeaveRequest, 'employee'),
+        (Timesheet, 'employee'),
+        (PerformanceGoal, 'employee'),
+        (PerformanceMetric, 'employee'),
+    ]),
+    OnboardingAssignment: ('workflow', [(OnboardingTaskAssignment, 'onboarding_assignment')]),
+    OnboardingWorkflow: ('company', [(OnboardingTaskAssignment, 'onboarding_assignment__workflow')]),
+}
+
+
+def parent_company(model):
+    """Subquery for the company id of a ``model`` row's parent, to update or annotate with"""
+    field, parent, path = COMPANY_SOURCES[model]
+    return Subquery(parent.objects.filter(pk=OuterRef(f'{field}_id')).values(path)[:1])
+
+
+def _fill_company(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    field, parent_model, path = COMPANY_SOURCES[sender]
+    if update_fields is not None and field not in update_fields and 'company' not in update_fields:
+        return
+    parent_id = getattr(instance, f'{field}_id')
+    parent = sender._meta.get_field(field).get_cached_value(instance, None)
+    if parent is not None and parent.pk == parent_id and path == 'company_id':
+        company_id = parent.company_id
+    elif parent_id is not None:
+        company_id = parent_model.objects.filter(pk=parent_id).values_list(path, flat=True).first()
+    else:
+        return
+    if company_id != instance.company_id and update_fields is not None and 'company' not in update_fields:
+        # save() only writes update_fields, so write the new company alongside
+        sender.objects.filter(pk=instance.pk).update(company_id=company_id)
+    instance.company_id = company_id
+
+
+def _carried_value(sender, instance):
+    field, _ = COMPANY_CARRIERS[sender]
+    # From __dict__, so a deferred field is not loaded just to compare it
+    return instance.__dict__.get(sender._meta.get_field(field).attname)
+
+
+def _remember_carrier(sender, instance, **kwargs):
+    instance._tenancy_carried = _carried_value(sender, instance)
+
+
+def _move_children(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    field, children = COMPANY_CARRIERS[sender]
+    if update_fields is not None and field not in update_fields:
+        return
+    carried = _carried_value(sender, instance)
+    changed = carried != getattr(instance, '_tenancy_carried', carried)
+    instance._tenancy_carried = carried
+    if raw or created or not changed:
+        return
+    with transaction.atomic():
+        for model, path in children:
+            model.objects.filter(**{path: instance.pk}).update(company=parent_company(model))
+
+
+def backfill(model, refresh=False, batch_size=None, progress=None):
+    """
+    Set ``company`` on the ``model`` rows missing it (every row with
+    ``refresh``), ``batch_size`` rows per UPDATE and transaction. Returns
+    the number of rows updated.
+    """
+    batch_size = batch_size or TENANCY_BACKFILL_BATCH_SIZE
+    rows = model.objects.all() if refresh else model.objects.filter(company__isnull=True)
+    updated = 0
+    last_id = 0
+    while True:
+        ids = list(rows.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return updated
+        with transaction.atomic():
+            updated += model.objects.filter(pk__in=ids).update(company=parent_company(model))
+        last_id = ids[-1]
+        if progress:
+            progress(model, updated)
+
+
+def connect_signals():
+    for model in COMPANY_SOURCES:
+        pre_save.connect(_fill_company, sender=model, dispatch_uid=f'tenancy_company_{model.__name__}')
+    for model in COMPANY_CARRIERS:
+        post_init.connect(_remember_carrier, sender=model, dispatch_uid=f'tenancy_carrier_{model.__name__}')
+        post_save.connect(_move_children, sender=model, dispatch_uid=f'tenancy_move_{model.__name__}')
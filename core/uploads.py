@@ -0,0 +1,254 @@
+"""
+Chunked, resumable uploads for chat attachments and documents.
+
+A client creates an upload with its total length, then sends the bytes in
+as many PATCH requests as it likes, each starting at the upload's current
+offset (tus-style ``Upload-Offset``). Each chunk is streamed from the request
+into a partial file under ``MEDIA_ROOT/uploads/partial/`` in CHUNK_SIZE
+pieces, and the SHA-256 is updated as the bytes arrive. If a connection
+drops, whatever was written is kept and the client resumes from the new
+offset. A request first claims the chunk with a conditional UPDATE on the
+expected offset, which takes a short lease (``writing_until``) on the
+upload. The body is then streamed without a transaction open, and the new
+offset is committed with the lease released. A second request at the same
+offset finds the lease taken, or the offset moved, and is refused.
+
+When the last byte arrives the partial file is moved into the blob store
+(see ``core.blobs``), or dropped if the same content is already stored. The
+upload holds one blob reference, which passes to the ChatMessage or Document
+the file is attached to; attaching is just setting the file name.
+
+``sendfile_response`` hands protected downloads to the web server
+(``X-Sendfile`` or nginx ``X-Accel-Redirect``) once Django has checked
+access, according to SENDFILE_BACKEND.
+"""
+import hashlib
+import mimetypes
+import os
+from datetime import timedelta
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from .blobs import adopt_file, release
+from .models import ChunkedUpload
+
+
+CHUNKED_UPLOAD_MAX_SIZE = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+CHUNKED_UPLOAD_TTL = getattr(settings, 'CHUNKED_UPLOAD_TTL', timedelta(hours=24))
+SENDFILE_BACKEND = getattr(settings, 'SENDFILE_BACKEND', None)
+SENDFILE_URL_PREFIX = getattr(settings, 'SENDFILE_URL_PREFIX', '/protected-media/')
+
+PARTIAL_DIR = 'uploads/partial'
+CHUNK_SIZE = 64 * 1024
+
+# A chunk write renews its lease while bytes keep arriving; the lease of a
+# request that died expires after this long
+CHUNK_WRITE_LEASE = timedelta(minutes=5)
+
+PURPOSES = ('CHAT', 'DOCUMENT')
+
+# upload_id -> (offset, sha256 of the first ``offset`` bytes), per process
+_hashers = {}
+
+
+def partial_name(upload):
+    return f'{PARTIAL_DIR}/{upload.upload_id}.part'
+
+
+def partial_path(upload):
+    return default_storage.path(partial_name(upload))
+
+
+def create_upload(user, purpose, filename, size, content_type=''):
+    """Start an upload; raises ValueError for a bad purpose, name or size"""
+    if purpose not in PURPOSES:
+        raise ValueError('Invalid upload purpose')
+    filename = os.path.basename(filename or '').strip()
+    if not filename:
+        raise ValueError('Filename is required')
+    if size < 0 or size > CHUNKED_UPLOAD_MAX_SIZE:
+        raise ValueError(f'Upload size must be between 0 and {CHUNKED_UPLOAD_MAX_SIZE} bytes')
+
+    upload = ChunkedUpload.objects.create(
+        user=user,
+        purpose=purpose,
+        filename=filename,
+        content_type=content_type or mimetypes.guess_type(filename)[0] or '',
+        size=size,
+    )
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    if size == 0:
+        complete_upload(upload, hashlib.sha256())
+    return upload
+
+
+def get_upload(user, upload_id, status=None):
+    """The user's upload with this id (optionally in ``status``), or None"""
+    uploads = ChunkedUpload.objects.filter(upload_id=upload_id, user=user)
+    if status:
+        uploads = uploads.filter(status=status)
+    try:
+        return uploads.first()
+    except ValidationError:
+        # Not a UUID
+        return None
+
+
+def claim_chunk(upload, offset):
+    """
+    Take the write lease on ``upload`` for a chunk starting at ``offset``.
+    Returns False if the upload is complete, is at another offset, or has a
+    chunk being written by another request.
+    """
+    now = timezone.now()
+    lease = now + CHUNK_WRITE_LEASE
+    claimed = ChunkedUpload.objects.filter(
+        Q(writing_until__isnull=True) | Q(writing_until__lt=now),
+        pk=upload.pk, status='UPLOADING', offset=offset,
+    ).update(writing_until=lease, updated_at=now)
+    if claimed:
+        upload.offset = offset
+        upload.writing_until = lease
+    return bool(claimed)
+
+
+def _renew_lease(upload):
+    """Extend the lease of the chunk being written; returns False if another request took it over"""
+    now = timezone.now()
+    lease = now + CHUNK_WRITE_LEASE
+    if not ChunkedUpload.objects.filter(pk=upload.pk, writing_until=upload.writing_until).update(
+        writing_until=lease, updated_at=now
+    ):
+        return False
+    upload.writing_until = lease
+    return True
+
+
+def _hasher_for(upload, path):
+    """SHA-256 state for the bytes received so far, rebuilt from disk on a worker that has not seen them"""
+    cached = _hashers.get(upload.upload_id)
+    if cached and cached[0] == upload.offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = upload.offset
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher
+
+
+def write_chunk(upload, stream, length):
+    """
+    Append ``length`` bytes read from ``stream`` at the upload's current
+    offset and return the new offset. The caller must hold the chunk's
+    lease (``claim_chunk``). Bytes received before a disconnect are kept.
+    Completes the upload when the last byte arrives.
+    """
+    path = partial_path(upload)
+    hasher = _hasher_for(upload, path)
+    start = upload.offset
+    received = 0
+    try:
+        with open(path, 'r+b') as f:
+            # Drop anything past the recorded offset (an earlier write that failed half-way)
+            f.seek(start)
+            f.truncate()
+            while received < length:
+                if timezone.now() > upload.writing_until - CHUNK_WRITE_LEASE / 2 and not _renew_lease(upload):
+                    raise RuntimeError('Chunk lease lost')
+                chunk = stream.read(min(CHUNK_SIZE, length - received))
+                if not chunk:
+                    break
+                f.write(chunk)
+                hasher.update(chunk)
+                received += len(chunk)
+    finally:
+        complete = start + received >= upload.size
+        # A finished upload keeps its lease until complete_upload marks it COMPLETE
+        saved = ChunkedUpload.objects.filter(pk=upload.pk, offset=start, writing_until=upload.writing_until).update(
+            offset=start + received,
+            writing_until=upload.writing_until if complete else None,
+            updated_at=timezone.now(),
+        )
+        if saved:
+            upload.offset = start + received
+            _hashers[upload.upload_id] = (upload.offset, hasher)
+
+    if saved and upload.is_complete:
+        complete_upload(upload, hasher)
+    return upload.offset
+
+
+def complete_upload(upload, hasher):
+    """Move the finished file into the blob store and record its hash"""
+    upload.sha256 = hasher.hexdigest()
+    blob = adopt_file(partial_name(upload), upload.sha256, upload.size, filename=upload.filename)
+
+    upload.file.name = blob.name
+    upload.status = 'COMPLETE'
+    upload.writing_until = None
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['file', 'sha256', 'status', 'writing_until', 'completed_at', 'updated_at'])
+    _hashers.pop(upload.upload_id, None)
+
+
+def mark_attached(upload):
+    """Record that a ChatMessage or Document now owns the uploaded file (and its blob reference)"""
+    upload.status = 'ATTACHED'
+    upload.save(update_fields=['status', 'updated_at'])
+
+
+def evict_stale_uploads():
+    """
+    Delete uploads not touched for CHUNKED_UPLOAD_TTL, releasing the files
+    of those never attached. Returns the number removed.
+    """
+    cutoff = timezone.now() - CHUNKED_UPLOAD_TTL
+    stale = ChunkedUpload.objects.filter(updated_at__lt=cutoff)
+    removed = 0
+    for upload in stale.iterator():
+        if upload.status == 'UPLOADING':
+            try:
+                os.remove(partial_path(upload))
+            except FileNotFoundError:
+                pass
+        elif upload.status == 'COMPLETE':
+            release(upload.file.name)
+        _hashers.pop(upload.upload_id, None)
+        removed += 1
+    stale.delete()
+    return removed
+
+
+def sendfile_response(name, filename, content_type=None, as_attachment=True):
+    """
+    Response for a file stored under MEDIA_ROOT. With SENDFILE_BACKEND set
+    to 'xsendfile' or 'nginx' the web server sends the bytes; otherwise
+    (development) Django streams the file.
+    """
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if SENDFILE_BACKEND == 'xsendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = default_storage.path(name)
+    elif SENDFILE_BACKEND == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(f"{SENDFILE_URL_PREFIX.rstrip('/')}/{name}")
+    else:
+        return FileResponse(default_storage.open(name, 'rb'), as_attachment=as_attachment,
+                            filename=filename, content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
@@ -7,7 +7,9 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
 from django.db import transaction
 from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
 from django.db.models import Count, Avg, Q, Sum
+from django.urls import reverse
 from django.utils import timezone
 from datetime import datetime, timedelta
 import csv
@@ -28,7 +30,13 @@ from .models import (
 )
 from .forms import CompanyRegistrationForm, CompanyAdminRegistrationForm, EmployeeCSVImportForm, EmployeeVerificationForm, EmployeeRegistrationForm
 from .logging_utils import SystemLogger, log_auth, log_user_action, log_company_action, log_backup_action, log_security_event, log_system_event, log_error
-from .decorators import audit_log
+from .decorators import audit_log, role_required
+from .jobs import enqueue, stash_upload
+from .notification_analytics import notification_stats
+from .presence import presence
+from .blobs import store_upload
+from .uploads import get_upload, mark_attached
+from .ws_frames import frame_event
 
 def home(request):
     """Home page view"""
@@ -149,12 +157,9 @@ def dashboard(request):
         return redirect('core:home')
 
 @login_required
+@role_required('system_owner')
 def owner_dashboard(request):
     """System owner dashboard"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     from django.contrib.auth.models import User
     from django.db.models import Count, Q
     from datetime import datetime, timedelta
@@ -249,26 +254,20 @@ def owner_dashboard(request):
     if recent_users > 0:
         users_growth = recent_users  # Show count of new users
     
-    # Revenue calculation (based on actual subscription data)
-    try:
-        # Calculate real revenue from active subscriptions
-        active_subscriptions = CompanySubscription.objects.filter(status='ACTIVE')
-        monthly_revenue = sum(subscription.plan.monthly_price for subscription in active_subscriptions)
-        total_revenue = monthly_revenue * 12  # Annual projection
-        
-        # Subscription statistics
-        total_subscriptions = CompanySubscription.objects.count()
-        trial_subscriptions = CompanySubscription.objects.filter(status='TRIAL').count()
-        expired_subscriptions = CompanySubscription.objects.filter(status='EXPIRED').count()
-        
-    except Exception as e:
-        # Fallback to simulated revenue if no subscriptions exist
-        base_monthly_fee = 99  # Base monthly fee per company
-        monthly_revenue = total_companies * base_monthly_fee
-        total_revenue = monthly_revenue * 12  # Annual projection
-        total_subscriptions = 0
-        trial_subscriptions = 0
-        expired_subscriptions = 0
+    # Revenue from paid subscription intervals
+    from .revenue import mrr_on
+    monthly_revenue = mrr_on()
+    total_revenue = monthly_revenue * 12  # Annual run rate
+    
+    # Subscription statistics
+    subscription_counts = CompanySubscription.objects.aggregate(
+        total=Count('id'),
+        trial=Count('id', filter=Q(status='TRIAL')),
+        expired=Count('id', filter=Q(status='EXPIRED')),
+    )
+    total_subscriptions = subscription_counts['total']
+    trial_subscriptions = subscription_counts['trial']
+    expired_subscriptions = subscription_counts['expired']
     
     # Get owner profile information
     owner_profile = request.user.system_owner_profile
@@ -319,12 +318,9 @@ def owner_dashboard(request):
     return render(request, 'core/owner_dashboard.html', context)
 
 @login_required
+@role_required('system_owner')
 def owner_profile_settings(request):
     """Owner profile settings page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     owner_profile = request.user.system_owner_profile
     
     if request.method == 'POST':
@@ -349,12 +345,9 @@ def owner_profile_settings(request):
 
 @login_required
 @audit_log('COMPANY_MANAGEMENT', 'COMPANY', 'Company registration', 'HIGH')
+@role_required('system_owner')
 def register_company(request):
     """Register a new company (owner only)"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     if request.method == 'POST':
         form = CompanyRegistrationForm(request.POST)
         if form.is_valid():
@@ -430,13 +423,10 @@ def company_admin_registration(request):
     return render(request, 'core/company_admin_registration.html', context)
 
 @login_required
+@role_required('company_admin')
 def license_activation(request):
     """License activation page for company admins"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     if request.method == 'POST':
         license_key = request.POST.get('license_key', '').strip()
@@ -465,12 +455,9 @@ def license_activation(request):
     return render(request, 'core/license_activation.html', context)
 
 @login_required
+@role_required('system_owner')
 def company_details(request, company_id):
     """View detailed information about a company (owner only)"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     try:
         company = Company.objects.get(id=company_id)
         employees = Employee.objects.filter(company=company)
@@ -489,12 +476,9 @@ def company_details(request, company_id):
         return redirect('core:owner_dashboard')
 
 @login_required
+@role_required('system_owner')
 def edit_company(request, company_id):
     """Edit company information (owner only)"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     try:
         company = Company.objects.get(id=company_id)
         
@@ -535,12 +519,9 @@ def edit_company(request, company_id):
 
 @login_required
 @audit_log('COMPANY_MANAGEMENT', 'COMPANY', 'Company status toggle', 'HIGH')
+@role_required('system_owner')
 def toggle_company_status(request, company_id):
     """Toggle company active/inactive status (owner only)"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     try:
         company = Company.objects.get(id=company_id)
         company.is_active = not company.is_active
@@ -553,52 +534,43 @@ def toggle_company_status(request, company_id):
     
     return redirect('core:owner_dashboard')
 
-@login_required
-@audit_log('COMPANY_MANAGEMENT', 'COMPANY', 'Company deletion', 'CRITICAL')
-def delete_company(request, company_id):
-    """Delete a company and all associated data (owner only)"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
+def queue_company_deletion(request, companies):
+    """
+    Queue a background job deleting ``companies`` and everything cascading
+    from them in batches (see core.bulk_operations.delete_company)
+    """
+    from core.logging_utils import SystemLogger
     
-    try:
-        company = Company.objects.get(id=company_id)
-        company_name = company.name
-        
-        # Count all related data before deletion
-        employee_count = company.employees.count()
-        admin_count = company.admins.count()
+    for company in companies:
         admin_user = company.admin_user
-        
-        # Log detailed deletion information
-        from core.logging_utils import SystemLogger
         SystemLogger.log(
             'WARNING',
             'COMPANY',
-            f'Company "{company_name}" deletion initiated - Employees: {employee_count}, Admins: {admin_count}, Admin User: {admin_user.username if admin_user else "None"}',
+            f'Company "{company.name}" deletion queued - Employees: {company.employees.count()}, Admins: {company.admins.count()}, Admin User: {admin_user.username if admin_user else "None"}',
             user=request.user,
             request=request
         )
-        
-        # Delete company (this will cascade delete all related objects)
-        # Django will automatically delete:
-        # - All employees (Employee model)
-        # - All employee user accounts (User model via employee.user_account)
-        # - Company admin profile (CompanyAdmin model)
-        # - Company admin user account (User model via company.admin_user)
-        company.delete()
-        
-        # Log successful deletion
-        SystemLogger.log(
-            'WARNING',
-            'COMPANY',
-            f'Company "{company_name}" and all associated data successfully deleted',
-            user=request.user,
-            request=request
+    
+    return enqueue('bulk_company_operations', {
+        'operation': 'delete',
+        'company_ids': [company.id for company in companies],
+        'user_id': request.user.id,
+        'ip_address': request.META.get('REMOTE_ADDR'),
+    }, user=request.user)
+
+@login_required
+@audit_log('COMPANY_MANAGEMENT', 'COMPANY', 'Company deletion', 'CRITICAL')
+@role_required('system_owner')
+def delete_company(request, company_id):
+    """Delete a company and all associated data in the background (owner only)"""
+    try:
+        company = Company.objects.get(id=company_id)
+        job = queue_company_deletion(request, [company])
+        messages.success(
+            request,
+            f'Company "{company.name}" and all associated data are being permanently deleted (job {job.id}).'
         )
         
-        messages.success(request, f'Company "{company_name}" and all associated data have been permanently deleted.')
-        
     except Company.DoesNotExist:
         messages.error(request, 'Company not found.')
     except Exception as e:
@@ -607,12 +579,9 @@ def delete_company(request, company_id):
     return redirect('core:all_companies')
 
 @login_required
+@role_required('system_owner')
 def bulk_delete_companies(request):
-    """Bulk delete companies (owner only)"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
+    """Bulk delete companies in the background (owner only)"""
     if request.method == 'POST':
         company_ids = request.POST.getlist('company_ids')
         
@@ -621,51 +590,11 @@ def bulk_delete_companies(request):
             return redirect('core:all_companies')
         
         try:
-            deleted_count = 0
-            deleted_names = []
-            
-            # Log the bulk deletion
-            from core.logging_utils import SystemLogger
-            
-            for company_id in company_ids:
-                try:
-                    company = Company.objects.get(id=company_id)
-                    company_name = company.name
-                    
-                    # Count all related data before deletion
-                    employee_count = company.employees.count()
-                    admin_count = company.admins.count()
-                    admin_user = company.admin_user
-                    
-                    # Log detailed deletion information
-                    SystemLogger.log(
-                        'WARNING',
-                        'COMPANY',
-                        f'Company "{company_name}" bulk deletion - Employees: {employee_count}, Admins: {admin_count}, Admin User: {admin_user.username if admin_user else "None"}',
-                        user=request.user,
-                        request=request
-                    )
-                    
-                    # Delete company (cascade deletes all related data)
-                    company.delete()
-                    
-                    # Log successful deletion
-                    SystemLogger.log(
-                        'WARNING',
-                        'COMPANY',
-                        f'Company "{company_name}" and all associated data successfully deleted (bulk operation)',
-                        user=request.user,
-                        request=request
-                    )
-                    
-                    deleted_count += 1
-                    deleted_names.append(company_name)
-                    
-                except Company.DoesNotExist:
-                    continue
-            
-            if deleted_count > 0:
-                messages.success(request, f'Successfully deleted {deleted_count} companies: {", ".join(deleted_names)}')
+            companies = list(Company.objects.filter(id__in=company_ids).select_related('admin_user'))
+            if companies:
+                job = queue_company_deletion(request, companies)
+                names = ", ".join(company.name for company in companies)
+                messages.success(request, f'Deleting {len(companies)} companies in the background (job {job.id}): {names}')
             else:
                 messages.error(request, 'No companies were deleted.')
                 
@@ -675,12 +604,9 @@ def bulk_delete_companies(request):
     return redirect('core:all_companies')
 
 @login_required
+@role_required('system_owner')
 def export_companies(request):
     """Export companies data to CSV (owner only)"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     import csv
     from django.http import HttpResponse
     
@@ -715,13 +641,10 @@ def export_companies(request):
     return response
 
 @login_required
+@role_required('company_admin')
 def company_dashboard(request):
     """Enhanced Company admin dashboard with analytics and features"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     employees = Employee.objects.filter(company=company)
     
     # Debug: Print company data
@@ -776,7 +699,7 @@ def company_dashboard(request):
     completed_projects = projects.filter(status='COMPLETED').count()
     
     # Task statistics
-    tasks = Task.objects.filter(project__company=company)
+    tasks = Task.objects.filter(company=company)
     total_tasks = tasks.count()
     completed_tasks = tasks.filter(status='DONE').count()
     overdue_tasks = tasks.filter(
@@ -786,7 +709,7 @@ def company_dashboard(request):
     
     # Performance metrics
     performance_metrics = PerformanceMetric.objects.filter(
-        employee__company=company
+        company=company
     ).order_by('-created_at')[:5]
     
     # Recent notifications
@@ -822,7 +745,7 @@ def company_dashboard(request):
     
     # Leave statistics for company dashboard
     from django.db.models import Sum
-    all_leave_requests = LeaveRequest.objects.filter(employee__company=company)
+    all_leave_requests = LeaveRequest.objects.filter(company=company)
     
     # Leave request statistics
     total_leave_requests = all_leave_requests.count()
@@ -922,13 +845,10 @@ def company_dashboard(request):
 
 @login_required
 @audit_log('BULK_ACTION', 'EMPLOYEE', 'Employee CSV import', 'HIGH')
+@role_required('company_admin')
 def import_employees(request):
     """Import employees from CSV (company admin only)"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     if request.method == 'POST':
         form = EmployeeCSVImportForm(request.POST, request.FILES)
@@ -936,34 +856,15 @@ def import_employees(request):
             csv_file = request.FILES['csv_file']
             
             try:
-                # Read CSV file
-                decoded_file = csv_file.read().decode('utf-8')
-                io_string = io.StringIO(decoded_file)
-                reader = csv.DictReader(io_string)
-                
-                imported_count = 0
-                error_count = 0
+                # Stash the upload privately and let the job worker create the rows.
+                # No retries: a second run would create the imported rows again.
+                file_path = stash_upload(csv_file, 'employee_import')
+                job = enqueue('import_employees', {
+                    'company_id': company.id,
+                    'file_path': file_path,
+                }, user=request.user, company=company, max_attempts=1)
                 
-                for row in reader:
-                    try:
-                        Employee.objects.create(
-                            company=company,
-                            employee_id=row['employee_id'],
-                            first_name=row['first_name'],
-                            last_name=row['last_name'],
-                            email=row['email'],
-                            department=row.get('department', ''),
-                            position=row.get('position', ''),
-                            is_verified=True
-                        )
-                        imported_count += 1
-                    except Exception as e:
-                        error_count += 1
-                        print(f"Error importing row {row}: {e}")
-                
-                messages.success(request, f'Successfully imported {imported_count} employees.')
-                if error_count > 0:
-                    messages.warning(request, f'{error_count} rows had errors and were skipped.')
+                messages.success(request, f'Employee import started (job #{job.id}). New employees will appear as rows are processed.')
                     
             except Exception as e:
                 messages.error(request, f'Error processing CSV file: {str(e)}')
@@ -987,13 +888,10 @@ def import_employees(request):
 
 # Team Management Views
 @login_required
+@role_required('company_admin')
 def employee_directory(request):
     """Employee directory page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     employees = Employee.objects.filter(company=company).order_by('first_name', 'last_name')
     
     # Search functionality
@@ -1202,13 +1100,10 @@ def employee_profile(request, employee_id):
         return redirect('core:employee_directory')
 
 @login_required
+@role_required('company_admin')
 def department_management(request):
     """Department management page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get department statistics from Employee model
     employee_departments = Employee.objects.filter(company=company).values('department').annotate(
@@ -1271,17 +1166,14 @@ def department_management(request):
     return render(request, 'core/department_management.html', context)
 
 @login_required
+@role_required('company_admin')
 def team_performance(request):
     """Team performance analytics page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Performance metrics by department
     department_performance = PerformanceMetric.objects.filter(
-        employee__company=company
+        company=company
     ).values('employee__department').annotate(
         avg_value=Avg('value'),
         total_metrics=Count('id'),
@@ -1292,7 +1184,7 @@ def team_performance(request):
     
     # Recent performance reviews
     recent_reviews = PerformanceMetric.objects.filter(
-        employee__company=company
+        company=company
     ).order_by('-created_at')[:10]
     
     context = {
@@ -1304,13 +1196,10 @@ def team_performance(request):
     return render(request, 'core/team_performance.html', context)
 
 @login_required
+@role_required('company_admin')
 def company_employee_onboarding(request):
     """Employee onboarding management page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Recent hires (last 30 days)
     thirty_days_ago = datetime.now() - timedelta(days=30)
@@ -1335,13 +1224,10 @@ def company_employee_onboarding(request):
 
 # Project Management Views
 @login_required
+@role_required('company_admin')
 def project_list(request):
     """Project list page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     projects = Project.objects.filter(company=company).order_by('-created_at')
     
     # Search functionality
@@ -1383,14 +1269,11 @@ def project_list(request):
     return render(request, 'core/project_list.html', context)
 
 @login_required
+@role_required('company_admin')
 def task_management(request):
     """Task management page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
-    tasks = Task.objects.filter(project__company=company).order_by('-created_at')
+    company = request.company
+    tasks = Task.objects.filter(company=company).order_by('-created_at')
     
     # Search functionality
     search_query = request.GET.get('search', '')
@@ -1442,13 +1325,10 @@ def task_management(request):
     return render(request, 'core/task_management.html', context)
 
 @login_required
+@role_required('company_admin')
 def project_analytics(request):
     """Project analytics page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Project status distribution
     project_status = Project.objects.filter(company=company).values('status').annotate(
@@ -1461,7 +1341,7 @@ def project_analytics(request):
     ).order_by('-count')
     
     # Task completion by project
-    task_completion = Task.objects.filter(project__company=company).values('project__name').annotate(
+    task_completion = Task.objects.filter(company=company).values('project__name').annotate(
         total_tasks=Count('id'),
         completed_tasks=Count('id', filter=Q(status='DONE')),
         completion_rate=Count('id', filter=Q(status='DONE')) * 100.0 / Count('id')
@@ -1493,17 +1373,14 @@ def project_analytics(request):
     return render(request, 'core/project_analytics.html', context)
 
 @login_required
+@role_required('company_admin')
 def resource_planning(request):
     """Resource planning page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Employee workload analysis
     employee_workload = Task.objects.filter(
-        project__company=company,
+        company=company,
         assigned_to__isnull=False
     ).values('assigned_to__first_name', 'assigned_to__last_name', 'assigned_to__department').annotate(
         total_tasks=Count('id'),
@@ -1537,13 +1414,10 @@ def resource_planning(request):
     return render(request, 'core/resource_planning.html', context)
 
 @login_required
+@role_required('company_admin')
 def project_templates(request):
     """Project templates page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get workflow templates (using as project templates)
     templates = WorkflowTemplate.objects.filter(company=company).order_by('-created_at')
@@ -1567,13 +1441,10 @@ def project_templates(request):
 
 # Communication & Collaboration Views
 @login_required
+@role_required('company_admin')
 def internal_messaging(request):
     """Internal messaging page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get recent messages (using notifications as messages)
     recent_messages = Notification.objects.filter(
@@ -1607,13 +1478,10 @@ def internal_messaging(request):
     return render(request, 'core/internal_messaging.html', context)
 
 @login_required
+@role_required('company_admin')
 def team_chat(request):
     """Team chat page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get team chat messages (using announcements as chat messages)
     chat_messages = Announcement.objects.filter(
@@ -1636,13 +1504,10 @@ def team_chat(request):
     return render(request, 'core/team_chat.html', context)
 
 @login_required
+@role_required('company_admin')
 def meeting_scheduler(request):
     """Meeting scheduler page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get scheduled meetings (using workflow instances as meetings)
     scheduled_meetings = WorkflowInstance.objects.filter(
@@ -1679,13 +1544,10 @@ def meeting_scheduler(request):
     return render(request, 'core/meeting_scheduler.html', context)
 
 @login_required
+@role_required('company_admin')
 def announcements(request):
     """Announcements management page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get all announcements
     announcements_list = Announcement.objects.filter(company=company).order_by('-created_at')
@@ -1728,13 +1590,10 @@ def announcements(request):
     return render(request, 'core/announcements.html', context)
 
 @login_required
+@role_required('company_admin')
 def video_meetings(request):
     """Video meetings page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get video meeting rooms (using projects as meeting rooms)
     meeting_rooms = Project.objects.filter(
@@ -1764,13 +1623,10 @@ def video_meetings(request):
 
 # Document Management Views
 @login_required
+@role_required('company_admin')
 def file_sharing(request):
     """File sharing page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get shared files (using announcements as file records)
     shared_files = Announcement.objects.filter(
@@ -1814,13 +1670,10 @@ def file_sharing(request):
     return render(request, 'core/file_sharing.html', context)
 
 @login_required
+@role_required('company_admin')
 def version_control(request):
     """Version control page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get document versions (using workflow instances as version records)
     document_versions = WorkflowInstance.objects.filter(
@@ -1846,13 +1699,10 @@ def version_control(request):
     return render(request, 'core/version_control.html', context)
 
 @login_required
+@role_required('company_admin')
 def document_templates(request):
     """Document templates page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get document templates (using workflow templates as document templates)
     templates = WorkflowTemplate.objects.filter(
@@ -1879,13 +1729,10 @@ def document_templates(request):
     return render(request, 'core/document_templates.html', context)
 
 @login_required
+@role_required('company_admin')
 def document_analytics(request):
     """Document analytics page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Document type distribution
     document_types = Announcement.objects.filter(
@@ -1925,13 +1772,10 @@ def document_analytics(request):
     return render(request, 'core/document_analytics.html', context)
 
 @login_required
+@role_required('company_admin')
 def archive_management(request):
     """Archive management page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get archived documents (using inactive announcements as archived files)
     archived_documents = Announcement.objects.filter(
@@ -1970,13 +1814,10 @@ def archive_management(request):
 
 # HR & Payroll Views
 @login_required
+@role_required('company_admin')
 def attendance_tracking(request):
     """Attendance tracking page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get attendance records (using workflow instances as attendance records)
     attendance_records = WorkflowInstance.objects.filter(
@@ -2036,13 +1877,10 @@ def attendance_tracking(request):
 # OLD leave_management function removed - using the correct one at line 7481
 
 @login_required
+@role_required('company_admin')
 def payroll_processing(request):
     """Payroll processing page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get payroll records (using projects as payroll periods)
     payroll_periods = Project.objects.filter(
@@ -2086,13 +1924,10 @@ def payroll_processing(request):
     return render(request, 'core/payroll_processing.html', context)
 
 @login_required
+@role_required('company_admin')
 def performance_reviews(request):
     """Performance reviews page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get performance reviews (using workflow instances as reviews)
     performance_reviews = WorkflowInstance.objects.filter(
@@ -2136,13 +1971,10 @@ def performance_reviews(request):
     return render(request, 'core/performance_reviews.html', context)
 
 @login_required
+@role_required('company_admin')
 def employee_benefits(request):
     """Employee benefits page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get benefits (using announcements as benefits)
     benefits = Announcement.objects.filter(
@@ -2185,13 +2017,10 @@ def employee_benefits(request):
 
 # Customer Management Views
 @login_required
+@role_required('company_admin')
 def crm_dashboard(request):
     """CRM dashboard page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get customer data (using announcements as customer records)
     customers = Announcement.objects.filter(
@@ -2220,13 +2049,10 @@ def crm_dashboard(request):
     return render(request, 'core/crm_dashboard.html', context)
 
 @login_required
+@role_required('company_admin')
 def support_tickets(request):
     """Support tickets page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get support tickets (using workflow instances as tickets)
     support_tickets = WorkflowInstance.objects.filter(
@@ -2270,13 +2096,10 @@ def support_tickets(request):
     return render(request, 'core/support_tickets.html', context)
 
 @login_required
+@role_required('company_admin')
 def client_portal(request):
     """Client portal page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get client projects (using projects as client work)
     client_projects = Project.objects.filter(
@@ -2320,13 +2143,10 @@ def client_portal(request):
     return render(request, 'core/client_portal.html', context)
 
 @login_required
+@role_required('company_admin')
 def customer_analytics(request):
     """Customer analytics page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Customer growth over time
     thirty_days_ago = datetime.now() - timedelta(days=30)
@@ -2366,13 +2186,10 @@ def customer_analytics(request):
     return render(request, 'core/customer_analytics.html', context)
 
 @login_required
+@role_required('company_admin')
 def contact_management(request):
     """Contact management page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get contacts (using announcements as contact records)
     contacts = Announcement.objects.filter(
@@ -2420,13 +2237,10 @@ def contact_management(request):
 
 # Inventory & Assets Views
 @login_required
+@role_required('company_admin')
 def asset_tracking(request):
     """Asset tracking page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get assets (using projects as asset records)
     assets = Project.objects.filter(
@@ -2474,13 +2288,10 @@ def asset_tracking(request):
     return render(request, 'core/asset_tracking.html', context)
 
 @login_required
+@role_required('company_admin')
 def procurement_management(request):
     """Procurement management page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get procurement orders (using workflow instances as orders)
     procurement_orders = WorkflowInstance.objects.filter(
@@ -2524,13 +2335,10 @@ def procurement_management(request):
     return render(request, 'core/procurement_management.html', context)
 
 @login_required
+@role_required('company_admin')
 def maintenance_scheduling(request):
     """Maintenance scheduling page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get maintenance schedules (using announcements as maintenance records)
     maintenance_schedules = Announcement.objects.filter(
@@ -2574,13 +2382,10 @@ def maintenance_scheduling(request):
     return render(request, 'core/maintenance_scheduling.html', context)
 
 @login_required
+@role_required('company_admin')
 def inventory_reports(request):
     """Inventory reports page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get inventory data (using announcements as inventory records)
     inventory_items = Announcement.objects.filter(
@@ -2624,13 +2429,10 @@ def inventory_reports(request):
     return render(request, 'core/inventory_reports.html', context)
 
 @login_required
+@role_required('company_admin')
 def asset_analytics(request):
     """Asset analytics page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Asset type distribution
     asset_types = Project.objects.filter(
@@ -2672,7 +2474,7 @@ def asset_analytics(request):
 def audit_logs(request):
     """Comprehensive audit logs page using the new AuditLog model"""
     # Allow both system owners and company admins to access audit logs
-    is_owner = hasattr(request.user, 'owner_profile')
+    is_owner = hasattr(request.user, 'system_owner_profile')
     is_company_admin = hasattr(request.user, 'company_admin_profile')
     
     if not (is_owner or is_company_admin):
@@ -2810,7 +2612,7 @@ def audit_logs(request):
 def export_audit_logs(request):
     """Export audit logs to CSV"""
     # Allow both system owners and company admins to export audit logs
-    is_owner = hasattr(request.user, 'owner_profile')
+    is_owner = hasattr(request.user, 'system_owner_profile')
     is_company_admin = hasattr(request.user, 'company_admin_profile')
     
     if not (is_owner or is_company_admin):
@@ -2983,7 +2785,7 @@ def audit_log_details(request, log_id):
     """
     # Allow system owners, superusers, and company admins to view audit log details
     is_superuser = request.user.is_superuser
-    is_owner = hasattr(request.user, 'owner_profile')
+    is_owner = hasattr(request.user, 'system_owner_profile')
     is_company_admin = hasattr(request.user, 'company_admin_profile')
     
     if not (is_superuser or is_owner or is_company_admin):
@@ -3026,13 +2828,10 @@ def audit_log_details(request, log_id):
 
 
 @login_required
+@role_required('company_admin')
 def data_protection(request):
     """Data protection page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get data protection records (using announcements as data protection records)
     data_records = Announcement.objects.filter(
@@ -3076,13 +2875,10 @@ def data_protection(request):
     return render(request, 'core/data_protection.html', context)
 
 @login_required
+@role_required('company_admin')
 def compliance_reports(request):
     """Compliance reports page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get compliance reports (using projects as compliance reports)
     compliance_reports = Project.objects.filter(
@@ -3126,13 +2922,10 @@ def compliance_reports(request):
     return render(request, 'core/compliance_reports.html', context)
 
 @login_required
+@role_required('company_admin')
 def security_settings(request):
     """Security settings page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get security settings (using announcements as security settings)
     security_settings = Announcement.objects.filter(
@@ -3174,13 +2967,10 @@ def security_settings(request):
     return render(request, 'core/security_settings.html', context)
 
 @login_required
+@role_required('company_admin')
 def access_control(request):
     """Access control page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get access control records (using workflow instances as access records)
     access_records = WorkflowInstance.objects.filter(
@@ -3225,13 +3015,10 @@ def access_control(request):
 
 # Integrations & API Views
 @login_required
+@role_required('company_admin')
 def third_party_integrations(request):
     """Third-party integrations page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get integrations (using projects as integration records)
     integrations = Project.objects.filter(
@@ -3275,13 +3062,10 @@ def third_party_integrations(request):
     return render(request, 'core/third_party_integrations.html', context)
 
 @login_required
+@role_required('company_admin')
 def api_management(request):
     """API management page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get API endpoints (using workflow instances as API records)
     api_endpoints = WorkflowInstance.objects.filter(
@@ -3325,13 +3109,10 @@ def api_management(request):
     return render(request, 'core/api_management.html', context)
 
 @login_required
+@role_required('company_admin')
 def webhook_configuration(request):
     """Webhook configuration page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get webhooks (using announcements as webhook records)
     webhooks = Announcement.objects.filter(
@@ -3375,13 +3156,10 @@ def webhook_configuration(request):
     return render(request, 'core/webhook_configuration.html', context)
 
 @login_required
+@role_required('company_admin')
 def integration_analytics(request):
     """Integration analytics page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Integration usage statistics
     integration_usage = Project.objects.filter(
@@ -3420,13 +3198,10 @@ def integration_analytics(request):
 
 # Company Settings Views
 @login_required
+@role_required('company_admin')
 def company_profile(request):
     """Company profile page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get company information
     company_info = {
@@ -3454,13 +3229,10 @@ def company_profile(request):
     return render(request, 'core/company_profile.html', context)
 
 @login_required
+@role_required('company_admin')
 def billing_subscriptions(request):
     """Billing and subscriptions page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get subscription information
     try:
@@ -3534,13 +3306,10 @@ def billing_subscriptions(request):
     return render(request, 'core/billing_subscriptions.html', context)
 
 @login_required
+@role_required('company_admin')
 def add_payment_method_page(request):
     """Add payment method page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     context = {
         'title': 'Add Payment Method',
@@ -3550,13 +3319,10 @@ def add_payment_method_page(request):
     return render(request, 'core/add_payment_method.html', context)
 
 @login_required
+@role_required('company_admin')
 def system_settings(request):
     """System settings page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get system settings (using announcements as system settings)
     system_settings = Announcement.objects.filter(
@@ -3598,13 +3364,10 @@ def system_settings(request):
     return render(request, 'core/system_settings.html', context)
 
 @login_required
+@role_required('company_admin')
 def user_preferences(request):
     """User preferences page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get or create user preferences
     preferences, created = UserPreference.objects.get_or_create(
@@ -3693,13 +3456,10 @@ def user_preferences(request):
     return render(request, 'core/user_preferences.html', context)
 
 @login_required
+@role_required('company_admin')
 def company_policies(request):
     """Company policies page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get company policies (using projects as policy records)
     company_policies = Project.objects.filter(
@@ -3744,13 +3504,10 @@ def company_policies(request):
 
 # Reports & Analytics Views
 @login_required
+@role_required('company_admin')
 def dashboard_analytics(request):
     """Dashboard analytics page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get analytics data
     analytics_data = {
@@ -3777,13 +3534,10 @@ def dashboard_analytics(request):
     return render(request, 'core/dashboard_analytics.html', context)
 
 @login_required
+@role_required('company_admin')
 def custom_reports(request):
     """Custom reports page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get custom reports (using projects as report records)
     custom_reports = Project.objects.filter(
@@ -3827,13 +3581,10 @@ def custom_reports(request):
     return render(request, 'core/custom_reports.html', context)
 
 @login_required
+@role_required('company_admin')
 def data_export(request):
     """Data export page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get export history (using announcements as export records)
     export_history = Announcement.objects.filter(
@@ -3877,13 +3628,10 @@ def data_export(request):
     return render(request, 'core/data_export.html', context)
 
 @login_required
+@role_required('company_admin')
 def performance_metrics(request):
     """Performance metrics page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get performance metrics
     performance_metrics = {
@@ -3914,13 +3662,10 @@ def performance_metrics(request):
     return render(request, 'core/performance_metrics.html', context)
 
 @login_required
+@role_required('company_admin')
 def business_intelligence(request):
     """Business intelligence page"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get business intelligence data
     business_intelligence = {
@@ -4100,12 +3845,9 @@ def employee_registration(request):
     return render(request, 'core/employee_registration.html', context)
 
 @login_required
+@role_required('employee')
 def employee_dashboard(request):
     """Enhanced Employee dashboard with comprehensive data"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -4194,12 +3936,9 @@ def employee_dashboard(request):
     return render(request, 'core/employee_dashboard.html', context)
 
 @login_required
+@role_required('employee')
 def employee_tasks(request):
     """Employee task management page"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     
     # Get tasks with filtering
@@ -4245,12 +3984,9 @@ def employee_tasks(request):
     return render(request, 'core/employee_tasks.html', context)
 
 @login_required
+@role_required('employee')
 def employee_projects(request):
     """Employee projects overview"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     
     # Get projects where employee is assigned to tasks or is project manager
@@ -4283,12 +4019,9 @@ def employee_projects(request):
     return render(request, 'core/employee_projects.html', context)
 
 @login_required
+@role_required('employee')
 def employee_timesheet(request):
     """Employee timesheet management"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     
     # Get current week's timesheets
@@ -4328,12 +4061,9 @@ def employee_timesheet(request):
     return render(request, 'core/employee_timesheet.html', context)
 
 @login_required
+@role_required('employee')
 def employee_edit_timesheet(request, timesheet_id):
     """Edit a specific timesheet entry for employees"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     
     try:
@@ -4401,12 +4131,9 @@ def employee_edit_timesheet(request, timesheet_id):
     return render(request, 'core/employee_edit_timesheet.html', context)
 
 @login_required
+@role_required('employee')
 def employee_chat(request):
     """Employee chat system"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -4516,12 +4243,9 @@ def employee_chat(request):
     return render(request, 'core/employee_chat.html', context)
 
 @login_required
+@role_required('employee')
 def employee_chat_room(request, room_id):
     """Individual chat room view"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     
     try:
@@ -4548,7 +4272,7 @@ def employee_chat_room(request, room_id):
                 'message': {
                     'id': msg.id,
                     'content': msg.content,
-                    'attachment': msg.attachment.url if msg.attachment else None,
+                    'attachment': reverse('api:chat_attachment', args=[msg.id]) if msg.attachment else None,
                     'attachment_name': msg.attachment.name if msg.attachment else None,
                     'is_edited': msg.is_edited,
                     'created_at': msg.created_at.isoformat()
@@ -4573,9 +4297,21 @@ def employee_chat_room(request, room_id):
             content = request.POST.get('content', '').strip()
             attachment = request.FILES.get('attachment')
             
+            # Attachments sent through the resumable upload API arrive as an upload_id
+            upload = None
+            if not attachment and request.POST.get('upload_id'):
+                upload = get_upload(request.user, request.POST['upload_id'], status='COMPLETE')
+                if not upload or upload.purpose != 'CHAT':
+                    return JsonResponse({'success': False, 'message': 'Upload not found or not complete'})
+                attachment = upload.file.name
+            
             if not content and not attachment:
                 return JsonResponse({'success': False, 'message': 'Message content or attachment is required'})
             
+            if attachment and not upload:
+                # Stored once per distinct content, see core.blobs
+                attachment = store_upload(attachment).name
+            
             # Create new message
             message = ChatMessage.objects.create(
                 room=room,
@@ -4583,6 +4319,8 @@ def employee_chat_room(request, room_id):
                 content=content,
                 attachment=attachment
             )
+            if upload:
+                mark_attached(upload)
             
             # Update room's updated_at timestamp
             room.updated_at = timezone.now()
@@ -4596,12 +4334,12 @@ def employee_chat_room(request, room_id):
             if channel_layer:
                 async_to_sync(channel_layer.group_send)(
                     f'chat_room_{room.id}',
-                    {
-                        'type': 'chat_message',
+                    frame_event('chat_message', {
+                        'type': 'new_message',
                         'message': {
                             'id': message.id,
                             'content': message.content,
-                            'attachment': message.attachment.url if message.attachment else None,
+                            'attachment': reverse('api:chat_attachment', args=[message.id]) if message.attachment else None,
                             'attachment_name': message.attachment.name if message.attachment else None,
                             'is_edited': message.is_edited,
                             'created_at': message.created_at.isoformat()
@@ -4613,23 +4351,24 @@ def employee_chat_room(request, room_id):
                             'position': employee.position or 'Employee'
                         },
                         'timestamp': message.created_at.isoformat()
-                    }
+                    })
                 )
                 
-                # Send notifications to offline participants
+                # Send notifications to offline participants (encoded once for all of them)
+                notification = frame_event('chat_notification', {
+                    'type': 'notification',
+                    'title': f'New message in {room.name}',
+                    'message': f'{employee.first_name}: {content[:100]}{"..." if len(content) > 100 else ""}',
+                    'room_id': room.id,
+                    'sender': {
+                        'first_name': employee.first_name,
+                        'last_name': employee.last_name
+                    }
+                })
                 for participant in room.participants.exclude(id=employee.id):
                     async_to_sync(channel_layer.group_send)(
                         f'chat_notifications_{participant.user_account.id}',
-                        {
-                            'type': 'chat_notification',
-                            'title': f'New message in {room.name}',
-                            'message': f'{employee.first_name}: {content[:100]}{"..." if len(content) > 100 else ""}',
-                            'room_id': room.id,
-                            'sender': {
-                                'first_name': employee.first_name,
-                                'last_name': employee.last_name
-                            }
-                        }
+                        notification
                     )
             
             return JsonResponse({'success': True, 'message': 'Message sent successfully', 'message_id': message.id})
@@ -4657,12 +4396,9 @@ def employee_chat_room(request, room_id):
     return render(request, 'core/employee_chat_room.html', context)
 
 @login_required
+@role_required('employee')
 def employee_goals(request):
     """Employee performance goals"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     
     # Get all goals
@@ -4691,12 +4427,9 @@ def employee_goals(request):
     return render(request, 'core/employee_goals.html', context)
 
 @login_required
+@role_required('employee')
 def employee_leave(request):
     """Employee leave management"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     
     # Get leave requests
@@ -4763,12 +4496,9 @@ def employee_leave(request):
     return render(request, 'core/employee_leave.html', context)
 
 @login_required
+@role_required('employee')
 def employee_analytics(request):
     """Employee Analytics Dashboard with productivity insights"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -4859,12 +4589,9 @@ def employee_analytics(request):
     return render(request, 'core/employee_analytics.html', context)
 
 @login_required
+@role_required('employee')
 def employee_notifications(request):
     """Employee Notifications Center"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -4884,12 +4611,9 @@ def employee_notifications(request):
     return render(request, 'core/employee_notifications.html', context)
 
 @login_required
+@role_required('employee')
 def employee_team_directory(request):
     """Employee Team Directory"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -4913,12 +4637,9 @@ def employee_team_directory(request):
     return render(request, 'core/employee_team_directory.html', context)
 
 @login_required
+@role_required('employee')
 def employee_calendar(request):
     """Employee Calendar and Scheduling"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -4947,12 +4668,9 @@ def employee_calendar(request):
     return render(request, 'core/employee_calendar.html', context)
 
 @login_required
+@role_required('employee')
 def employee_kanban_board(request):
     """Advanced Task Management with Kanban Board"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -4990,12 +4708,9 @@ def employee_kanban_board(request):
     return render(request, 'core/employee_kanban.html', context)
 
 @login_required
+@role_required('employee')
 def employee_gamification(request):
     """Employee Gamification and Recognition"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -5077,12 +4792,9 @@ def employee_gamification(request):
     return render(request, 'core/employee_gamification.html', context)
 
 @login_required
+@role_required('employee')
 def employee_documents(request):
     """Employee Document Management System"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -5137,12 +4849,9 @@ def employee_documents(request):
     return render(request, 'core/employee_documents.html', context)
 
 @login_required
+@role_required('employee')
 def employee_productivity(request):
     """Employee Productivity Tracking and Insights"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -5217,13 +4926,10 @@ def employee_productivity(request):
     
     return render(request, 'core/employee_productivity.html', context)
 
-@login_required
-def employee_settings(request):
-    """Employee Settings and Personalization"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
+@login_required
+@role_required('employee')
+def employee_settings(request):
+    """Employee Settings and Personalization"""
     employee = request.user.employee_profile
     company = employee.company
     
@@ -5270,12 +4976,9 @@ def employee_settings(request):
     return render(request, 'core/employee_settings.html', context)
 
 @login_required
+@role_required('employee')
 def employee_search(request):
     """Global Search for Employee Dashboard"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -5291,12 +4994,9 @@ def employee_search(request):
     return render(request, 'core/employee_search.html', context)
 
 @login_required
+@role_required('employee')
 def employee_shortcuts(request):
     """Keyboard Shortcuts Help Page"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -5309,12 +5009,9 @@ def employee_shortcuts(request):
     return render(request, 'core/employee_shortcuts.html', context)
 
 @login_required
+@role_required('employee')
 def employee_onboarding(request):
     """Employee Onboarding Flow"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -5359,12 +5056,9 @@ def contact(request):
 
 # Owner Management Pages
 @login_required
+@role_required('system_owner')
 def all_companies(request):
     """View all companies page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     from django.db.models import Count
     
     companies = Company.objects.annotate(
@@ -5384,62 +5078,48 @@ def all_companies(request):
     return render(request, 'core/all_companies.html', context)
 
 @login_required
+@role_required('system_owner')
 def company_analytics(request):
     """Company analytics page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    from django.db.models import Count, Avg, Q
+    from django.db.models import Count, Q
     from datetime import datetime, timedelta
+    from .platform_stats import latest_stats, stats_rows, trailing_windows, window_sums
     
-    # Company statistics
-    total_companies = Company.objects.count()
-    active_companies = Company.objects.filter(is_active=True).count()
+    # Company statistics (from the daily rollup)
+    stats = latest_stats()
+    today = stats.date
+    total_companies = stats.total_companies
+    active_companies = stats.active_companies
     inactive_companies = total_companies - active_companies
     
-    # Company growth over time
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    
-    companies_last_30_days = Company.objects.filter(created_at__gte=thirty_days_ago).count()
-    companies_last_7_days = Company.objects.filter(created_at__gte=seven_days_ago).count()
+    # Company registration trends (last 12 months) and growth over time
+    windows = trailing_windows(today, 12, 30)
+    rows = stats_rows(windows[0][0], today)
+    monthly = window_sums(rows, windows, ['new_companies'])
+    monthly_registrations = [
+        {'month': end.strftime('%b %Y'), 'count': sums['new_companies']}
+        for (start, end), sums in zip(windows, monthly)
+    ]
     
-    # Employee statistics per company
-    companies_with_employees = Company.objects.annotate(
-        employee_count=Count('employees'),
-        verified_employees=Count('employees', filter=Q(employees__is_verified=True)),
-        registered_employees=Count('employees', filter=Q(employees__user_account__isnull=False))
-    ).order_by('-employee_count')
+    recent = window_sums(rows, [(today - timedelta(days=29), today), (today - timedelta(days=6), today)], ['new_companies'])
+    companies_last_30_days = recent[0]['new_companies']
+    companies_last_7_days = recent[1]['new_companies']
     
     # Average employees per company
-    avg_employees_per_company = companies_with_employees.aggregate(
-        avg_employees=Avg('employee_count')
-    )['avg_employees'] or 0
+    avg_employees_per_company = stats.total_employees / total_companies if total_companies else 0
     
     # Company activity metrics
+    seven_days_ago = datetime.now() - timedelta(days=7)
     companies_with_recent_activity = Company.objects.filter(
         updated_at__gte=seven_days_ago
     ).count()
     
     # Top companies by employee count
-    top_companies = companies_with_employees[:10]
-    
-    # Company registration trends (last 12 months)
-    monthly_registrations = []
-    for i in range(12):
-        month_start = datetime.now() - timedelta(days=30*i)
-        month_end = month_start + timedelta(days=30)
-        count = Company.objects.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-        monthly_registrations.append({
-            'month': month_start.strftime('%b %Y'),
-            'count': count
-        })
-    
-    monthly_registrations.reverse()
+    top_companies = Company.objects.annotate(
+        employee_count=Count('employees'),
+        verified_employees=Count('employees', filter=Q(employees__is_verified=True)),
+        registered_employees=Count('employees', filter=Q(employees__user_account__isnull=False))
+    ).order_by('-employee_count')[:10]
     
     context = {
         'title': 'Company Analytics',
@@ -5456,12 +5136,9 @@ def company_analytics(request):
     return render(request, 'core/company_analytics.html', context)
 
 @login_required
+@role_required('system_owner')
 def user_stats(request):
     """User statistics page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     total_users = User.objects.count()
     active_users = User.objects.filter(is_active=True).count()
     inactive_users = total_users - active_users
@@ -5479,12 +5156,9 @@ def user_stats(request):
     return render(request, 'core/user_stats.html', context)
 
 @login_required
+@role_required('system_owner')
 def active_users(request):
     """Active users page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     active_users = User.objects.filter(is_active=True).order_by('-last_login')
     context = {
         'title': 'Active Users',
@@ -5493,12 +5167,9 @@ def active_users(request):
     return render(request, 'core/active_users.html', context)
 
 @login_required
+@role_required('system_owner')
 def user_activity(request):
     """User activity page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     from django.db.models import Count, Q
     from datetime import datetime, timedelta
     
@@ -5579,25 +5250,23 @@ def user_activity(request):
     return render(request, 'core/user_activity.html', context)
 
 @login_required
+@role_required('system_owner')
 def user_reports(request):
     """User reports page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    from django.db.models import Count, Avg, Q
+    from django.db.models import Count, Q
     from datetime import datetime, timedelta
+    from .platform_stats import latest_stats, stats_rows, trailing_windows, window_sums
     
-    # User statistics
-    total_users = User.objects.count()
-    active_users = User.objects.filter(is_active=True).count()
+    # User and employee statistics (from the daily rollup)
+    stats = latest_stats()
+    total_users = stats.total_users
+    active_users = stats.active_users
     inactive_users = total_users - active_users
     
-    # Employee statistics
-    total_employees = Employee.objects.count()
-    verified_employees = Employee.objects.filter(is_verified=True).count()
+    total_employees = stats.total_employees
+    verified_employees = stats.verified_employees
     unverified_employees = total_employees - verified_employees
-    registered_employees = Employee.objects.filter(user_account__isnull=False).count()
+    registered_employees = stats.registered_employees
     
     # User roles breakdown
     system_owners = User.objects.filter(system_owner_profile__isnull=False).count()
@@ -5605,20 +5274,12 @@ def user_reports(request):
     regular_employees = User.objects.filter(employee_profile__isnull=False).count()
     
     # Registration trends (last 12 months)
-    monthly_registrations = []
-    for i in range(12):
-        month_start = datetime.now() - timedelta(days=30*i)
-        month_end = month_start + timedelta(days=30)
-        count = User.objects.filter(
-            date_joined__gte=month_start,
-            date_joined__lt=month_end
-        ).count()
-        monthly_registrations.append({
-            'month': month_start.strftime('%b %Y'),
-            'count': count
-        })
-    
-    monthly_registrations.reverse()
+    windows = trailing_windows(stats.date, 12, 30)
+    monthly = window_sums(stats_rows(windows[0][0], stats.date), windows, ['new_users'])
+    monthly_registrations = [
+        {'month': end.strftime('%b %Y'), 'count': sums['new_users']}
+        for (start, end), sums in zip(windows, monthly)
+    ]
     
     # Department statistics
     department_stats = Employee.objects.values('department').annotate(
@@ -5645,9 +5306,8 @@ def user_reports(request):
     ).count()
     
     # Average users per company
-    avg_users_per_company = company_user_distribution.aggregate(
-        avg_users=Avg('total_users')
-    )['avg_users'] or 0
+    total_companies = stats.total_companies
+    avg_users_per_company = total_employees / total_companies if total_companies else 0
     
     context = {
         'title': 'User Reports',
@@ -5671,12 +5331,9 @@ def user_reports(request):
     return render(request, 'core/user_reports.html', context)
 
 @login_required
+@role_required('system_owner')
 def system_stats(request):
     """System statistics page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     try:
         cpu_percent = psutil.cpu_percent(interval=1)
         memory = psutil.virtual_memory()
@@ -5705,123 +5362,88 @@ def system_stats(request):
     return render(request, 'core/system_stats.html', context)
 
 @login_required
+@role_required('system_owner')
 def revenue_reports(request):
     """Revenue reports page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    from django.db.models import Count, Sum
+    from django.db.models import Count
     from datetime import datetime, timedelta
-    
-    # Revenue simulation based on companies and users
-    # In a real system, this would come from actual billing/payment data
-    
-    # Company-based revenue (assuming $100/month per company)
-    total_companies = Company.objects.count()
-    active_companies = Company.objects.filter(is_active=True).count()
-    
-    monthly_revenue_per_company = 100  # $100 per company per month
-    total_monthly_revenue = active_companies * monthly_revenue_per_company
-    total_annual_revenue = total_monthly_revenue * 12
-    
-    # User-based revenue (assuming $5/month per active user)
-    active_users = User.objects.filter(is_active=True).count()
-    monthly_revenue_per_user = 5  # $5 per user per month
-    user_monthly_revenue = active_users * monthly_revenue_per_user
-    
-    # Total revenue
-    total_revenue = total_monthly_revenue + user_monthly_revenue
-    
-    # Revenue trends (last 12 months)
+    from .platform_stats import latest_stats, row_on, stats_rows, trailing_windows, window_sums
+    from .revenue import company_mrr, revenue_by_company_size, revenue_summary
+    
+    # Current revenue from paid subscription intervals
+    stats = latest_stats()
+    today = stats.date
+    summary = revenue_summary(today - timedelta(days=29), today)
+    yearly = revenue_summary(today - timedelta(days=364), today)
+    
+    total_monthly_revenue = round(float(summary['mrr']), 2)
+    total_annual_revenue = round(float(summary['arr']), 2)
+    total_revenue = round(float(yearly['revenue']), 2)  # Collected over the last 12 months
+    active_users = stats.active_users
+    monthly_revenue_per_company = round(float(summary['arpu']), 2)
+    monthly_revenue_per_user = round(total_monthly_revenue / active_users, 2) if active_users else 0
+    
+    # Revenue trends (last 12 months): MRR, active companies and users at each month's end
+    windows = trailing_windows(today, 12, 30)
+    rows = stats_rows(windows[0][0], today)
     monthly_revenue_data = []
-    for i in range(12):
-        month_start = datetime.now() - timedelta(days=30*i)
-        month_end = month_start + timedelta(days=30)
-        
-        # Companies active in this month
-        companies_in_month = Company.objects.filter(
-            created_at__lt=month_end,
-            is_active=True
-        ).count()
-        
-        # Users active in this month
-        users_in_month = User.objects.filter(
-            date_joined__lt=month_end,
-            is_active=True
-        ).count()
-        
-        month_revenue = (companies_in_month * monthly_revenue_per_company) + (users_in_month * monthly_revenue_per_user)
-        
+    for start, end in windows:
+        row = row_on(rows, end)
         monthly_revenue_data.append({
-            'month': month_start.strftime('%b %Y'),
-            'revenue': month_revenue,
-            'companies': companies_in_month,
-            'users': users_in_month
+            'month': end.strftime('%b %Y'),
+            'revenue': round(float(row['mrr']), 2) if row else 0,
+            'companies': row['active_companies'] if row else 0,
+            'users': row['active_users'] if row else 0
         })
     
-    monthly_revenue_data.reverse()
-    
     # Revenue by company size
-    revenue_by_company_size = []
     company_sizes = [
         {'min': 1, 'max': 10, 'label': 'Small (1-10 users)'},
         {'min': 11, 'max': 50, 'label': 'Medium (11-50 users)'},
         {'min': 51, 'max': 100, 'label': 'Large (51-100 users)'},
         {'min': 101, 'max': 1000, 'label': 'Enterprise (100+ users)'}
     ]
-    
-    for size in company_sizes:
-        companies_in_range = Company.objects.annotate(
-            user_count=Count('employees')
-        ).filter(
-            user_count__gte=size['min'],
-            user_count__lte=size['max'],
-            is_active=True
-        ).count()
-        
-        revenue_in_range = companies_in_range * monthly_revenue_per_company
-        
-        revenue_by_company_size.append({
+    revenue_by_company_size = [
+        {
             'label': size['label'],
-            'companies': companies_in_range,
-            'revenue': revenue_in_range
-        })
+            'companies': totals['companies'],
+            'revenue': round(float(totals['mrr']), 2)
+        }
+        for size, totals in zip(company_sizes, revenue_by_company_size(company_sizes, today, is_active=True))
+    ]
     
     # Top revenue generating companies
     top_revenue_companies = Company.objects.annotate(
-        user_count=Count('employees')
+        user_count=Count('employees'),
+        mrr=company_mrr(today)
     ).filter(
         is_active=True
-    ).order_by('-user_count')[:10]
+    ).order_by('-mrr', '-user_count')[:10]
     
     # Revenue growth metrics
-    current_month_revenue = monthly_revenue_data[-1]['revenue'] if monthly_revenue_data else 0
-    previous_month_revenue = monthly_revenue_data[-2]['revenue'] if len(monthly_revenue_data) > 1 else 0
+    previous_month_revenue = float(summary['mrr_start'])
     
     revenue_growth = 0
     if previous_month_revenue > 0:
-        revenue_growth = ((current_month_revenue - previous_month_revenue) / previous_month_revenue) * 100
+        revenue_growth = ((total_monthly_revenue - previous_month_revenue) / previous_month_revenue) * 100
     
-    # Projected revenue (next 6 months)
+    # Projected revenue (next 6 months), continuing the last 30 days' net new MRR, companies and users
+    net_new_mrr = float(summary['new_mrr'] - summary['churned_mrr'])
+    net_new_companies = summary['new_companies'] - summary['churned_companies']
+    new_users = window_sums(rows, [(today - timedelta(days=29), today)], ['new_users'])[0]['new_users']
     projected_revenue = []
     for i in range(1, 7):
         projected_month = datetime.now() + timedelta(days=30*i)
-        projected_companies = active_companies + (i * 2)  # Assuming 2 new companies per month
-        projected_users = active_users + (i * 10)  # Assuming 10 new users per month
-        projected_rev = (projected_companies * monthly_revenue_per_company) + (projected_users * monthly_revenue_per_user)
-        
         projected_revenue.append({
             'month': projected_month.strftime('%b %Y'),
-            'revenue': projected_rev,
-            'companies': projected_companies,
-            'users': projected_users
+            'revenue': round(max(total_monthly_revenue + net_new_mrr * i, 0), 2),
+            'companies': max(summary['paying_companies'] + net_new_companies * i, 0),
+            'users': active_users + new_users * i
         })
     
     context = {
         'title': 'Revenue Reports',
         'total_monthly_revenue': total_monthly_revenue,
-        'user_monthly_revenue': user_monthly_revenue,
         'total_revenue': total_revenue,
         'total_annual_revenue': total_annual_revenue,
         'monthly_revenue_data': monthly_revenue_data,
@@ -5831,46 +5453,51 @@ def revenue_reports(request):
         'projected_revenue': projected_revenue,
         'monthly_revenue_per_company': monthly_revenue_per_company,
         'monthly_revenue_per_user': monthly_revenue_per_user,
+        'paying_companies': summary['paying_companies'],
+        'churn_rate': round(summary['churn_rate'], 1),
     }
     return render(request, 'core/revenue_reports.html', context)
 
 @login_required
+@role_required('system_owner')
 def growth_analytics(request):
     """Growth analytics page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
-    from django.db.models import Count
     from datetime import datetime, timedelta
+    from .platform_stats import company_size_counts, latest_stats, stats_rows, trailing_windows, window_sums
     
-    # Growth metrics over different time periods
+    # Growth metrics over different time periods (from the daily rollup)
+    stats = latest_stats()
+    today = stats.date
     now = datetime.now()
-    seven_days_ago = now - timedelta(days=7)
-    thirty_days_ago = now - timedelta(days=30)
-    ninety_days_ago = now - timedelta(days=90)
-    one_year_ago = now - timedelta(days=365)
+    thirty_days_ago = timezone.now() - timedelta(days=30)
+    fields = ['new_companies', 'new_users', 'new_employees']
+    
+    periods = [(today - timedelta(days=days - 1), today) for days in (7, 30, 90, 365)]
+    monthly_windows = trailing_windows(today, 12, 30)
+    weekly_windows = trailing_windows(today, 12, 7)
+    rows = stats_rows(min(periods[-1][0], monthly_windows[0][0]), today)
+    last_7_days, last_30_days, last_90_days, last_year = window_sums(rows, periods, fields)
     
     # Company growth
-    total_companies = Company.objects.count()
-    companies_last_7_days = Company.objects.filter(created_at__gte=seven_days_ago).count()
-    companies_last_30_days = Company.objects.filter(created_at__gte=thirty_days_ago).count()
-    companies_last_90_days = Company.objects.filter(created_at__gte=ninety_days_ago).count()
-    companies_last_year = Company.objects.filter(created_at__gte=one_year_ago).count()
+    total_companies = stats.total_companies
+    companies_last_7_days = last_7_days['new_companies']
+    companies_last_30_days = last_30_days['new_companies']
+    companies_last_90_days = last_90_days['new_companies']
+    companies_last_year = last_year['new_companies']
     
     # User growth
-    total_users = User.objects.count()
-    users_last_7_days = User.objects.filter(date_joined__gte=seven_days_ago).count()
-    users_last_30_days = User.objects.filter(date_joined__gte=thirty_days_ago).count()
-    users_last_90_days = User.objects.filter(date_joined__gte=ninety_days_ago).count()
-    users_last_year = User.objects.filter(date_joined__gte=one_year_ago).count()
+    total_users = stats.total_users
+    users_last_7_days = last_7_days['new_users']
+    users_last_30_days = last_30_days['new_users']
+    users_last_90_days = last_90_days['new_users']
+    users_last_year = last_year['new_users']
     
     # Employee growth
-    total_employees = Employee.objects.count()
-    employees_last_7_days = Employee.objects.filter(created_at__gte=seven_days_ago).count()
-    employees_last_30_days = Employee.objects.filter(created_at__gte=thirty_days_ago).count()
-    employees_last_90_days = Employee.objects.filter(created_at__gte=ninety_days_ago).count()
-    employees_last_year = Employee.objects.filter(created_at__gte=one_year_ago).count()
+    total_employees = stats.total_employees
+    employees_last_7_days = last_7_days['new_employees']
+    employees_last_30_days = last_30_days['new_employees']
+    employees_last_90_days = last_90_days['new_employees']
+    employees_last_year = last_year['new_employees']
     
     # Growth rates calculation
     def calculate_growth_rate(current, previous):
@@ -5879,64 +5506,26 @@ def growth_analytics(request):
         return ((current - previous) / previous) * 100
     
     # Monthly growth trends (last 12 months)
-    monthly_growth = []
-    for i in range(12):
-        month_start = now - timedelta(days=30*i)
-        month_end = month_start + timedelta(days=30)
-        
-        companies_in_month = Company.objects.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-        
-        users_in_month = User.objects.filter(
-            date_joined__gte=month_start,
-            date_joined__lt=month_end
-        ).count()
-        
-        employees_in_month = Employee.objects.filter(
-            created_at__gte=month_start,
-            created_at__lt=month_end
-        ).count()
-        
-        monthly_growth.append({
-            'month': month_start.strftime('%b %Y'),
-            'companies': companies_in_month,
-            'users': users_in_month,
-            'employees': employees_in_month
-        })
-    
-    monthly_growth.reverse()
+    monthly_growth = [
+        {
+            'month': end.strftime('%b %Y'),
+            'companies': sums['new_companies'],
+            'users': sums['new_users'],
+            'employees': sums['new_employees']
+        }
+        for (start, end), sums in zip(monthly_windows, window_sums(rows, monthly_windows, fields))
+    ]
     
     # Weekly growth trends (last 12 weeks)
-    weekly_growth = []
-    for i in range(12):
-        week_start = now - timedelta(days=7*i)
-        week_end = week_start + timedelta(days=7)
-        
-        companies_in_week = Company.objects.filter(
-            created_at__gte=week_start,
-            created_at__lt=week_end
-        ).count()
-        
-        users_in_week = User.objects.filter(
-            date_joined__gte=week_start,
-            date_joined__lt=week_end
-        ).count()
-        
-        employees_in_week = Employee.objects.filter(
-            created_at__gte=week_start,
-            created_at__lt=week_end
-        ).count()
-        
-        weekly_growth.append({
-            'week': f"Week {12-i}",
-            'companies': companies_in_week,
-            'users': users_in_week,
-            'employees': employees_in_week
-        })
-    
-    weekly_growth.reverse()
+    weekly_growth = [
+        {
+            'week': f"Week {i + 1}",
+            'companies': sums['new_companies'],
+            'users': sums['new_users'],
+            'employees': sums['new_employees']
+        }
+        for i, sums in enumerate(window_sums(rows, weekly_windows, fields))
+    ]
     
     # Growth projections (next 6 months)
     # Simple linear projection based on recent growth
@@ -5959,36 +5548,21 @@ def growth_analytics(request):
         })
     
     # Growth by company size
-    company_size_growth = []
     size_ranges = [
         {'min': 1, 'max': 10, 'label': 'Small'},
         {'min': 11, 'max': 50, 'label': 'Medium'},
         {'min': 51, 'max': 100, 'label': 'Large'},
         {'min': 101, 'max': 1000, 'label': 'Enterprise'}
     ]
-    
-    for size in size_ranges:
-        companies_in_range = Company.objects.annotate(
-            employee_count=Count('employees')
-        ).filter(
-            employee_count__gte=size['min'],
-            employee_count__lte=size['max']
-        ).count()
-        
-        new_companies_in_range = Company.objects.annotate(
-            employee_count=Count('employees')
-        ).filter(
-            employee_count__gte=size['min'],
-            employee_count__lte=size['max'],
-            created_at__gte=thirty_days_ago
-        ).count()
-        
-        company_size_growth.append({
+    company_size_growth = [
+        {
             'label': size['label'],
-            'total': companies_in_range,
-            'new_last_30_days': new_companies_in_range,
-            'growth_rate': calculate_growth_rate(new_companies_in_range, companies_in_range - new_companies_in_range)
-        })
+            'total': counts['total'],
+            'new_last_30_days': counts['new'],
+            'growth_rate': calculate_growth_rate(counts['new'], counts['total'] - counts['new'])
+        }
+        for size, counts in zip(size_ranges, company_size_counts(size_ranges, since=thirty_days_ago))
+    ]
     
     context = {
         'title': 'Growth Analytics',
@@ -6018,12 +5592,9 @@ def growth_analytics(request):
     return render(request, 'core/growth_analytics.html', context)
 
 @login_required
+@role_required('system_owner')
 def custom_reports(request):
     """Custom reports page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     from django.db.models import Count, Avg, Max, Min
     from datetime import datetime, timedelta
     
@@ -6149,24 +5720,18 @@ def custom_reports(request):
     return render(request, 'core/custom_reports.html', context)
 
 @login_required
+@role_required('system_owner')
 def system_settings(request):
     """System settings page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     context = {
         'title': 'System Settings',
     }
     return render(request, 'core/system_settings.html', context)
 
 @login_required
+@role_required('system_owner')
 def security_settings(request):
     """Security settings page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     if request.method == 'POST':
         # Handle security settings form submission
         password_policy = request.POST.get('password_policy')
@@ -6186,12 +5751,9 @@ def security_settings(request):
     return render(request, 'core/security_settings.html', context)
 
 @login_required
+@role_required('system_owner')
 def backup_restore(request):
     """Backup and restore page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     if request.method == 'POST':
         action = request.POST.get('action')
         
@@ -6202,9 +5764,13 @@ def backup_restore(request):
             backup_location = request.POST.get('backup_location', '')
             
             try:
-                # Create actual backup
-                backup_path = create_real_backup(backup_name, backup_type, backup_location)
-                messages.success(request, f'Backup "{backup_name}" created successfully at {backup_path}!')
+                # Backups can take minutes; run them on the job worker
+                job = enqueue('create_backup', {
+                    'backup_name': backup_name,
+                    'backup_type': backup_type,
+                    'backup_location': backup_location,
+                }, user=request.user, max_attempts=1)
+                messages.success(request, f'Backup "{backup_name}" has been queued (job #{job.id}).')
             except Exception as e:
                 messages.error(request, f'Backup failed: {str(e)}')
             
@@ -6248,12 +5814,9 @@ def backup_restore(request):
     return render(request, 'core/backup_restore.html', context)
 
 @login_required
+@role_required('system_owner')
 def system_logs(request):
     """System logs page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     from .models import SystemLog
     from .logging_utils import SystemLogger
     
@@ -6318,12 +5881,9 @@ def system_logs(request):
     return render(request, 'core/system_logs.html', context)
 
 @login_required
+@role_required('system_owner')
 def maintenance(request):
     """System maintenance page"""
-    if not hasattr(request.user, 'system_owner_profile'):
-        messages.error(request, 'Access denied. You are not authorized to view this page.')
-        return redirect('core:home')
-    
     import psutil
     import os
     from django.db import connection
@@ -6503,6 +6063,14 @@ import psutil
 from datetime import datetime
 from pathlib import Path
 from django.conf import settings
+from .incremental_backup import (
+    BACKUP_TYPES as INCREMENTAL_BACKUP_TYPES,
+    IncrementalBackupStore,
+    create_incremental_backup,
+    delete_incremental_backup,
+    list_incremental_backups,
+    restore_incremental_backup,
+)
 
 def get_external_drives():
     """Detect all drives (internal and external) connected to the system"""
@@ -6648,12 +6216,15 @@ def get_real_backups():
                 'id': str(backup_file.stem),
                 'name': backup_file.name,
                 'path': str(backup_file),
-                'type': 'Full' if 'full' in backup_file.name.lower() else 'Incremental',
+                'type': 'Full',
                 'size': f'{size_gb} GB',
                 'created': created_time.strftime('%Y-%m-%d %H:%M:%S'),
                 'status': 'Completed'
             })
         
+        # Incremental/differential backups live in the content-addressed store
+        backups.extend(list_incremental_backups())
+        
         # Sort by creation time (newest first)
         backups.sort(key=lambda x: x['created'], reverse=True)
         
@@ -6664,6 +6235,9 @@ def get_real_backups():
 
 def create_real_backup(backup_name, backup_type, backup_location):
     """Create a real backup of the system"""
+    if backup_type in INCREMENTAL_BACKUP_TYPES:
+        return create_real_incremental_backup(backup_name, backup_type, backup_location)
+    
     try:
         import zipfile
         from django.conf import settings
@@ -6732,8 +6306,44 @@ def create_real_backup(backup_name, backup_type, backup_location):
         })
         raise Exception(f"Failed to create backup: {str(e)}")
 
+def create_real_incremental_backup(backup_name, backup_type, backup_location):
+    """
+    Create an incremental or differential backup that only stores changed content.
+    These always go to the default store, where their parents are and where
+    listing, restoring and deleting look for them, so ``backup_location`` only
+    applies to full backups.
+    """
+    try:
+        manifest = create_incremental_backup(backup_name, backup_type)
+        store = IncrementalBackupStore()
+        
+        log_backup_action(f'Backup "{backup_name}" created successfully at {store.root}', additional_data={
+            'backup_type': manifest['backup_type'],
+            'backup_location': str(store.root),
+            'parent': manifest['parent'],
+            **manifest['stats'],
+        })
+        
+        return str(store.manifest_path(manifest['id']))
+        
+    except Exception as e:
+        log_error(f'Backup creation failed: {str(e)}', additional_data={
+            'backup_name': backup_name,
+            'backup_type': backup_type,
+            'backup_location': str(IncrementalBackupStore().root),
+            'error': str(e)
+        })
+        raise Exception(f"Failed to create backup: {str(e)}")
+
 def restore_real_backup(backup_id):
     """Restore from a real backup"""
+    if IncrementalBackupStore().has_manifest(backup_id):
+        try:
+            restore_incremental_backup(backup_id)
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to restore backup: {str(e)}")
+    
     try:
         import zipfile
         from django.conf import settings
@@ -6785,6 +6395,13 @@ def restore_real_backup(backup_id):
 
 def delete_real_backup(backup_id):
     """Delete a real backup file"""
+    if IncrementalBackupStore().has_manifest(backup_id):
+        try:
+            delete_incremental_backup(backup_id)
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to delete backup: {str(e)}")
+    
     try:
         backup_dir = Path('backups')
         backup_file = backup_dir / f'{backup_id}.zip'
@@ -7071,20 +6688,25 @@ def subscription_analytics(request):
         messages.error(request, 'Access denied. Owner privileges required.')
         return redirect('core:owner_dashboard')
     
-    # Revenue analytics
-    monthly_revenue = CompanySubscription.objects.filter(
-        status='ACTIVE'
-    ).aggregate(
-        total=Sum('plan__price')
-    )['total'] or 0
+    from .platform_stats import latest_stats, stats_rows, window_sums
+    
+    # Revenue analytics (monthly recurring revenue from the daily rollup)
+    stats = latest_stats()
+    monthly_revenue = stats.mrr
     
     annual_revenue = monthly_revenue * 12
     
     # Subscription statistics
-    total_subscriptions = CompanySubscription.objects.count()
-    active_subscriptions = CompanySubscription.objects.filter(status='ACTIVE').count()
-    trial_subscriptions = CompanySubscription.objects.filter(status='TRIAL').count()
-    expired_subscriptions = CompanySubscription.objects.filter(status='EXPIRED').count()
+    status_counts = CompanySubscription.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='ACTIVE')),
+        trial=Count('id', filter=Q(status='TRIAL')),
+        expired=Count('id', filter=Q(status='EXPIRED')),
+    )
+    total_subscriptions = status_counts['total']
+    active_subscriptions = status_counts['active']
+    trial_subscriptions = status_counts['trial']
+    expired_subscriptions = status_counts['expired']
     
     # Plan popularity
     plan_stats = SubscriptionPlan.objects.annotate(
@@ -7092,17 +6714,16 @@ def subscription_analytics(request):
     ).order_by('-subscription_count')
     
     # Monthly growth
-    current_month = timezone.now().replace(day=1)
+    current_month = stats.date.replace(day=1)
     last_month = (current_month - timedelta(days=1)).replace(day=1)
     
-    current_month_subscriptions = CompanySubscription.objects.filter(
-        created_at__gte=current_month
-    ).count()
-    
-    last_month_subscriptions = CompanySubscription.objects.filter(
-        created_at__gte=last_month,
-        created_at__lt=current_month
-    ).count()
+    current, previous = window_sums(
+        stats_rows(last_month, stats.date),
+        [(current_month, stats.date), (last_month, current_month - timedelta(days=1))],
+        ['new_subscriptions']
+    )
+    current_month_subscriptions = current['new_subscriptions']
+    last_month_subscriptions = previous['new_subscriptions']
     
     growth_rate = 0
     if last_month_subscriptions > 0:
@@ -7458,13 +7079,10 @@ def payment_page(request):
 
 # Performance Management Views
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def performance_dashboard(request):
     """Performance management dashboard"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get performance overview data
     total_employees = Employee.objects.filter(company=company).count()
@@ -7479,17 +7097,17 @@ def performance_dashboard(request):
     ).count()
     
     active_goals = PerformanceGoal.objects.filter(
-        employee__company=company,
+        company=company,
         status__in=['NOT_STARTED', 'IN_PROGRESS']
     ).count()
     
     completed_goals = PerformanceGoal.objects.filter(
-        employee__company=company,
+        company=company,
         status='COMPLETED'
     ).count()
     
     overdue_goals = PerformanceGoal.objects.filter(
-        employee__company=company,
+        company=company,
         status__in=['NOT_STARTED', 'IN_PROGRESS'],
         target_date__lt=timezone.now().date()
     ).count()
@@ -7501,12 +7119,12 @@ def performance_dashboard(request):
     
     # Recent goals
     recent_goals = PerformanceGoal.objects.filter(
-        employee__company=company
+        company=company
     ).order_by('-created_at')[:5]
     
     # Performance metrics by department
     department_performance = PerformanceMetric.objects.filter(
-        employee__company=company
+        company=company
     ).values('employee__department').annotate(
         avg_value=Avg('value'),
         total_metrics=Count('id')
@@ -7529,13 +7147,10 @@ def performance_dashboard(request):
     return render(request, 'core/performance_dashboard.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def performance_reviews(request):
     """Performance reviews management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     status_filter = request.GET.get('status', '')
@@ -7576,13 +7191,10 @@ def performance_reviews(request):
     return render(request, 'core/performance_reviews.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def performance_goals(request):
     """Performance goals management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     status_filter = request.GET.get('status', '')
@@ -7591,7 +7203,7 @@ def performance_goals(request):
     overdue_filter = request.GET.get('overdue', '')
     
     # Base queryset
-    goals = PerformanceGoal.objects.filter(employee__company=company)
+    goals = PerformanceGoal.objects.filter(company=company)
     
     # Apply filters
     if status_filter:
@@ -7630,13 +7242,10 @@ def performance_goals(request):
     return render(request, 'core/performance_goals.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def performance_feedback(request):
     """360-degree feedback management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     feedback_type_filter = request.GET.get('feedback_type', '')
@@ -7677,13 +7286,10 @@ def performance_feedback(request):
     return render(request, 'core/performance_feedback.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def performance_reports(request):
     """Performance reports and analytics"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     report_type_filter = request.GET.get('report_type', '')
@@ -7716,13 +7322,10 @@ def performance_reports(request):
     return render(request, 'core/performance_reports.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def employee_performance_detail(request, employee_id):
     """Individual employee performance detail"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     employee = get_object_or_404(Employee, id=employee_id, company=company)
     
     # Get employee's performance data
@@ -7763,13 +7366,10 @@ def employee_performance_detail(request, employee_id):
 
 # Attendance Management Views
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def attendance_dashboard(request):
     """Attendance management dashboard"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get attendance overview data
     total_employees = Employee.objects.filter(company=company).count()
@@ -7777,7 +7377,7 @@ def attendance_dashboard(request):
     
     # Today's attendance
     today_attendance = Attendance.objects.filter(
-        employee__company=company,
+        company=company,
         date=today
     )
     
@@ -7794,13 +7394,13 @@ def attendance_dashboard(request):
     
     # Recent attendance records
     recent_attendance = Attendance.objects.filter(
-        employee__company=company
+        company=company
     ).order_by('-date', '-clock_in')[:10]
     
     # Attendance statistics for the month
     month_start = today.replace(day=1)
     month_attendance = Attendance.objects.filter(
-        employee__company=company,
+        company=company,
         date__gte=month_start,
         date__lte=today
     )
@@ -7812,13 +7412,13 @@ def attendance_dashboard(request):
     
     # Pending leave requests
     pending_leaves = LeaveRequest.objects.filter(
-        employee__company=company,
+        company=company,
         status='PENDING'
     ).count()
     
     # Upcoming leaves
     upcoming_leaves = LeaveRequest.objects.filter(
-        employee__company=company,
+        company=company,
         status='APPROVED',
         start_date__gte=today
     ).order_by('start_date')[:5]
@@ -7842,13 +7442,10 @@ def attendance_dashboard(request):
     return render(request, 'core/attendance_dashboard.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def attendance_records(request):
     """Attendance records management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     employee_filter = request.GET.get('employee', '')
@@ -7857,7 +7454,7 @@ def attendance_records(request):
     date_to = request.GET.get('date_to', '')
     
     # Base queryset
-    attendance_records = Attendance.objects.filter(employee__company=company)
+    attendance_records = Attendance.objects.filter(company=company)
     
     # Apply filters
     if employee_filter:
@@ -7892,13 +7489,10 @@ def attendance_records(request):
     return render(request, 'core/attendance_records.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def leave_management(request):
     """Leave management system"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     employee_filter = request.GET.get('employee', '')
@@ -7909,7 +7503,7 @@ def leave_management(request):
     
     # Force fresh database query - no caching for real-time data
     # Base queryset - always fresh from database
-    leave_requests = LeaveRequest.objects.filter(employee__company=company).select_related('employee')
+    leave_requests = LeaveRequest.objects.filter(company=company).select_related('employee')
     
     # Apply filters
     if employee_filter:
@@ -7935,7 +7529,7 @@ def leave_management(request):
     employees = Employee.objects.filter(company=company).order_by('first_name', 'last_name')
     
     # Calculate statistics
-    all_leave_requests = LeaveRequest.objects.filter(employee__company=company)
+    all_leave_requests = LeaveRequest.objects.filter(company=company)
     total_requests = all_leave_requests.count()
     pending_requests = all_leave_requests.filter(status='PENDING').count()
     approved_requests = all_leave_requests.filter(status='APPROVED').count()
@@ -7988,18 +7582,15 @@ def leave_management(request):
     return render(request, 'core/leave_management.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def leave_request_details(request, request_id):
     """View detailed information about a specific leave request"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     try:
         leave_request = LeaveRequest.objects.get(
             id=request_id,
-            employee__company=company
+            company=company
         )
         
         context = {
@@ -8014,18 +7605,15 @@ def leave_request_details(request, request_id):
         return redirect('core:leave_management')
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def edit_leave_request(request, request_id):
     """Edit a specific leave request"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     try:
         leave_request = LeaveRequest.objects.get(
             id=request_id,
-            employee__company=company
+            company=company
         )
     except LeaveRequest.DoesNotExist:
         messages.error(request, 'Leave request not found.')
@@ -8074,13 +7662,10 @@ def edit_leave_request(request, request_id):
     return render(request, 'core/edit_leave_request.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def timesheet_management(request):
     """Timesheet management system"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     employee_filter = request.GET.get('employee', '')
@@ -8090,7 +7675,7 @@ def timesheet_management(request):
     date_to = request.GET.get('date_to', '')
     
     # Base queryset
-    timesheets = Timesheet.objects.filter(employee__company=company)
+    timesheets = Timesheet.objects.filter(company=company)
     
     # Apply filters
     if employee_filter:
@@ -8130,13 +7715,10 @@ def timesheet_management(request):
     return render(request, 'core/timesheet_management.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def shift_management(request):
     """Shift management system"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get shifts
     shifts = Shift.objects.filter(company=company).order_by('start_time')
@@ -8162,13 +7744,10 @@ def shift_management(request):
     return render(request, 'core/shift_management.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def employee_attendance_detail(request, employee_id):
     """Individual employee attendance detail"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     employee = get_object_or_404(Employee, id=employee_id, company=company)
     
     # Get employee's attendance data
@@ -8218,13 +7797,10 @@ def employee_attendance_detail(request, employee_id):
 
 # Notification Management Views
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def notification_center(request):
     """Notification center for managing all notifications"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     notification_type_filter = request.GET.get('type', '')
@@ -8285,13 +7861,10 @@ def notification_center(request):
     return render(request, 'core/notification_center.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def notification_templates(request):
     """Notification templates management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get templates
     templates = NotificationTemplate.objects.all().order_by('template_type')
@@ -8318,13 +7891,10 @@ def notification_templates(request):
     return render(request, 'core/notification_templates.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def notification_preferences(request):
     """User notification preferences"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get or create user preferences
     preferences, created = NotificationPreference.objects.get_or_create(
@@ -8395,13 +7965,10 @@ def notification_preferences(request):
     return render(request, 'core/notification_preferences.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def notification_digests(request):
     """Notification digests management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     digest_type_filter = request.GET.get('type', '')
@@ -8451,13 +8018,10 @@ def notification_digests(request):
     return render(request, 'core/notification_digests.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def create_notification(request):
     """Create new notification"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     if request.method == 'POST':
         # Create notification
@@ -8507,127 +8071,64 @@ def create_notification(request):
     return render(request, 'core/create_notification.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def notification_analytics(request):
     """Notification analytics and insights"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
-    
-    # Get analytics data
-    total_notifications = Notification.objects.filter(company=company).count()
-    read_notifications = Notification.objects.filter(company=company, is_read=True).count()
-    unread_notifications = Notification.objects.filter(company=company, is_read=False).count()
-    
-    # Notification types distribution
-    type_distribution = Notification.objects.filter(company=company).values('notification_type').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Priority distribution
-    priority_distribution = Notification.objects.filter(company=company).values('priority').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Channel distribution
-    channel_distribution = Notification.objects.filter(company=company).values('channel').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Monthly trends
-    monthly_trends = Notification.objects.filter(company=company).extra(
-        select={'month': "strftime('%%Y-%%m', created_at) || '-01'"}
-    ).values('month').annotate(
-        count=Count('id')
-    ).order_by('month')
-    
-    # Read rate by type
-    read_rate_by_type = []
-    for notification_type in Notification.NOTIFICATION_TYPES:
-        type_code = notification_type[0]
-        total = Notification.objects.filter(company=company, notification_type=type_code).count()
-        read = Notification.objects.filter(company=company, notification_type=type_code, is_read=True).count()
-        read_rate = (read / total * 100) if total > 0 else 0
-        read_rate_by_type.append({
-            'type': notification_type[1],
-            'total': total,
-            'read': read,
-            'read_rate': read_rate
-        })
+    company = request.company
     
     context = {
         'title': 'Notification Analytics',
         'company': company,
-        'total_notifications': total_notifications,
-        'read_notifications': read_notifications,
-        'unread_notifications': unread_notifications,
-        'type_distribution': type_distribution,
-        'priority_distribution': priority_distribution,
-        'channel_distribution': channel_distribution,
-        'monthly_trends': monthly_trends,
-        'read_rate_by_type': read_rate_by_type,
+        **notification_stats(company),
     }
     
     return render(request, 'core/notification_analytics.html', context)
 
 # Onboarding Management Views
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def onboarding_dashboard(request):
     """Onboarding management dashboard"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
+    company = request.company
     
-    company = request.user.company_admin_profile.company
+    from .onboarding import OPEN_STATUSES, assignment_counts, completion_rate
     
     # Get onboarding overview data
     total_workflows = OnboardingWorkflow.objects.filter(company=company).count()
-    active_assignments = OnboardingAssignment.objects.filter(
-        workflow__company=company,
-        status__in=['NOT_STARTED', 'IN_PROGRESS', 'PENDING_APPROVAL']
-    ).count()
-    completed_assignments = OnboardingAssignment.objects.filter(
-        workflow__company=company,
-        status='COMPLETED'
-    ).count()
-    overdue_assignments = OnboardingAssignment.objects.filter(
-        workflow__company=company,
-        status__in=['NOT_STARTED', 'IN_PROGRESS', 'PENDING_APPROVAL']
-    ).filter(due_date__lt=timezone.now()).count()
+    assignment_totals = OnboardingAssignment.objects.filter(workflow__company=company).aggregate(
+        active=Count('id', filter=Q(status__in=OPEN_STATUSES)),
+        completed=Count('id', filter=Q(status='COMPLETED')),
+        overdue=Count('id', filter=Q(status__in=OPEN_STATUSES, due_date__lt=timezone.now())),
+    )
     
     # Recent onboarding assignments
     recent_assignments = OnboardingAssignment.objects.filter(
         workflow__company=company
-    ).order_by('-assigned_at')[:10]
+    ).select_related('employee', 'workflow').order_by('-assigned_at')[:10]
     
     # Onboarding statistics
     onboarding_stats = {
         'total_workflows': total_workflows,
-        'active_assignments': active_assignments,
-        'completed_assignments': completed_assignments,
-        'overdue_assignments': overdue_assignments,
+        'active_assignments': assignment_totals['active'],
+        'completed_assignments': assignment_totals['completed'],
+        'overdue_assignments': assignment_totals['overdue'],
     }
     
     # Workflow performance
-    workflow_performance = []
-    for workflow in OnboardingWorkflow.objects.filter(company=company, status='ACTIVE'):
-        assignments = OnboardingAssignment.objects.filter(workflow=workflow)
-        total_assigned = assignments.count()
-        completed = assignments.filter(status='COMPLETED').count()
-        completion_rate = (completed / total_assigned * 100) if total_assigned > 0 else 0
-        
-        workflow_performance.append({
+    workflow_performance = [
+        {
             'workflow': workflow,
-            'total_assigned': total_assigned,
-            'completed': completed,
-            'completion_rate': completion_rate,
+            'total_assigned': workflow.total_assigned,
+            'completed': workflow.completed_count,
+            'completion_rate': completion_rate(workflow),
             'avg_duration': workflow.estimated_duration_days,
-        })
+        }
+        for workflow in assignment_counts(OnboardingWorkflow.objects.filter(company=company, status='ACTIVE'))
+    ]
     
     # Pending approvals
     pending_approvals = OnboardingTaskAssignment.objects.filter(
-        onboarding_assignment__workflow__company=company,
+        company=company,
         status='PENDING_APPROVAL'
     ).order_by('-created_at')[:5]
     
@@ -8650,18 +8151,17 @@ def onboarding_dashboard(request):
     return render(request, 'core/onboarding_dashboard.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def onboarding_workflows(request):
     """Onboarding workflows management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     workflow_type_filter = request.GET.get('type', '')
     status_filter = request.GET.get('status', '')
     
+    from .onboarding import assignment_counts, completion_rate
+    
     # Base queryset
     workflows = OnboardingWorkflow.objects.filter(company=company)
     
@@ -8672,25 +8172,21 @@ def onboarding_workflows(request):
         workflows = workflows.filter(status=status_filter)
     
     # Pagination
-    paginator = Paginator(workflows, 20)
+    paginator = Paginator(assignment_counts(workflows), 20)
     page_number = request.GET.get('page')
     workflows = paginator.get_page(page_number)
     
     # Get workflow statistics
-    workflow_stats = []
-    for workflow in workflows:
-        assignments = OnboardingAssignment.objects.filter(workflow=workflow)
-        total_assigned = assignments.count()
-        completed = assignments.filter(status='COMPLETED').count()
-        in_progress = assignments.filter(status='IN_PROGRESS').count()
-        
-        workflow_stats.append({
+    workflow_stats = [
+        {
             'workflow': workflow,
-            'total_assigned': total_assigned,
-            'completed': completed,
-            'in_progress': in_progress,
-            'completion_rate': (completed / total_assigned * 100) if total_assigned > 0 else 0,
-        })
+            'total_assigned': workflow.total_assigned,
+            'completed': workflow.completed_count,
+            'in_progress': workflow.in_progress_count,
+            'completion_rate': completion_rate(workflow),
+        }
+        for workflow in workflows
+    ]
     
     context = {
         'title': 'Onboarding Workflows',
@@ -8706,13 +8202,10 @@ def onboarding_workflows(request):
     return render(request, 'core/onboarding_workflows.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def onboarding_assignments(request):
     """Onboarding assignments management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     employee_filter = request.GET.get('employee', '')
@@ -8762,13 +8255,10 @@ def onboarding_assignments(request):
     return render(request, 'core/onboarding_assignments.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def onboarding_tasks(request):
     """Onboarding tasks management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     workflow_filter = request.GET.get('workflow', '')
@@ -8809,13 +8299,10 @@ def onboarding_tasks(request):
     return render(request, 'core/onboarding_tasks.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def onboarding_documents(request):
     """Onboarding documents management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     document_type_filter = request.GET.get('document_type', '')
@@ -8851,56 +8338,67 @@ def onboarding_documents(request):
     return render(request, 'core/onboarding_documents.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def onboarding_assign_workflow(request):
-    """Assign onboarding workflow to employee"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    """Assign onboarding workflow to employees, a department or a hiring cohort"""
+    company = request.company
     
     if request.method == 'POST':
-        employee_id = request.POST.get('employee')
+        from .onboarding import assign_workflow
+        from .onboarding_graph import TaskCycleError
+        
+        employee_ids = request.POST.getlist('employees') or request.POST.getlist('employee')
+        department = request.POST.get('department', '').strip()
+        joined_from = request.POST.get('joined_from', '')
+        joined_to = request.POST.get('joined_to', '')
         workflow_id = request.POST.get('workflow')
         due_date = request.POST.get('due_date')
         notes = request.POST.get('notes', '')
         
         try:
-            employee = Employee.objects.get(id=employee_id, company=company)
             workflow = OnboardingWorkflow.objects.get(id=workflow_id, company=company)
             
-            # Check if employee already has this workflow assigned
-            existing_assignment = OnboardingAssignment.objects.filter(
-                employee=employee,
-                workflow=workflow
-            ).first()
-            
-            if existing_assignment:
-                messages.warning(request, f'{employee.first_name} {employee.last_name} already has this workflow assigned.')
+            # Employees picked one by one, a whole department, or a cohort by join date
+            selection = Q()
+            if employee_ids:
+                selection |= Q(id__in=employee_ids)
+            if department:
+                selection |= Q(department=department)
+            if joined_from or joined_to:
+                cohort = Q()
+                if joined_from:
+                    cohort &= Q(created_at__date__gte=joined_from)
+                if joined_to:
+                    cohort &= Q(created_at__date__lte=joined_to)
+                selection |= cohort
+            if not selection:
+                messages.error(request, 'Select employees, a department or a joining date range.')
                 return redirect('core:onboarding_assign_workflow')
             
-            # Create assignment
-            assignment = OnboardingAssignment.objects.create(
-                employee=employee,
-                workflow=workflow,
-                assigned_by=request.user,
-                due_date=due_date or None,
-                notes=notes,
+            employees = Employee.objects.filter(selection, company=company)
+            assignments, skipped = assign_workflow(
+                workflow, employees, assigned_by=request.user, due_date=due_date or None, notes=notes,
             )
             
-            # Create task assignments
-            for task in workflow.workflow_tasks.all():
-                OnboardingTaskAssignment.objects.create(
-                    onboarding_assignment=assignment,
-                    task=task,
-                    due_date=due_date or None,
-                )
+            if not assignments:
+                if skipped:
+                    messages.warning(request, 'The selected employees already have this workflow assigned.')
+                else:
+                    messages.error(request, 'No employees match the selection.')
+                return redirect('core:onboarding_assign_workflow')
             
-            messages.success(request, f'Onboarding workflow assigned to {employee.first_name} {employee.last_name} successfully!')
+            message = f'Onboarding workflow assigned to {len(assignments)} employee(s) successfully!'
+            if skipped:
+                message += f' {skipped} already had it.'
+            messages.success(request, message)
             return redirect('core:onboarding_assignments')
             
-        except (Employee.DoesNotExist, OnboardingWorkflow.DoesNotExist):
+        except TaskCycleError:
+            messages.error(request, 'The tasks of this workflow depend on each other in a cycle.')
+            return redirect('core:onboarding_assign_workflow')
+        except (OnboardingWorkflow.DoesNotExist, ValueError, ValidationError):
             messages.error(request, 'Invalid employee or workflow selected.')
+            return redirect('core:onboarding_assign_workflow')
     
     # Get employees and workflows for assignment
     employees = Employee.objects.filter(company=company).order_by('first_name', 'last_name')
@@ -8916,13 +8414,10 @@ def onboarding_assign_workflow(request):
     return render(request, 'core/onboarding_assign_workflow.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def employee_onboarding_detail(request, employee_id):
     """Individual employee onboarding detail"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     employee = get_object_or_404(Employee, id=employee_id, company=company)
     
     # Get employee's onboarding assignments
@@ -8970,13 +8465,10 @@ def employee_onboarding_detail(request, employee_id):
 
 # Document Management Views
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def document_library(request):
     """Document library management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     category_filter = request.GET.get('category', '')
@@ -9050,13 +8542,10 @@ def document_library(request):
     return render(request, 'core/document_library.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def document_categories(request):
     """Document categories management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get categories with document counts
     categories = DocumentCategory.objects.filter(company=company).order_by('sort_order', 'name')
@@ -9082,13 +8571,10 @@ def document_categories(request):
     return render(request, 'core/document_categories.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def document_templates(request):
     """Document templates management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     template_type_filter = request.GET.get('template_type', '')
@@ -9133,13 +8619,10 @@ def document_templates(request):
     return render(request, 'core/document_templates.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def document_sharing(request):
     """Document sharing management"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get filter parameters
     document_filter = request.GET.get('document', '')
@@ -9200,13 +8683,10 @@ def document_sharing(request):
     return render(request, 'core/document_sharing.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def document_analytics(request):
     """Document analytics and insights"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     # Get analytics data
     total_documents = Document.objects.filter(company=company, is_archived=False).count()
@@ -9264,13 +8744,10 @@ def document_analytics(request):
     return render(request, 'core/document_analytics.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def upload_document(request):
     """Upload new document"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     
     if request.method == 'POST':
         # Get form data
@@ -9283,14 +8760,22 @@ def upload_document(request):
         keywords = request.POST.get('keywords', '')
         expires_at = request.POST.get('expires_at')
         
-        # Get uploaded file
+        # Get uploaded file, either posted with the form or sent through the resumable upload API
         file = request.FILES.get('file')
+        upload = None
+        if not file and request.POST.get('upload_id'):
+            upload = get_upload(request.user, request.POST['upload_id'], status='COMPLETE')
+            if upload and upload.purpose != 'DOCUMENT':
+                upload = None
         
-        if not file or not title:
+        if not (file or upload) or not title:
             messages.error(request, 'Please provide a title and select a file.')
             return redirect('core:upload_document')
         
         try:
+            # Stored once per distinct content (hashed while it is written), see core.blobs
+            blob = None if upload else store_upload(file)
+            
             # Create document
             document = Document.objects.create(
                 company=company,
@@ -9298,14 +8783,17 @@ def upload_document(request):
                 description=description,
                 document_type=document_type,
                 access_level=access_level,
-                file=file,
-                file_name=file.name,
-                file_size=file.size,
-                file_type=file.content_type,
+                file=upload.file.name if upload else blob.name,
+                file_name=upload.filename if upload else file.name,
+                file_size=upload.size if upload else file.size,
+                file_type=upload.content_type if upload else file.content_type,
+                file_hash=upload.sha256 if upload else blob.sha256,
                 uploaded_by=request.user,
                 keywords=keywords,
                 expires_at=expires_at or None,
             )
+            if upload:
+                mark_attached(upload)
             
             # Set category
             if category_id:
@@ -9350,13 +8838,10 @@ def upload_document(request):
     return render(request, 'core/upload_document.html', context)
 
 @login_required
+@role_required('company_admin', 'Access denied. Company admin access required.')
 def document_detail(request, document_id):
     """Document detail view"""
-    if not hasattr(request.user, 'company_admin_profile'):
-        messages.error(request, 'Access denied. Company admin access required.')
-        return redirect('core:home')
-    
-    company = request.user.company_admin_profile.company
+    company = request.company
     document = get_object_or_404(Document, id=document_id, company=company)
     
     # Check access permissions
@@ -9685,83 +9170,24 @@ def bulk_company_operations(request):
         if not operation or not company_ids:
             return JsonResponse({'error': 'Missing operation or company IDs'}, status=400)
         
-        companies = Company.objects.filter(id__in=company_ids)
-        results = {'success': 0, 'failed': 0, 'errors': []}
+        from .bulk_operations import COMPANY_OPERATIONS
+        if operation not in COMPANY_OPERATIONS:
+            return JsonResponse({'error': f'Unknown operation: {operation}'}, status=400)
         
-        for company in companies:
-            try:
-                if operation == 'activate':
-                    company.is_active = True
-                    company.save()
-                    results['success'] += 1
-                    
-                elif operation == 'deactivate':
-                    company.is_active = False
-                    company.save()
-                    results['success'] += 1
-                    
-                elif operation == 'suspend':
-                    company.status = 'suspended'
-                    company.save()
-                    results['success'] += 1
-                    
-                elif operation == 'change_plan':
-                    new_plan = params.get('plan')
-                    if new_plan:
-                        company.subscription_plan = new_plan
-                        company.save()
-                        results['success'] += 1
-                    else:
-                        results['failed'] += 1
-                        results['errors'].append(f'No plan specified for {company.name}')
-                        
-                elif operation == 'extend_trial':
-                    days = params.get('days', 30)
-                    if hasattr(company, 'trial_end_date') and company.trial_end_date:
-                        company.trial_end_date += timedelta(days=days)
-                    else:
-                        company.trial_end_date = timezone.now().date() + timedelta(days=days)
-                    company.save()
-                    results['success'] += 1
-                    
-                elif operation == 'apply_discount':
-                    discount = params.get('discount', 0)
-                    # Apply discount logic here
-                    # This would typically involve creating a discount record
-                    results['success'] += 1
-                    
-                elif operation == 'send_notification':
-                    subject = params.get('subject', '')
-                    message = params.get('message', '')
-                    notification_type = params.get('type', 'info')
-                    
-                    # Create notification for company admin
-                    admin_user = company.admin_user if hasattr(company, 'admin_user') else None
-                    if admin_user:
-                        # Create notification logic here
-                        results['success'] += 1
-                    else:
-                        results['failed'] += 1
-                        results['errors'].append(f'No admin user for {company.name}')
-                        
-                elif operation == 'delete':
-                    company_name = company.name
-                    company.delete()
-                    results['success'] += 1
-                    
-                else:
-                    results['failed'] += 1
-                    results['errors'].append(f'Unknown operation: {operation}')
-                    
-            except Exception as e:
-                results['failed'] += 1
-                results['errors'].append(f'Error processing {company.name}: {str(e)}')
+        job = enqueue('bulk_company_operations', {
+            'operation': operation,
+            'company_ids': company_ids,
+            'params': params,
+            'user_id': request.user.id,
+            'ip_address': request.META.get('REMOTE_ADDR'),
+        }, user=request.user)
         
         return JsonResponse({
             'success': True,
-            'results': results,
-            'message': f'Operation completed: {results["success"]} successful, {results["failed"]} failed'
-        })
+            'job_id': job.id,
+            'status_url': f'/api/jobs/{job.id}/',
+            'message': f'Bulk {operation} of {len(company_ids)} companies started'
+        }, status=202)
         
     except Exception as e:
         return JsonResponse({
@@ -9986,6 +9412,8 @@ def analytics_growth_data(request):
 @user_passes_test(lambda u: u.is_superuser)
 def analytics_revenue_data(request):
     """Get revenue analytics data for the specified date range"""
+    from .revenue import mrr_series, revenue_summary
+    
     try:
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
@@ -9996,52 +9424,31 @@ def analytics_revenue_data(request):
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # Get daily revenue data (simplified calculation)
-        revenue_data = []
-        labels = []
-        
-        current_date = start_date
-        while current_date <= end_date:
-            # Calculate daily revenue based on active subscriptions
-            daily_revenue = 0
-            active_companies = Company.objects.filter(
-                is_active=True,
-                created_at__date__lte=current_date
-            )
-            
-            for company in active_companies:
-                # Simplified revenue calculation
-                if company.subscription_plan == 'basic':
-                    daily_revenue += 29  # $29/month
-                elif company.subscription_plan == 'premium':
-                    daily_revenue += 99  # $99/month
-                elif company.subscription_plan == 'enterprise':
-                    daily_revenue += 299  # $299/month
-            
-            labels.append(current_date.strftime('%Y-%m-%d'))
-            revenue_data.append(daily_revenue)
-            
-            current_date += timedelta(days=1)
-        
-        # Calculate metrics
-        total_revenue = sum(revenue_data)
-        active_companies_count = Company.objects.filter(is_active=True).count()
+        if end_date < start_date:
+            return JsonResponse({'error': 'End date must not be before start date'}, status=400)
         
-        # Calculate ARPU (Average Revenue Per User)
-        arpu = total_revenue / max(active_companies_count, 1) if active_companies_count > 0 else 0
+        # Daily MRR and the period's revenue figures (one query each)
+        series = mrr_series(start_date, end_date)
+        labels = [day.strftime('%Y-%m-%d') for day, mrr in series]
+        revenue_data = [round(float(mrr), 2) for day, mrr in series]
+        summary = revenue_summary(start_date, end_date)
         
-        # Calculate MRR growth (simplified)
-        current_mrr = revenue_data[-1] * 30 if revenue_data else 0
-        previous_mrr = revenue_data[0] * 30 if revenue_data else 0
-        mrr_growth = current_mrr - previous_mrr
+        arpu = float(summary['arpu'])
+        mrr_growth = float(summary['mrr'] - summary['mrr_start'])
         
-        # Calculate LTV (simplified)
-        ltv = arpu * 12  # Assuming 12 month average lifetime
+        # LTV: ARPU over the monthly churn rate, or a 12 month lifetime when nobody churned
+        period_days = (end_date - start_date).days + 1
+        monthly_churn = summary['churn_rate'] / 100 * 30 / period_days
+        ltv = arpu / monthly_churn if monthly_churn > 0 else arpu * 12
         
         response_data = {
+            'mrr': round(float(summary['mrr']), 2),
+            'arr': round(float(summary['arr']), 2),
             'mrr_growth': round(mrr_growth, 0),
             'arpu': round(arpu, 0),
             'ltv': round(ltv, 0),
+            'churn_rate': round(summary['churn_rate'], 1),
+            'revenue': round(float(summary['revenue']), 2),
             'chart_data': {
                 'labels': labels,
                 'revenue': revenue_data
@@ -10057,6 +9464,9 @@ def analytics_revenue_data(request):
 @user_passes_test(lambda u: u.is_superuser)
 def analytics_predictive_data(request):
     """Get predictive analytics data"""
+    from .forecasting import ForecastUnavailable, forecast_series, monthly_sums
+    from .platform_stats import ensure_rollups
+    
     try:
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
@@ -10064,58 +9474,88 @@ def analytics_predictive_data(request):
         if not start_date or not end_date:
             return JsonResponse({'error': 'Start date and end date are required'}, status=400)
         
-        # Get historical data for the last 6 months
-        historical_data = []
-        predicted_data = []
-        labels = []
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # Generate historical data (last 6 months)
-        for i in range(6):
-            month_start = datetime.now().replace(day=1) - timedelta(days=30*i)
-            month_end = month_start + timedelta(days=30)
-            
-            companies_count = Company.objects.filter(
-                created_at__date__range=[month_start.date(), month_end.date()]
-            ).count()
-            
-            labels.insert(0, month_start.strftime('%B %Y'))
-            historical_data.insert(0, companies_count)
-        
-        # Simple prediction based on trend
-        if len(historical_data) >= 2:
-            trend = (historical_data[-1] - historical_data[-2])
-            predicted_growth = historical_data[-1] + trend
-            predicted_revenue = predicted_growth * 150  # Assuming $150 average per company
-        else:
-            predicted_growth = 0
-            predicted_revenue = 0
+        if end_date < start_date:
+            return JsonResponse({'error': 'End date must not be before start date'}, status=400)
         
-        # Add predicted data points
-        predicted_data = [None] * 4 + [historical_data[-1] + trend, historical_data[-1] + trend * 2]
+        # Forecast the next 3 months from the daily rollup of the selected range
+        horizon = 90
+        ensure_rollups()
+        try:
+            companies = forecast_series('total_companies', start_date, end_date, horizon)
+            revenue = forecast_series('mrr', start_date, end_date, horizon)
+            new_companies = forecast_series('new_companies', start_date, end_date, horizon)
+        except ForecastUnavailable as e:
+            return JsonResponse({'error': str(e)}, status=503)
+        
+        current_companies = companies['history'][-1] if companies['history'] else 0
+        predicted_companies = companies['forecast'][-1]
+        predicted_growth = ((predicted_companies - current_companies) / current_companies * 100) if current_companies else 0
+        predicted_revenue = revenue['forecast'][-1]
+        
+        # Risk: High if the forecast declines, Low if even the lower bound does not
+        current_mrr = revenue['history'][-1] if revenue['history'] else 0
+        if current_mrr > 0:
+            baseline, predicted, lower = current_mrr, predicted_revenue, revenue['lower'][-1]
+        else:
+            baseline, predicted, lower = current_companies, predicted_companies, companies['lower'][-1]
         
-        # Calculate risk score based on growth trend
-        if len(historical_data) >= 3:
-            recent_trend = sum(historical_data[-3:]) / 3
-            overall_trend = sum(historical_data) / len(historical_data)
-            risk_ratio = recent_trend / max(overall_trend, 1)
-            
-            if risk_ratio > 1.2:
-                risk_score = 'Low'
-            elif risk_ratio > 0.8:
-                risk_score = 'Medium'
-            else:
-                risk_score = 'High'
+        if baseline and predicted < baseline:
+            risk_score = 'High'
+        elif baseline and lower >= baseline:
+            risk_score = 'Low'
         else:
             risk_score = 'Medium'
         
+        # Chart: new companies per month, then the forecast months
+        history = monthly_sums(new_companies['start'], new_companies['history'])
+        predicted_months = [
+            (month, total, low, high)
+            for (month, total), (_, low), (_, high) in zip(
+                monthly_sums(new_companies['forecast_start'], new_companies['forecast']),
+                monthly_sums(new_companies['forecast_start'], new_companies['lower']),
+                monthly_sums(new_companies['forecast_start'], new_companies['upper']),
+            )
+        ]
+        # A month split between history and forecast adds the forecast days to its history
+        labels = [month.strftime('%B %Y') for month, _ in history]
+        historical_data = [round(total, 1) for _, total in history]
+        predicted_data = [None] * len(history)
+        predicted_lower = [None] * len(history)
+        predicted_upper = [None] * len(history)
+        if history:
+            # Start the forecast line at the last historical point
+            predicted_data[-1] = historical_data[-1]
+        for month, total, low, high in predicted_months:
+            label = month.strftime('%B %Y')
+            if labels and labels[-1] == label:
+                predicted_data[-1] = round(historical_data[-1] + total, 1)
+                predicted_lower[-1] = round(historical_data[-1] + low, 1)
+                predicted_upper[-1] = round(historical_data[-1] + high, 1)
+                continue
+            labels.append(label)
+            historical_data.append(None)
+            predicted_data.append(round(total, 1))
+            predicted_lower.append(round(low, 1))
+            predicted_upper.append(round(high, 1))
+        
         response_data = {
-            'predicted_growth': round(abs(trend), 1) if trend else 0,
+            'predicted_growth': round(predicted_growth, 1),
             'predicted_revenue': round(predicted_revenue, 0),
             'risk_score': risk_score,
+            'method': {'companies': companies['method'], 'revenue': revenue['method']},
+            'confidence_band': {
+                'companies': [companies['lower'][-1], companies['upper'][-1]],
+                'revenue': [revenue['lower'][-1], revenue['upper'][-1]],
+            },
             'chart_data': {
                 'labels': labels,
                 'historical': historical_data,
-                'predicted': predicted_data
+                'predicted': predicted_data,
+                'predicted_lower': predicted_lower,
+                'predicted_upper': predicted_upper,
             }
         }
         
@@ -10128,6 +9568,8 @@ def analytics_predictive_data(request):
 @user_passes_test(lambda u: u.is_superuser)
 def analytics_comparative_data(request):
     """Get comparative analytics data"""
+    from .platform_stats import ensure_rollups, stats_rows, window_sums
+    
     try:
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
@@ -10140,57 +9582,24 @@ def analytics_comparative_data(request):
         
         # Calculate period length
         period_length = (end_date - start_date).days
-        
-        # Current period data
-        current_companies = Company.objects.filter(
-            created_at__date__range=[start_date, end_date]
-        ).count()
-        
-        current_users = User.objects.filter(
-            date_joined__date__range=[start_date, end_date]
-        ).count()
-        
-        # Calculate current revenue
-        current_revenue = 0
-        active_companies = Company.objects.filter(
-            is_active=True,
-            created_at__date__range=[start_date, end_date]
-        )
-        
-        for company in active_companies:
-            if company.subscription_plan == 'basic':
-                current_revenue += 29 * period_length
-            elif company.subscription_plan == 'premium':
-                current_revenue += 99 * period_length
-            elif company.subscription_plan == 'enterprise':
-                current_revenue += 299 * period_length
-        
-        # Previous period data
         prev_start = start_date - timedelta(days=period_length)
         prev_end = start_date - timedelta(days=1)
         
-        previous_companies = Company.objects.filter(
-            created_at__date__range=[prev_start, prev_end]
-        ).count()
-        
-        previous_users = User.objects.filter(
-            date_joined__date__range=[prev_start, prev_end]
-        ).count()
-        
-        # Calculate previous revenue
-        previous_revenue = 0
-        prev_active_companies = Company.objects.filter(
-            is_active=True,
-            created_at__date__range=[prev_start, prev_end]
+        # New companies and users, and revenue earned (daily MRR / 30), from the daily rollup
+        ensure_rollups()
+        current, previous = window_sums(
+            stats_rows(prev_start, end_date),
+            [(start_date, end_date), (prev_start, prev_end)],
+            ['new_companies', 'new_users', 'mrr']
         )
         
-        for company in prev_active_companies:
-            if company.subscription_plan == 'basic':
-                previous_revenue += 29 * period_length
-            elif company.subscription_plan == 'premium':
-                previous_revenue += 99 * period_length
-            elif company.subscription_plan == 'enterprise':
-                previous_revenue += 299 * period_length
+        current_companies = current['new_companies']
+        current_users = current['new_users']
+        current_revenue = float(current['mrr']) / 30
+        
+        previous_companies = previous['new_companies']
+        previous_users = previous['new_users']
+        previous_revenue = float(previous['mrr']) / 30
         
         # Calculate percentage changes
         companies_change = ((current_companies - previous_companies) / max(previous_companies, 1)) * 100
@@ -10224,12 +9633,9 @@ def analytics_comparative_data(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)# Chat System Views
 @login_required
+@role_required('employee', 'Access denied. Employee access required.')
 def chat_dashboard(request):
     """Main chat dashboard for employees"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. Employee access required.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -10245,10 +9651,12 @@ def chat_dashboard(request):
         room.last_message = room.get_last_message()
         room.unread_count = room.get_unread_count(employee)
     
-    # Get online employees
+    # Get online employees from the shared chat presence cache
+    online_ids = presence.online_in_company(company.id) - {employee.id}
     online_employees = Employee.objects.filter(
+        id__in=online_ids,
         company=company
-    ).exclude(id=employee.id)[:10]
+    ).order_by('first_name', 'last_name')
     
     context = {
         'title': 'Chat Dashboard',
@@ -10260,12 +9668,9 @@ def chat_dashboard(request):
     return render(request, 'core/chat_dashboard.html', context)
 
 @login_required
+@role_required('employee', 'Access denied. Employee access required.')
 def chat_room(request, room_id):
     """Individual chat room view"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. Employee access required.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -10305,12 +9710,9 @@ def chat_room(request, room_id):
     return render(request, 'core/chat_room.html', context)
 
 @login_required
+@role_required('employee', 'Access denied. Employee access required.')
 def create_chat_room(request):
     """Create a new chat room"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. Employee access required.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -10570,26 +9972,20 @@ def mark_notification_read(request, notification_id):
     
     employee = request.user.employee_profile
     
-    try:
-        notification = ChatNotification.objects.get(
-            id=notification_id,
-            recipient=employee
-        )
-        notification.is_read = True
-        notification.save()
-        
-        return JsonResponse({'success': True})
-    except ChatNotification.DoesNotExist:
+    updated = ChatNotification.objects.filter(
+        id=notification_id,
+        recipient=employee
+    ).update(is_read=True)
+    if not updated:
         return JsonResponse({'success': False, 'error': 'Notification not found'})
+    
+    return JsonResponse({'success': True})
 
 # Employee Leave Request Details View
 @login_required
+@role_required('employee', 'Access denied. Employee access required.')
 def employee_leave_details(request, request_id):
     """Display detailed information about a specific leave request for employees"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. Employee access required.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -10597,7 +9993,7 @@ def employee_leave_details(request, request_id):
         leave_request = LeaveRequest.objects.get(
             id=request_id,
             employee=employee,
-            employee__company=company
+            company=company
         )
     except LeaveRequest.DoesNotExist:
         messages.error(request, 'Leave request not found.')
@@ -10655,12 +10051,9 @@ def employee_leave_details(request, request_id):
 
 # Employee Edit Leave Request View
 @login_required
+@role_required('employee', 'Access denied. Employee access required.')
 def employee_edit_leave_request(request, request_id):
     """Edit a specific leave request for employees"""
-    if not hasattr(request.user, 'employee_profile'):
-        messages.error(request, 'Access denied. Employee access required.')
-        return redirect('core:home')
-    
     employee = request.user.employee_profile
     company = employee.company
     
@@ -10668,7 +10061,7 @@ def employee_edit_leave_request(request, request_id):
         leave_request = LeaveRequest.objects.get(
             id=request_id,
             employee=employee,
-            employee__company=company
+            company=company
         )
     except LeaveRequest.DoesNotExist:
         messages.error(request, 'Leave request not found.')
@@ -10782,7 +10175,7 @@ def cancel_leave_request_api(request, request_id):
         leave_request = LeaveRequest.objects.get(
             id=request_id,
             employee=employee,
-            employee__company=company
+            company=company
         )
     except LeaveRequest.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Leave request not found'})
@@ -0,0 +1,104 @@
+"""
+WebSocket frame encoding shared by the consumers.
+
+Broadcast payloads are serialized once, when they are handed to
+``group_send`` (see ``frame_event``), in both the regular JSON form and the
+compact form. Each recipient consumer then sends the pre-encoded text that
+matches what its client negotiated, instead of calling ``json.dumps`` per
+recipient.
+
+Compact frames are JSON with short keys (see ``COMPACT_KEYS``) and no
+whitespace. Clients opt in by offering the ``COMPACT_SUBPROTOCOL``
+WebSocket subprotocol; ``static/js/websockets.js`` expands the keys again.
+"""
+import json
+
+
+COMPACT_SUBPROTOCOL = 'pm.compact.v1'
+
+# Full key -> compact key. Keep in sync with COMPACT_KEYS in static/js/websockets.js.
+COMPACT_KEYS = {
+    'type': 't',
+    'action': 'ac',
+    'data': 'd',
+    'message': 'm',
+    'sender': 's',
+    'sender_id': 'si',
+    'sender_name': 'sn',
+    'timestamp': 'ts',
+    'id': 'i',
+    'content': 'c',
+    'created_at': 'ca',
+    'is_edited': 'ie',
+    'attachment': 'a',
+    'attachment_name': 'an',
+    'first_name': 'fn',
+    'last_name': 'ln',
+    'position': 'p',
+    'user': 'u',
+    'user_id': 'ui',
+    'users': 'us',
+    'title': 'ti',
+    'room': 'r',
+    'room_id': 'ri',
+    'status': 'st',
+    'job': 'j',
+    'progress': 'pr',
+    'progress_message': 'pm',
+}
+
+
+def compact_keys(value):
+    """Recursively replace known keys with their compact form"""
+    if isinstance(value, dict):
+        return {COMPACT_KEYS.get(key, key): compact_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [compact_keys(item) for item in value]
+    return value
+
+
+def encode(payload):
+    """Both encodings of a client payload"""
+    return {
+        'text': json.dumps(payload),
+        'compact': json.dumps(compact_keys(payload), separators=(',', ':')),
+    }
+
+
+def frame_event(handler_type, payload):
+    """
+    Build a channel layer event whose handler forwards ``payload`` to each
+    client without re-serializing it.
+    """
+    return {'type': handler_type, **encode(payload)}
+
+
+class FrameMixin:
+    """Subprotocol negotiation and pre-encoded sends for WebSocket consumers"""
+
+    async def accept(self, subprotocol=None):
+        self.compact_frames = COMPACT_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        if self.compact_frames:
+            subprotocol = COMPACT_SUBPROTOCOL
+        await super().accept(subprotocol)
+
+    async def send_payload(self, payload):
+        """Send a payload built for this connection only"""
+        if getattr(self, 'compact_frames', False):
+            await self.send(text_data=json.dumps(compact_keys(payload), separators=(',', ':')))
+        else:
+            await self.send(text_data=json.dumps(payload))
+
+    async def send_frame(self, event, frame_type=None):
+        """
+        Forward a group event built by ``frame_event``. Events from older
+        senders without pre-encoded text are encoded here as
+        ``{'type': frame_type, ...event fields}``.
+        """
+        if 'text' not in event:
+            payload = {key: value for key, value in event.items() if key != 'type'}
+            await self.send_payload({'type': frame_type or event['type'], **payload})
+        elif getattr(self, 'compact_frames', False):
+            await self.send(text_data=event['compact'])
+        else:
+            await self.send(text_data=event['text'])
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +48,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.RoleMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -127,16 +129,44 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Protected downloads (chat attachments, documents) are checked by Django and
+# then sent by the web server: 'xsendfile' (Apache mod_xsendfile) or 'nginx'
+# (X-Accel-Redirect to an internal location at SENDFILE_URL_PREFIX aliased to
+# MEDIA_ROOT). None streams the file from Django, for development.
+SENDFILE_BACKEND = None
+SENDFILE_URL_PREFIX = "/protected-media/"
+
+# Files handed to background jobs (e.g. employee import CSVs); never served
+JOB_UPLOAD_ROOT = BASE_DIR / "job_uploads"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Authentication settings
+# Loads the user's company admin / employee / system owner profile in the same query as the user
+AUTHENTICATION_BACKENDS = ['core.backends.ProfileModelBackend']
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/' 
 
+# Session storage (compare with `manage.py session_benchmark`):
+# - 'django.contrib.sessions.backends.db': one query per authenticated request
+# - 'core.sessions': cached_db that reads from the cache and writes the row
+#   only when the data changes or every SESSION_DB_WRITE_INTERVAL seconds
+# - 'django.contrib.sessions.backends.signed_cookies': no server storage;
+#   sessions here are small, but they cannot be revoked server-side
+# cached_db needs a real cache, so development (DummyCache) stays on db.
+SESSION_ENGINE = 'django.contrib.sessions.backends.db' if DEBUG else 'core.sessions'
+SESSION_DB_WRITE_INTERVAL = 300
+# Expired rows are deleted by the clear_expired_sessions job
+# (`manage.py clear_expired_sessions --schedule` queues it once)
+SESSION_CLEANUP_INTERVAL = timedelta(hours=24)
+
+# Outgoing mail (notification emails and digests); printed to the console in development
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend' if DEBUG else 'django.core.mail.backends.smtp.EmailBackend'
+
 # Cache Configuration
 CACHES = {
     'default': {
@@ -147,7 +177,14 @@ CACHES = {
         } if not DEBUG else {},
         'TIMEOUT': 300,  # 5 minutes
         'KEY_PREFIX': 'project_manager',
-    }
+    },
+    # Chat presence (core.presence), shared by the web and Channels processes.
+    # Development runs both in one process, so local memory is enough there.
+    'presence': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache' if DEBUG else 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'presence' if DEBUG else 'redis://127.0.0.1:6379/1',
+        'KEY_PREFIX': 'project_manager',
+    },
 }
 
 # Channel settings for WebSocket
@@ -302,13 +302,23 @@ function setupFormHandlers() {
             submitButton.disabled = true;
             submitButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
             
-            fetch(window.location.href, {
+            // Large attachments go through the resumable upload API first
+            const attachment = formData.get('attachment');
+            let uploaded = Promise.resolve();
+            if (attachment && attachment.size > UPLOAD_CHUNK_SIZE) {
+                uploaded = resumableUpload(attachment, 'chat').then(upload => {
+                    formData.delete('attachment');
+                    formData.append('upload_id', upload.upload_id);
+                });
+            }
+            
+            uploaded.then(() => fetch(window.location.href, {
                 method: 'POST',
                 body: formData,
                 headers: {
                     'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
                 }
-            })
+            }))
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
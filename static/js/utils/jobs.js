@@ -0,0 +1,34 @@
+/**
+ * Background Job Utility
+ * Waits for a job queued by the server (reports, bulk operations, imports)
+ * to finish, reporting progress along the way.
+ */
+
+// Poll the job status endpoint until the job finishes.
+// Resolves with the job on success, rejects with the job on failure.
+function waitForJob(jobId, onProgress = null, interval = 1000) {
+    return new Promise((resolve, reject) => {
+        function poll() {
+            fetch(`/api/jobs/${jobId}/`, { credentials: 'same-origin' })
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        reject(data);
+                        return;
+                    }
+                    const job = data.job;
+                    if (onProgress) onProgress(job);
+                    
+                    if (job.status === 'SUCCEEDED') {
+                        resolve(job);
+                    } else if (job.status === 'FAILED' || job.status === 'CANCELLED') {
+                        reject(job);
+                    } else {
+                        setTimeout(poll, interval);
+                    }
+                })
+                .catch(error => reject(error));
+        }
+        poll();
+    });
+}
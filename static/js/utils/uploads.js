@@ -0,0 +1,51 @@
+/**
+ * Resumable Upload Utility
+ * Sends a file to the chunked upload API (/api/uploads/) in pieces, resuming
+ * from the server's offset after a failed chunk.
+ */
+
+const UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024;
+
+// Upload `file` for `purpose` ('chat' or 'document').
+// Resolves with the finished upload (upload_id, sha256, ...).
+async function resumableUpload(file, purpose, onProgress = null, chunkSize = UPLOAD_CHUNK_SIZE, retries = 5) {
+    const csrfInput = document.querySelector('[name=csrfmiddlewaretoken]');
+    const headers = csrfInput ? { 'X-CSRFToken': csrfInput.value } : {};
+
+    const startResponse = await fetch('/api/uploads/', {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: { ...headers, 'Content-Type': 'application/json' },
+        body: JSON.stringify({ purpose, filename: file.name, size: file.size, content_type: file.type })
+    });
+    let upload = await startResponse.json();
+    if (!upload.success) throw upload;
+
+    let failures = 0;
+    while (!upload.complete) {
+        try {
+            const response = await fetch(upload.upload_url, {
+                method: 'PATCH',
+                credentials: 'same-origin',
+                headers: {
+                    ...headers,
+                    'Content-Type': 'application/offset+octet-stream',
+                    'Upload-Offset': String(upload.offset)
+                },
+                body: file.slice(upload.offset, upload.offset + chunkSize)
+            });
+            const data = await response.json();
+            if (!data.success && response.status !== 409) throw data;
+            upload = data.success ? data : { ...upload, offset: data.offset };
+            failures = 0;
+        } catch (error) {
+            if (++failures > retries) throw error;
+            // Ask the server how much it kept, then carry on from there
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            const state = await fetch(upload.upload_url, { credentials: 'same-origin' }).then(r => r.json());
+            if (state.success) upload = state;
+        }
+        if (onProgress) onProgress(upload.offset, upload.size);
+    }
+    return upload;
+}
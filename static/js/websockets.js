@@ -6,6 +6,59 @@
  * for different features like notifications, project updates, and dashboard metrics.
  */
 
+// Compact frame encoding, negotiated through a WebSocket subprotocol.
+// Keep in sync with COMPACT_KEYS in core/ws_frames.py.
+const COMPACT_SUBPROTOCOL = 'pm.compact.v1';
+const COMPACT_KEYS = {
+    type: 't',
+    action: 'ac',
+    data: 'd',
+    message: 'm',
+    sender: 's',
+    sender_id: 'si',
+    sender_name: 'sn',
+    timestamp: 'ts',
+    id: 'i',
+    content: 'c',
+    created_at: 'ca',
+    is_edited: 'ie',
+    attachment: 'a',
+    attachment_name: 'an',
+    first_name: 'fn',
+    last_name: 'ln',
+    position: 'p',
+    user: 'u',
+    user_id: 'ui',
+    users: 'us',
+    title: 'ti',
+    room: 'r',
+    room_id: 'ri',
+    status: 'st',
+    job: 'j',
+    progress: 'pr',
+    progress_message: 'pm'
+};
+const EXPANDED_KEYS = Object.fromEntries(Object.entries(COMPACT_KEYS).map(([full, short]) => [short, full]));
+
+/**
+ * Expand the short keys of a compact frame back to their full names
+ * @param {*} value - Parsed compact frame (or part of one)
+ * @returns {*} The same value with full key names
+ */
+function expandCompactKeys(value) {
+    if (Array.isArray(value)) {
+        return value.map(expandCompactKeys);
+    }
+    if (value && typeof value === 'object') {
+        const expanded = {};
+        for (const [key, item] of Object.entries(value)) {
+            expanded[EXPANDED_KEYS[key] || key] = expandCompactKeys(item);
+        }
+        return expanded;
+    }
+    return value;
+}
+
 class WebSocketManager {
     /**
      * Initialize the WebSocket manager
@@ -34,16 +87,17 @@ class WebSocketManager {
      * @param {string} name - Unique name for this connection
      * @param {string} path - The WebSocket path
      * @param {Object} handlers - Event handlers for the connection
+     * @param {Object} options - Connection options; `compact: true` asks the server for compact frames
      * @returns {WebSocket} The WebSocket connection
      */
-    connect(name, path, handlers = {}) {
+    connect(name, path, handlers = {}, options = {}) {
         if (this.connections[name]) {
             console.log(`WebSocket connection '${name}' already exists`);
             return this.connections[name];
         }
 
         const url = this.getWebSocketUrl(path);
-        const ws = new WebSocket(url);
+        const ws = options.compact ? new WebSocket(url, [COMPACT_SUBPROTOCOL]) : new WebSocket(url);
         let reconnectAttempt = 0;
 
         // Setup event handlers
@@ -55,7 +109,9 @@ class WebSocketManager {
 
         ws.onmessage = (event) => {
             try {
-                const data = JSON.parse(event.data);
+                // The server only sends compact frames if it accepted the subprotocol
+                const parsed = JSON.parse(event.data);
+                const data = ws.protocol === COMPACT_SUBPROTOCOL ? expandCompactKeys(parsed) : parsed;
                 if (handlers.onMessage) handlers.onMessage(data);
                 
                 // Handle specific message types
@@ -92,7 +148,7 @@ class WebSocketManager {
                 this.reconnectTimeouts[name] = setTimeout(() => {
                     reconnectAttempt++;
                     console.log(`Reconnecting '${name}', attempt ${reconnectAttempt}`);
-                    this.connect(name, path, handlers);
+                    this.connect(name, path, handlers, options);
                 }, delay);
             }
         };